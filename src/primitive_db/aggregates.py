@@ -0,0 +1,240 @@
+import re
+
+# агрегатные функции и типы столбцов, к которым они применимы
+FUNCTIONS = {
+    'count': ('int', 'str', 'bool'),
+    'sum': ('int',),
+    'avg': ('int',),
+    'min': ('int', 'str', 'bool'),
+    'max': ('int', 'str', 'bool'),
+}
+
+AGGREGATE_PATTERN = re.compile(r'^(\w+)\s*\(\s*(\*|[\w.]+)\s*\)$')
+
+
+def parse_select_list(text):
+    """
+    Разбирает список выражений select.
+
+    Аргументы:
+        text (str): текст между select и from, например
+            "status, count(*), avg(age)".
+
+    Возвращает:
+        list[tuple]: элементы ('agg', функция, столбец) или ('column', столбец);
+        для count(*) столбец равен '*'.
+
+    Исключения:
+        ValueError: неизвестная функция или пустой элемент списка.
+    """
+
+    items = []
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            raise ValueError('пустой элемент в списке select')
+
+        match = AGGREGATE_PATTERN.match(part)
+        if match is None:
+            items.append(('column', part))
+            continue
+
+        func, column = match.group(1).lower(), match.group(2)
+        if func not in FUNCTIONS:
+            raise ValueError(f'неизвестная агрегатная функция {func}')
+        if column == '*' and func != 'count':
+            raise ValueError(f'{func}(*) не поддерживается')
+        items.append(('agg', func, column))
+    return items
+
+
+def label(item):
+    """
+    Возвращает заголовок столбца результата для элемента списка select.
+    """
+
+    if item[0] == 'column':
+        return item[1]
+    return f'{item[1]}({item[2]})'
+
+
+def check_items(items, columns, group_by):
+    """
+    Проверяет список select с агрегатами по схеме таблицы.
+
+    Аргументы:
+        items (list[tuple]): элементы списка select.
+        columns (dict): столбцы таблицы вида {column_name: type}.
+        group_by (str | None): столбец группировки.
+
+    Возвращает:
+        str | None: описание ошибки или None.
+    """
+
+    if group_by is not None and group_by not in columns:
+        return f'Столбца {group_by} нет в таблице.'
+
+    for item in items:
+        if item[0] == 'column':
+            if item[1] != group_by:
+                return f'Столбец {item[1]} должен быть указан в group by.'
+            continue
+
+        _, func, column = item
+        if column == '*':
+            continue
+        if column not in columns:
+            return f'Столбца {column} нет в таблице.'
+        if columns[column] not in FUNCTIONS[func]:
+            return f'Функцию {func} нельзя применить к столбцу {column} ' \
+                   f'типа {columns[column]}.'
+    return None
+
+
+def compute_state(func, values, count):
+    """
+    Вычисляет частичное состояние агрегата по значениям одной группы.
+
+    Состояния можно объединять функцией merge_state, поэтому агрегаты
+    по частям таблицы считаются независимо и затем сливаются.
+    """
+
+    match func:
+        case 'count':
+            return count
+        case 'sum':
+            return sum(values)
+        case 'avg':
+            return (sum(values), count)
+        case 'min':
+            return min(values, default=None)
+        case 'max':
+            return max(values, default=None)
+
+
+def merge_state(func, left, right):
+    """
+    Объединяет два частичных состояния одного агрегата.
+    """
+
+    match func:
+        case 'count' | 'sum':
+            return left + right
+        case 'avg':
+            return (left[0] + right[0], left[1] + right[1])
+        case 'min' | 'max':
+            if left is None or right is None:
+                return right if left is None else left
+            return min(left, right) if func == 'min' else max(left, right)
+
+
+def final_value(func, state):
+    """
+    Переводит состояние агрегата в итоговое значение.
+    """
+
+    if func == 'avg':
+        total, count = state
+        return round(total / count, 4) if count else None
+    return state
+
+
+def partial(items, table_data, positions=None, group_by=None):
+    """
+    Считает частичные состояния агрегатов за один проход.
+
+    Строки сначала раскладываются по группам хеш-таблицей по значению
+    столбца group_by, затем каждый агрегат считается встроенными функциями
+    (sum, min, max) по значениям своего столбца внутри группы. Читаются
+    только столбцы, упомянутые в запросе; словари строк не создаются.
+
+    Аргументы:
+        items (list[tuple]): элементы списка select.
+        table_data (dict): данные таблицы.
+        positions (list[int] | None): позиции отобранных строк;
+            None — все строки.
+        group_by (str | None): столбец группировки.
+
+    Возвращает:
+        dict: {ключ группы: [состояние для каждого агрегата]}; без group by
+        единственный ключ — ().
+    """
+
+    aggregates = [item for item in items if item[0] == 'agg']
+    if positions is None:
+        positions = range(len(table_data['id']))
+
+    if group_by is None:
+        groups = {(): positions}
+    else:
+        groups = {}
+        keys = table_data[group_by]
+        for i in positions:
+            groups.setdefault(keys[i], []).append(i)
+
+    result = {}
+    for key, group_positions in groups.items():
+        states = []
+        for _, func, column in aggregates:
+            if column == '*' or func == 'count':
+                values = ()
+            elif isinstance(group_positions, range) and \
+                    len(group_positions) == len(table_data[column]):
+                values = table_data[column]
+            else:
+                values = list(map(table_data[column].__getitem__, group_positions))
+            states.append(compute_state(func, values, len(group_positions)))
+        result[key] = states
+    return result
+
+
+def merge(items, partials):
+    """
+    Объединяет частичные состояния агрегатов, посчитанные по частям таблицы.
+
+    Аргументы:
+        items (list[tuple]): элементы списка select.
+        partials (iterable[dict]): результаты partial.
+
+    Возвращает:
+        dict: объединённые состояния в формате partial.
+    """
+
+    funcs = [item[1] for item in items if item[0] == 'agg']
+    merged = {}
+    for part in partials:
+        for key, states in part.items():
+            if key not in merged:
+                merged[key] = list(states)
+                continue
+            merged[key] = [merge_state(func, left, right) for func, left, right
+                           in zip(funcs, merged[key], states)]
+    return merged
+
+
+def finalize(items, states, group_by=None):
+    """
+    Строит таблицу результата из состояний агрегатов.
+
+    Аргументы:
+        items (list[tuple]): элементы списка select.
+        states (dict): состояния в формате partial.
+        group_by (str | None): столбец группировки.
+
+    Возвращает:
+        dict: {заголовок: список значений} — в формате print_prettytable.
+    """
+
+    if group_by is None and not states:
+        states = {(): [compute_state(item[1], (), 0)
+                       for item in items if item[0] == 'agg']}
+
+    result = {label(item): [] for item in items}
+    for key, group_states in states.items():
+        agg_values = iter(group_states)
+        for item in items:
+            if item[0] == 'column':
+                result[label(item)].append(key)
+            else:
+                result[label(item)].append(final_value(item[1], next(agg_values)))
+    return result
@@ -0,0 +1,305 @@
+"""
+Набор замеров производительности основных операций базы данных.
+
+Запуск: python -m src.primitive_db.bench --sizes 1000 100000 1000000
+        python -m src.primitive_db.bench --output bench.json
+        python -m src.primitive_db.bench --compare bench_baseline.json
+
+Для каждого размера и каждой схемы из SCHEMAS во временном каталоге
+создаётся таблица со случайными (но воспроизводимыми: генератор
+инициализируется --seed) строками, после чего замеряются create_table,
+одиночная и массовая вставка, select всей таблицы и по условию
+с промахом и попаданием в кэш, update, delete и info.
+
+Результат — JSON вида {"environment": {...}, "results": {ключ: замер}},
+где ключ — «схема/размер/операция», а замер — медиана, минимум
+и среднее время одного выполнения в секундах. С --compare результат
+сравнивается с сохранённым ранее (базовым) файлом: операции, медиана
+которых выросла больше чем на --threshold, считаются регрессиями,
+и код завершения становится 1.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from src.primitive_db import buffer_pool, constants, core, decorators
+
+# схемы синтетических таблиц: имя -> {столбец: тип}
+SCHEMAS = {
+    'users': {'name': 'str', 'age': 'int', 'active': 'bool'},
+    'events': {'kind': 'str', 'user_id': 'int', 'amount': 'int',
+               'processed': 'bool', 'note': 'str'},
+}
+# размеры таблиц по умолчанию
+SIZES = (1_000, 100_000, 1_000_000)
+# целые значения берутся из range(INT_RANGE): условие «< 10» выбирает ~1%
+# строк, «= k» — ~0.1%
+INT_RANGE = 1000
+# число одиночных вставок в одном замере insert_single
+SINGLE_INSERTS = 100
+# допустимый рост медианы относительно базового замера
+REGRESSION_THRESHOLD = 0.25
+# замеры короче этого (в секундах) не считаются регрессией: их шум
+# сравним с самим временем
+MIN_COMPARED_SECONDS = 0.001
+
+
+def configure(base_dir):
+    """
+    Направляет базу данных в каталог base_dir и отключает вывод,
+    мешающий замерам.
+    """
+
+    constants.TABLE_DATA_DIR = base_dir / 'data'
+    constants.METADATA_JSON = base_dir / 'db_meta.json'
+    constants.SELECT_OUTPUT_MODE = 'tsv'
+    constants.BUFFER_POOL_WRITE_POLICY = 'write_through'
+    decorators.LOG_TIME = False
+    decorators.CONFIRM_ANSWER = 'y'
+
+
+def make_value(rng, column, column_type, i):
+    if column_type == 'int':
+        return rng.randrange(INT_RANGE)
+    if column_type == 'bool':
+        return rng.random() < 0.5
+    return f'{column}{i}_{rng.randrange(INT_RANGE)}'
+
+
+def generate_rows(schema, count, seed):
+    """
+    Порождает count строк схемы schema вида {column_name: value}.
+    """
+
+    rng = random.Random(seed)
+    for i in range(count):
+        yield {column: make_value(rng, column, column_type, i)
+               for column, column_type in schema.items()}
+
+
+def measure(action, repeat, prepare=None):
+    """
+    Замеряет время выполнения action.
+
+    Аргументы:
+        action (callable): замеряемое действие; получает номер повтора.
+        repeat (int): число повторов.
+        prepare (callable | None): действие перед каждым повтором, время
+            которого не учитывается (например, сброс кэша).
+
+    Возвращает:
+        dict: медиана, минимум и среднее время в секундах и число повторов.
+    """
+
+    timings = []
+    for run in range(repeat):
+        if prepare is not None:
+            prepare()
+        started = time.perf_counter()
+        action(run)
+        timings.append(time.perf_counter() - started)
+    return {
+        'median': statistics.median(timings),
+        'min': min(timings),
+        'mean': statistics.fmean(timings),
+        'runs': repeat,
+    }
+
+
+def bench_table(schema_name, size, repeat, seed):
+    """
+    Замеряет операции над одной таблицей схемы schema_name из size строк.
+
+    Возвращает:
+        dict: замеры {операция: замер}.
+    """
+
+    schema = SCHEMAS[schema_name]
+    table_name = f'{schema_name}_{size}'
+    int_column = next(col for col, col_type in schema.items() if col_type == 'int')
+    cache = constants.SELECT_CACHE_STORE
+    results = {}
+
+    def create(run):
+        core.create_table(buffer_pool.get_metadata(), f'{table_name}_c{run}', schema)
+
+    results['create_table'] = measure(create, repeat)
+    for run in range(repeat):
+        core.drop_table(buffer_pool.get_metadata(), f'{table_name}_c{run}')
+
+    core.create_table(buffer_pool.get_metadata(), table_name, schema)
+
+    values = [tuple(row.values()) for row in generate_rows(schema, size, seed)]
+
+    def insert_bulk(run):
+        core.insert(buffer_pool.get_metadata(), table_name, values)
+        buffer_pool.flush()
+
+    # вставка всей таблицы выполняется один раз: таблица нужна остальным замерам
+    results['insert_bulk'] = measure(insert_bulk, 1)
+    results['insert_bulk']['rows'] = size
+    values.clear()
+
+    rng = random.Random(seed + 1)
+
+    def insert_single(run):
+        metadata = buffer_pool.get_metadata()
+        for i in range(SINGLE_INSERTS):
+            row = tuple(make_value(rng, column, column_type, size + i)
+                        for column, column_type in schema.items())
+            core.insert(metadata, table_name, [row])
+
+    results['insert_single'] = measure(insert_single, repeat)
+    results['insert_single']['rows'] = SINGLE_INSERTS
+
+    def select(where_clause):
+        return lambda run: core.select(buffer_pool.get_metadata(), table_name,
+                                       where_clause)
+
+    filtered = ('cmp', int_column, '<', INT_RANGE // 100)
+    results['select_full'] = measure(select(None), repeat, cache.clear)
+    results['select_filtered'] = measure(select(filtered), repeat, cache.clear)
+    core.select(buffer_pool.get_metadata(), table_name, filtered)
+    results['select_cache_hit'] = measure(select(filtered), repeat)
+
+    def update(run):
+        core.update(buffer_pool.get_metadata(), table_name, {int_column: run},
+                    ('cmp', int_column, '=', INT_RANGE // 2 + run))
+
+    results['update'] = measure(update, repeat)
+
+    def delete(run):
+        core.delete(buffer_pool.get_metadata(), table_name,
+                    ('cmp', int_column, '=', INT_RANGE - 1 - run))
+
+    results['delete'] = measure(delete, repeat)
+
+    def info(run):
+        core.info(table_name, buffer_pool.get_metadata())
+
+    results['info'] = measure(info, repeat)
+
+    buffer_pool.flush()
+    core.drop_table(buffer_pool.get_metadata(), table_name)
+    return results
+
+
+def run(sizes, schemas, repeat, seed):
+    """
+    Выполняет замеры для всех размеров и схем во временном каталоге.
+
+    Возвращает:
+        dict: отчёт {"environment": {...}, "results": {ключ: замер}}.
+    """
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        configure(Path(tmp))
+        for size in sizes:
+            for schema_name in schemas:
+                print(f'Замер: {schema_name}, строк: {size}...', file=sys.stderr)
+                with open(os.devnull, 'w') as devnull, \
+                        contextlib.redirect_stdout(devnull):
+                    table_results = bench_table(schema_name, size, repeat, seed)
+                for operation, result in table_results.items():
+                    results[f'{schema_name}/{size}/{operation}'] = result
+        buffer_pool.flush()
+
+    environment = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'storage': constants.DEFAULT_STORAGE,
+        'parallel_workers': constants.PARALLEL_WORKERS,
+        'repeat': repeat,
+        'seed': seed,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    return {'environment': environment, 'results': results}
+
+
+def compare(report, baseline, threshold):
+    """
+    Сравнивает отчёт с базовым по медианам времени.
+
+    Аргументы:
+        report (dict): текущий отчёт из run.
+        baseline (dict): сохранённый ранее отчёт.
+        threshold (float): допустимый относительный рост медианы.
+
+    Возвращает:
+        list[tuple]: строки сравнения (ключ, базовая медиана, текущая
+        медиана, отношение, регрессия ли это) для общих ключей.
+    """
+
+    rows = []
+    for key, result in report['results'].items():
+        base = baseline['results'].get(key)
+        if base is None:
+            continue
+        ratio = result['median'] / base['median'] if base['median'] else 1.0
+        regression = ratio > 1 + threshold and \
+            result['median'] >= MIN_COMPARED_SECONDS
+        rows.append((key, base['median'], result['median'], ratio, regression))
+    return rows
+
+
+def print_comparison(rows):
+    width = max((len(row[0]) for row in rows), default=0)
+    for key, base, current, ratio, regression in rows:
+        mark = '  РЕГРЕССИЯ' if regression else ''
+        print(f'{key:<{width}}  {base * 1000:10.3f} мс -> {current * 1000:10.3f} мс'
+              f'  x{ratio:.2f}{mark}')
+    regressions = sum(row[4] for row in rows)
+    print(f'Сравнено замеров: {len(rows)}, регрессий: {regressions}.')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замеры производительности '
+                                                 'операций базы данных.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES),
+                        help='число строк в таблицах')
+    parser.add_argument('--schemas', nargs='+', choices=list(SCHEMAS),
+                        default=list(SCHEMAS))
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='число повторов каждого замера')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', type=Path,
+                        help='файл для сохранения отчёта JSON '
+                             '(по умолчанию — вывод в stdout)')
+    parser.add_argument('--input', type=Path,
+                        help='взять готовый отчёт из файла вместо замеров')
+    parser.add_argument('--compare', type=Path,
+                        help='базовый отчёт для поиска регрессий')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='допустимый рост медианы, например 0.25 — на 25%%')
+    args = parser.parse_args()
+
+    if args.input is not None:
+        report = json.loads(args.input.read_text(encoding='utf-8'))
+    else:
+        report = run(args.sizes, args.schemas, args.repeat, args.seed)
+
+    text = json.dumps(report, indent=4, ensure_ascii=False)
+    if args.output is not None:
+        args.output.write_text(text + '\n', encoding='utf-8')
+    elif args.compare is None:
+        print(text)
+
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text(encoding='utf-8'))
+        if print_comparison(compare(report, baseline, args.threshold)):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
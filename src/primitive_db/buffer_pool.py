@@ -0,0 +1,1126 @@
+import atexit
+import contextlib
+import copy
+import functools
+import os
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import ExitStack
+
+from src.primitive_db import (
+    constants,
+    decorators,
+    indexes,
+    locks,
+    metrics,
+    storage,
+    table_stats,
+    utils,
+)
+
+# разобранные таблицы в порядке последнего обращения: {table_name: entry}
+TABLES = OrderedDict()
+# защищает порядок TABLES и вытеснение, когда к пулу обращаются
+# несколько потоков (режим сервера)
+POOL_LOCK = threading.RLock()
+
+# метаданные, подпись файла, по которой они были загружены, и таблицы,
+# которые сейчас изменяются (см. locked_write)
+METADATA = {'data': None, 'signature': None, 'writing': set()}
+
+# номер изменения данных пула: растёт при каждом изменении, загрузке
+# и удалении таблицы из пула (по нему модуль parallel узнаёт, что копия
+# данных в его процессах устарела)
+CHANGES = {'version': 0}
+
+# активная транзакция: снимок метаданных на момент begin и изменённые таблицы
+TRANSACTION = {'active': False, 'metadata': None, 'tables': set()}
+
+# фоновая запись при уровне надёжности batched: поток, события его остановки
+# и пробуждения, число изменений с последней записи и признак того, что
+# остановка потока зарегистрирована в atexit
+FLUSHER = {'thread': None, 'stop': None, 'wake': None, 'writes': 0,
+           'atexit': False}
+# при уровне batched изменения таблиц, транзакции и фоновая запись
+# выполняются по очереди
+FLUSH_LOCK = threading.RLock()
+
+
+def pool_bytes():
+    """
+    Возвращает суммарный объём разобранных таблиц в пуле (в байтах).
+    """
+
+    with POOL_LOCK:
+        return sum(entry['bytes'] for entry in TABLES.values())
+
+
+metrics.register_gauge('buffer_pool.tables', lambda: len(TABLES))
+metrics.register_gauge('buffer_pool.bytes', pool_bytes)
+
+
+def file_signature(*paths):
+    """
+    Возвращает подпись файлов для дешёвой проверки их изменения.
+
+    Аргументы:
+        paths: пути к файлам.
+
+    Возвращает:
+        tuple: пары (mtime_ns, size) или None для отсутствующих файлов.
+    """
+
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            signature.append(None)
+        else:
+            signature.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def table_signature(table_name):
+    """
+    Возвращает подпись файла таблицы и её журнала.
+    """
+
+    return file_signature(utils.get_table_path(table_name),
+                          utils.get_log_path(table_name))
+
+
+def get_metadata():
+    """
+    Возвращает метаданные таблиц из памяти.
+
+    Файл db_meta.json перечитывается, только если изменилась его подпись
+    (внутри транзакции не перечитывается).
+    Список метаданных обновляется на месте, поэтому ссылки на него,
+    полученные ранее, остаются актуальными.
+
+    Возвращает:
+        list: список словарей с описанием таблиц.
+    """
+
+    signature = file_signature(constants.METADATA_JSON)
+    if METADATA['data'] is not None and (
+            signature == METADATA['signature'] or TRANSACTION['active']):
+        return METADATA['data']
+
+    with locks.metadata_lock():
+        metadata = utils.load_metadata()
+        METADATA['signature'] = file_signature(constants.METADATA_JSON)
+        replace_metadata(metadata)
+    return METADATA['data']
+
+
+def replace_metadata(metadata):
+    """
+    Заменяет метаданные в памяти, обновляя список на месте.
+
+    Записи таблиц, которые сейчас изменяются (METADATA['writing']),
+    остаются прежними объектами: функция ядра, меняющая таблицу в другом
+    потоке, держит ссылку на свою запись и сохранит её сама.
+    Вызывается под блокировкой метаданных, чтобы метаданные в памяти
+    соответствовали подписи METADATA['signature'].
+
+    Аргументы:
+        metadata (list): новые метаданные.
+    """
+
+    if METADATA['data'] is None:
+        METADATA['data'] = metadata
+        return
+
+    writing = {meta['table_name']: meta for meta in METADATA['data']
+               if meta['table_name'] in METADATA['writing']}
+    METADATA['data'][:] = [writing.get(meta['table_name'], meta)
+                           for meta in metadata]
+
+
+def save_metadata(metadata):
+    """
+    Сохраняет метаданные на диск и запоминает новую подпись файла.
+    Внутри транзакции запись откладывается до commit.
+
+    Аргументы:
+        metadata (list): список словарей с описанием таблиц.
+    """
+
+    METADATA['data'] = metadata
+    if TRANSACTION['active']:
+        return
+
+    with locks.metadata_lock(exclusive=True):
+        utils.save_metadata(metadata)
+        METADATA['signature'] = file_signature(constants.METADATA_JSON)
+
+
+def merge_metadata(table_names):
+    """
+    Переносит записи заданных таблиц из метаданных в памяти в актуальные
+    метаданные на диске; записи остальных таблиц берутся с диска.
+
+    Так процесс не затирает изменения метаданных, сделанные другими
+    процессами для других таблиц. Счётчик next_id берётся наибольший
+    из двух. Вызывается под исключительной блокировкой метаданных.
+
+    Аргументы:
+        table_names (iterable[str]): таблицы, изменённые этим процессом.
+
+    Возвращает:
+        list: объединённые метаданные.
+    """
+
+    merged = utils.load_metadata()
+    for table_name in table_names:
+        mine = utils.get_table_meta(METADATA['data'], table_name)
+        theirs = utils.get_table_meta(merged, table_name)
+        if mine is None:
+            if theirs is not None:
+                merged.remove(theirs)
+        elif theirs is None:
+            merged.append(mine)
+        else:
+            if 'next_id' in theirs:
+                mine['next_id'] = max(mine.get('next_id', 1), theirs['next_id'])
+            merged[merged.index(theirs)] = mine
+    return merged
+
+
+def save_table_meta(table_name):
+    """
+    Сохраняет на диск запись одной таблицы из метаданных в памяти
+    (см. merge_metadata). Внутри транзакции запись откладывается до commit.
+
+    Аргументы:
+        table_name (str): имя таблицы.
+    """
+
+    if TRANSACTION['active']:
+        return
+
+    with locks.metadata_lock(exclusive=True):
+        merged = merge_metadata([table_name])
+        utils.save_metadata(merged)
+        METADATA['signature'] = file_signature(constants.METADATA_JSON)
+        replace_metadata(merged)
+
+
+def locked_write(func):
+    """
+    Декоратор функций ядра, изменяющих таблицу: func(metadata, table_name, ...).
+
+    На время вызова берёт исключительную блокировку таблицы, перед вызовом
+    перечитывает изменённые другими процессами метаданные (сама таблица
+    перечитывается в get_entry по подписи файлов), после вызова сохраняет
+    запись таблицы в метаданных и записывает её изменения в журнал — и при
+    политике deferred, и при уровне надёжности batched: иначе другой
+    процесс, не видя ещё не записанных строк и счётчика id, выдал бы те же
+    id и его строки потерялись бы при применении журнала. Так изменения
+    нескольких процессов не теряются, а читатели ждут только на время
+    самой записи. Отложенная запись при этом объединяет изменения внутри
+    одной команды и транзакции. Пока идёт вызов, таблица числится
+    в METADATA['writing']. При уровне надёжности batched вызов
+    не пересекается с фоновой записью.
+    """
+
+    @functools.wraps(func)
+    def wrapper(metadata, table_name, *args, **kwargs):
+        flush_lock = FLUSH_LOCK if constants.DURABILITY == 'batched' \
+            else contextlib.nullcontext()
+        with flush_lock, locks.table_lock(table_name, exclusive=True):
+            get_metadata()
+            nested = table_name in METADATA['writing']
+            METADATA['writing'].add(table_name)
+            try:
+                return func(metadata, table_name, *args, **kwargs)
+            finally:
+                try:
+                    # метаданные пишутся раньше журнала: при сбое между
+                    # ними счётчик id лишь опередит данные, и запуск
+                    # без журнала может не перечитывать таблицу
+                    # (см. utils.recover_tables)
+                    save_table_meta(table_name)
+                    if not nested:
+                        flush_table(table_name)
+                finally:
+                    if not nested:
+                        METADATA['writing'].discard(table_name)
+    return wrapper
+
+
+def get_entry(table_name, columns=None):
+    """
+    Возвращает запись пула для таблицы, при необходимости загружая её с диска.
+
+    Таблица перечитывается (под разделяемой блокировкой), только если
+    изменилась подпись её файлов; при этом сбрасывается кэш select таблицы.
+    Таблицы с ещё не записанными изменениями не перечитываются.
+
+    Если нужны не все столбцы, с диска читаются только они (и id), если
+    хранилище это позволяет; остальные догружаются из того же снимка
+    при первом обращении к ним (см. load_columns). Изменения таблицы
+    всегда запрашивают все столбцы, поэтому неполные записи изменений
+    не содержат.
+
+    Аргументы:
+        table_name (str): имя таблицы.
+        columns (iterable[str] | None): нужные вызывающему столбцы;
+            None — все.
+
+    Возвращает:
+        dict | None: запись пула или None, если таблицы нет.
+    """
+
+    with POOL_LOCK:
+        entry = TABLES.get(table_name)
+        valid = entry is not None and (
+            entry['pending'] or entry['signature'] == table_signature(table_name))
+        if valid:
+            TABLES.move_to_end(table_name)
+            if not missing_columns(entry, columns):
+                return entry
+
+    with locks.table_lock(table_name):
+        signature = table_signature(table_name)
+        if valid and signature == entry['signature']:
+            load_columns(entry, table_name, missing_columns(entry, columns))
+            return entry
+        table_data = utils.load_table_data(
+            table_name, None if columns is None else ['id', *columns])
+        # карта зон из снимка верна, только если к нему не применялся журнал
+        zones = utils.get_table_storage(table_name).load_zones(table_name) \
+            if table_data and signature[1] is None else None
+    constants.SELECT_CACHE_STORE.invalidate(table_name)
+    if not table_data:
+        discard(table_name)
+        return None
+    CHANGES['version'] += 1
+    metrics.increment('buffer_pool.loads')
+
+    entry = {
+        'data': table_data,
+        'signature': signature,
+        'bytes': decorators.estimate_size(table_data),
+        'id_index': None,
+        'indexes': {},
+        'pending': [],
+        'derived': {},
+        # позиции удалённых строк, ещё не убранных из столбцов (см. vacuum)
+        'deleted': set(),
+        # карта зон сегментов (см. table_stats); None — ещё не построена
+        'zones': zones,
+        # коды словарей столбцов str (см. get_codes): {column: пара | None}
+        'codes': {},
+        # сегменты снимка, изменённые после его записи; None — неизвестно
+        # какие (к снимку применён журнал), снимок переписывается целиком
+        'dirty_segments': set() if signature[1] is None else None,
+        # столбцы, ещё не прочитанные с диска
+        'missing': set(table_columns(table_name)) - set(table_data),
+        # что видят процессы параллельного просмотра (см. parallel):
+        # None — таблица им не передана, иначе столбцы на момент передачи
+        # и сегменты, изменённые после неё
+        'shared': None,
+    }
+    with POOL_LOCK:
+        TABLES[table_name] = entry
+        TABLES.move_to_end(table_name)
+        evict(keep=table_name)
+    return entry
+
+
+def table_columns(table_name):
+    """
+    Возвращает столбцы таблицы по её записи в метаданных.
+    """
+
+    table_meta = utils.get_table_meta(get_metadata(), table_name)
+    return list(table_meta['columns']) if table_meta else []
+
+
+def missing_columns(entry, columns):
+    """
+    Возвращает столбцы из columns (None — все), не загруженные в запись пула.
+    """
+
+    if columns is None:
+        return entry['missing']
+    return entry['missing'].intersection(columns)
+
+
+def load_columns(entry, table_name, columns):
+    """
+    Догружает в запись пула столбцы того же снимка таблицы.
+
+    Данные записи заменяются новым словарём (а не дополняются на месте),
+    чтобы не мешать тем, кто в это время перебирает прежний.
+    """
+
+    if not columns:
+        return
+    part = utils.load_table_data(table_name, ['id', *columns])
+    merged = {**entry['data'], **{column: part[column] for column in columns}}
+    entry['data'] = {'table_name': table_name,
+                     **{column: merged[column]
+                        for column in table_columns(table_name)
+                        if column in merged}}
+    entry['missing'] = entry['missing'] - set(columns)
+    entry['bytes'] = decorators.estimate_size(entry['data'])
+    CHANGES['version'] += 1
+    metrics.increment('buffer_pool.column_loads', len(columns))
+
+
+def get_table(table_name, columns=None):
+    """
+    Возвращает данные таблицы из пула.
+
+    Возвращаемый словарь общий для всех вызовов: его нельзя изменять
+    напрямую, только через функции apply_* этого модуля.
+
+    Аргументы:
+        table_name (str): имя таблицы.
+        columns (iterable[str] | None): нужные столбцы (см. get_entry);
+            в данных могут быть и другие.
+
+    Возвращает:
+        dict: данные таблицы или пустой словарь, если таблицы нет.
+    """
+
+    entry = get_entry(table_name, columns)
+    return entry['data'] if entry else {}
+
+
+def get_id_index(table_name):
+    """
+    Возвращает поддерживаемый индекс первичного ключа таблицы {id: позиция}.
+    """
+
+    entry = get_entry(table_name, ('id',))
+    if entry['id_index'] is None:
+        ids = entry['data']['id']
+        id_index = indexes.build_id_index(ids)
+        for i in entry['deleted']:
+            if id_index.get(ids[i]) == i:
+                del id_index[ids[i]]
+        entry['id_index'] = id_index
+    return entry['id_index']
+
+
+def get_zones(table_name):
+    """
+    Возвращает карту зон сегментов таблицы (см. table_stats), строя её
+    при первом обращении.
+
+    Зоны описывают строки в том порядке, в каком они лежат в пуле, включая
+    помеченные удалёнными, и при изменениях только расширяются.
+    """
+
+    entry = get_entry(table_name, ())
+    if entry['zones'] is None:
+        entry = get_entry(table_name)
+        entry['zones'] = table_stats.build_zones(entry['data'])
+    return entry['zones']
+
+
+def get_codes(table_name, column):
+    """
+    Возвращает коды словаря столбца str (см. build_codes), строя их
+    при первом обращении.
+
+    Коды описывают строки в том порядке, в каком они лежат в пуле, включая
+    помеченные удалёнными, и при изменениях таблицы дополняются
+    (см. update_codes), а не строятся заново.
+    """
+
+    entry = get_entry(table_name, (column,))
+    if column not in entry['codes']:
+        entry['codes'][column] = build_codes(entry['data'][column])
+    return entry['codes'][column]
+
+
+def build_codes(values):
+    """
+    Кодирует столбец str словарём для проверки условий (см. core.encode_plan).
+
+    Возвращает:
+        tuple | None: (список различных значений, bytes — по коду на строку)
+        или None, если различных значений больше 256 или кодировать столбец
+        невыгодно (см. storage.dictionary_encode).
+    """
+
+    encoded = storage.dictionary_encode(values)
+    if encoded is None or encoded[1].typecode != 'B':
+        return None
+    dictionary, codes = encoded
+    return dictionary, codes.tobytes()
+
+
+def update_codes(entry, positions, columns):
+    """
+    Перекодирует строки с позициями positions в кодах словарей столбцов
+    columns после их изменения в пуле; добавленные строки дописываются
+    в конец кодов.
+
+    Новые значения добавляются в конец словаря, поэтому коды остальных
+    строк не меняются. Если различных значений становится больше 256,
+    коды столбца больше не ведутся (до перечитывания таблицы или vacuum).
+    Коды заменяются новым объектом bytes: ранее выданные читателям
+    остаются неизменными.
+    """
+
+    for column in columns:
+        pair = entry['codes'].get(column)
+        if pair is None:
+            continue
+        dictionary, codes = list(pair[0]), bytearray(pair[1])
+        lookup = {value: code for code, value in enumerate(dictionary)}
+        values = entry['data'][column]
+        codes.extend(bytes(len(values) - len(codes)))
+        for i in positions:
+            value = values[i]
+            if value not in lookup:
+                lookup[value] = len(dictionary)
+                dictionary.append(value)
+                if len(dictionary) > 256:
+                    break
+            codes[i] = lookup[value]
+        entry['codes'][column] = (dictionary, bytes(codes)) \
+            if len(dictionary) <= 256 else None
+
+
+def get_deleted(table_name):
+    """
+    Возвращает позиции удалённых строк таблицы, которые ещё хранятся
+    в столбцах пула и должны пропускаться при просмотре.
+    """
+
+    entry = TABLES.get(table_name)
+    return entry['deleted'] if entry is not None else set()
+
+
+def live_data(entry):
+    """
+    Возвращает данные записи пула без удалённых строк: сами данные,
+    если удалённых строк нет, иначе их копию.
+    """
+
+    table_data = entry['data']
+    deleted = entry['deleted']
+    if not deleted:
+        return table_data
+    keep = [i for i in range(len(table_data['id'])) if i not in deleted]
+    return {col: values if col == 'table_name' else [values[i] for i in keep]
+            for col, values in table_data.items()}
+
+
+def get_index(table_name, column):
+    """
+    Возвращает вторичный индекс таблицы по столбцу, загружая его при первом
+    обращении.
+
+    Файл индекса описывает снимок таблицы (см. save_indexes): он читается,
+    только если к снимку не применялся журнал и в памяти нет незаписанных
+    изменений, иначе индекс строится по данным таблицы в памяти.
+    """
+
+    entry = get_entry(table_name, ())
+    if column not in entry['indexes']:
+        if entry['signature'][1] is None and not entry['pending']:
+            entry['indexes'][column] = utils.load_index(table_name, column)
+        else:
+            entry = get_entry(table_name, (column,))
+            entry['indexes'][column] = build_index(entry, column)
+    return entry['indexes'][column]
+
+
+def build_index(entry, column):
+    """
+    Строит вторичный индекс по строкам записи пула без удалённых.
+    """
+
+    table_data = live_data(entry)
+    return indexes.build_index(table_data[column], table_data['id'])
+
+
+def table_indexes(table_name):
+    """
+    Возвращает столбцы вторичных индексов таблицы по её записи в метаданных.
+    """
+
+    table_meta = utils.get_table_meta(get_metadata(), table_name)
+    return table_meta.get('indexes', []) if table_meta else []
+
+
+def index_snapshot(entry, column):
+    # индекс из пула или, если его ещё не читали, построенный по данным
+    index = entry['indexes'].get(column)
+    return index if index is not None else build_index(entry, column)
+
+
+def save_indexes(table_name, entry):
+    """
+    Сохраняет вторичные индексы таблицы вместе с записью её снимка.
+
+    Между снимками индексы на диск не пишутся: изменения индексов
+    восстанавливаются из журнала таблицы (см. get_index), поэтому запись
+    строки не переписывает файлы индексов целиком.
+    """
+
+    for column in table_indexes(table_name):
+        utils.save_index(table_name, column, index_snapshot(entry, column))
+
+
+def get_derived(table_name, key, build, columns=None):
+    """
+    Возвращает производные данные таблицы (например, numpy-массив столбца),
+    вычисляя их при первом обращении.
+
+    Производные данные сбрасываются при любом изменении таблицы.
+
+    Аргументы:
+        table_name (str): имя таблицы.
+        key (hashable): ключ производных данных.
+        build (callable): функция от данных таблицы, вычисляющая значение.
+        columns (iterable[str] | None): столбцы, которые читает build
+            (см. get_entry); None — все.
+    """
+
+    entry = get_entry(table_name, columns)
+    if key not in entry['derived']:
+        entry['derived'][key] = build(entry['data'])
+    return entry['derived'][key]
+
+
+def get_array(table_name, column, build):
+    """
+    Возвращает numpy-массив столбца для проверки условий, вычисляя его
+    при первом обращении (хранится в производных данных таблицы).
+
+    Пока строки таблицы в пуле совпадают со снимком на диске, массив
+    берётся из хранилища без копирования (см. map_array у хранилищ —
+    столбцы int и bool поколоночного хранилища); иначе его строит build().
+    """
+
+    entry = get_entry(table_name, ())
+    key = ('array', column)
+    if key not in entry['derived']:
+        array = mapped_array(table_name, entry, column)
+        entry['derived'][key] = build() if array is None else array
+    return entry['derived'][key]
+
+
+def mapped_array(table_name, entry, column):
+    # отображение файла годится, только если позиции строк в пуле совпадают
+    # с позициями снимка: журнал к снимку не применялся, изменений
+    # и удалённых строк нет
+    if entry['signature'][1] is not None or entry['pending'] or \
+            entry['deleted'] or entry['dirty_segments'] != set():
+        return None
+    with locks.table_lock(table_name):
+        if table_signature(table_name) != entry['signature']:
+            return None
+        array = utils.get_table_storage(table_name).map_array(table_name, column)
+    if array is None or len(array) != len(entry['data']['id']):
+        return None
+    return array
+
+
+def set_index(table_name, column, index):
+    """
+    Сохраняет новый вторичный индекс таблицы в пуле и на диске.
+    """
+
+    entry = get_entry(table_name)
+    entry['indexes'][column] = index
+    utils.save_index(table_name, column, index)
+
+
+def forget_index(table_name, column):
+    """
+    Убирает удалённый вторичный индекс из пула.
+    """
+
+    entry = TABLES.get(table_name)
+    if entry is not None:
+        entry['indexes'].pop(column, None)
+
+
+def apply_insert(table_meta, rows):
+    """
+    Добавляет строки в таблицу в пуле и ставит их в очередь на запись.
+
+    Аргументы:
+        table_meta (dict): запись таблицы из метаданных.
+        rows (list[dict]): полные строки вида {column_name: value}, включая id.
+    """
+
+    table_name = table_meta['table_name']
+    entry = get_entry(table_name)
+    table_data = entry['data']
+    id_index = get_id_index(table_name)
+    columns = [col for col in table_data if col != 'table_name']
+    secondary = {col: get_index(table_name, col)
+                 for col in table_meta.get('indexes', [])}
+
+    start = len(table_data['id'])
+    for row in rows:
+        id_index[row['id']] = len(table_data['id'])
+        for col in columns:
+            table_data[col].append(row[col])
+        for col, index in secondary.items():
+            indexes.index_add(index, row[col], row['id'])
+
+    mark_segments(entry, range(start, len(table_data['id'])))
+    if entry['zones'] is not None:
+        table_stats.extend_zones(entry['zones'], table_data, start)
+    update_codes(entry, range(start, len(table_data['id'])), list(entry['codes']))
+    if 'stats' in table_meta:
+        table_stats.add_rows(table_meta['stats'], rows)
+    write(table_name, [{'op': 'insert', 'row': row} for row in rows])
+
+
+def apply_update(table_meta, positions, set_clause):
+    """
+    Изменяет строки таблицы в пуле и ставит изменение в очередь на запись.
+
+    Аргументы:
+        table_meta (dict): запись таблицы из метаданных.
+        positions (list[int]): позиции изменяемых строк.
+        set_clause (dict): новые значения вида {column_name: value}.
+    """
+
+    table_name = table_meta['table_name']
+    entry = get_entry(table_name)
+    table_data = entry['data']
+    ids = [table_data['id'][i] for i in positions]
+
+    for col in table_meta.get('indexes', []):
+        if col in set_clause:
+            index = get_index(table_name, col)
+            remove_from_index(index, table_data[col], positions, table_data['id'])
+            for ID in ids:
+                indexes.index_add(index, set_clause[col], ID)
+
+    for col, value in set_clause.items():
+        column = table_data[col]
+        for i in positions:
+            column[i] = value
+    mark_segments(entry, positions)
+    if entry['zones'] is not None:
+        table_stats.widen_zones(entry['zones'], positions, set_clause)
+    update_codes(entry, positions, set_clause)
+    if 'stats' in table_meta:
+        table_stats.update_rows(table_meta['stats'], set_clause)
+
+    write(table_name, [{'op': 'update', 'ids': ids, 'set': set_clause}])
+
+
+def apply_delete(table_meta, positions):
+    """
+    Помечает строки таблицы в пуле удалёнными и ставит удаление в очередь
+    на запись.
+
+    Строки остаются в столбцах, а их позиции попадают в набор удалённых,
+    который пропускается при просмотре таблицы, поэтому удаление стоит
+    пропорционально числу удаляемых строк. Когда доля удалённых строк
+    превышает constants.TOMBSTONE_COMPACT_FRACTION, они физически убираются
+    из столбцов (см. vacuum).
+
+    Аргументы:
+        table_meta (dict): запись таблицы из метаданных.
+        positions (list[int]): позиции удаляемых строк.
+    """
+
+    table_name = table_meta['table_name']
+    entry = get_entry(table_name)
+    table_data = entry['data']
+    ids = [table_data['id'][i] for i in positions]
+
+    for col in table_meta.get('indexes', []):
+        index = get_index(table_name, col)
+        remove_from_index(index, table_data[col], positions, table_data['id'])
+
+    id_index = get_id_index(table_name)
+    for ID in ids:
+        id_index.pop(ID, None)
+    entry['deleted'].update(positions)
+    if 'stats' in table_meta:
+        table_meta['stats']['rows'] -= len(positions)
+
+    write(table_name, [{'op': 'delete', 'ids': ids}])
+    if len(entry['deleted']) > \
+            constants.TOMBSTONE_COMPACT_FRACTION * len(table_data['id']):
+        vacuum(table_meta)
+
+
+def vacuum(table_meta):
+    """
+    Физически убирает удалённые строки из столбцов таблицы в пуле.
+
+    Содержимое таблицы не меняется, поэтому в журнал ничего не пишется:
+    снимок таблицы без удалённых строк будет записан при ближайшем
+    сворачивании журнала. Границы значений в статистике таблицы
+    уточняются по оставшимся строкам. Вызывается под исключительной
+    блокировкой таблицы (из apply_delete или команды vacuum).
+
+    Аргументы:
+        table_meta (dict): запись таблицы из метаданных.
+
+    Возвращает:
+        int: число убранных строк.
+    """
+
+    entry = get_entry(table_meta['table_name'])
+    deleted = entry['deleted']
+    if not deleted:
+        return 0
+
+    table_data = entry['data']
+    # строки после первой удалённой сдвигаются: меняются все их сегменты
+    mark_segments(entry, range(min(deleted), len(table_data['id'])))
+    entry['data'] = live_data(entry)
+    entry['deleted'] = set()
+    entry['id_index'] = None
+    entry['derived'] = {}
+    entry['zones'] = None
+    entry['codes'] = {}
+    entry['bytes'] = decorators.estimate_size(entry['data'])
+    if 'stats' in table_meta:
+        table_stats.refresh_bounds(table_meta['stats'], entry['data'])
+    CHANGES['version'] += 1
+    metrics.increment('buffer_pool.vacuumed_rows', len(deleted))
+    return len(deleted)
+
+
+def mark_segments(entry, positions):
+    """
+    Отмечает изменёнными сегменты, в которые попадают позиции строк: среди
+    сегментов снимка и среди сегментов, изменённых после передачи таблицы
+    процессам пула (см. parallel).
+    """
+
+    targets = [entry['dirty_segments']]
+    if entry['shared'] is not None:
+        targets.append(entry['shared']['changed'])
+    targets = [target for target in targets if target is not None]
+    if not targets:
+        return
+    size = constants.SEGMENT_ROWS
+    if isinstance(positions, range):
+        numbers = range(positions[0] // size, positions[-1] // size + 1) \
+            if positions else ()
+    else:
+        numbers = {i // size for i in positions}
+    for target in targets:
+        target.update(numbers)
+
+
+def remove_from_index(index, values, positions, ids):
+    """
+    Убирает строки с заданными позициями из вторичного индекса.
+    """
+
+    old_values = {}
+    for i in positions:
+        old_values.setdefault(values[i], set()).add(ids[i])
+    for value, value_ids in old_values.items():
+        indexes.index_remove(index, value, value_ids)
+
+
+def write(table_name, records):
+    """
+    Ставит записи журнала в очередь таблицы и сбрасывает её на диск
+    согласно constants.BUFFER_POOL_WRITE_POLICY.
+
+    При политике write_through изменения записываются сразу, при deferred —
+    когда очередь достигнет constants.BUFFER_POOL_FLUSH_RECORDS записей,
+    при вытеснении таблицы из пула, при вызове flush и, в любом случае,
+    перед снятием блокировки таблицы (см. locked_write). При уровне
+    надёжности batched изменения записывает фоновый поток (см. start_flusher).
+    Внутри транзакции изменения остаются в памяти до commit.
+    """
+
+    entry = TABLES[table_name]
+    entry['derived'] = {}
+    CHANGES['version'] += 1
+    entry['pending'].extend(records)
+    entry['bytes'] = decorators.estimate_size(entry['data'])
+
+    if TRANSACTION['active']:
+        TRANSACTION['tables'].add(table_name)
+    elif constants.DURABILITY == 'batched':
+        start_flusher()
+        FLUSHER['writes'] += len(records)
+        if FLUSHER['writes'] >= constants.DURABILITY_FLUSH_WRITES:
+            FLUSHER['wake'].set()
+    elif constants.BUFFER_POOL_WRITE_POLICY == 'write_through' or \
+            len(entry['pending']) >= constants.BUFFER_POOL_FLUSH_RECORDS:
+        flush_table(table_name)
+    evict(keep=table_name)
+
+
+def flush_table(table_name):
+    """
+    Записывает накопленные изменения таблицы на диск.
+
+    Очередь изменений дописывается в журнал одной операцией. Если журнал
+    стал слишком большим, в файл таблицы записывается её состояние из памяти
+    вместе с вторичными индексами и журнал удаляется — без повторного
+    чтения и применения журнала.
+
+    Таблицы, изменённые в активной транзакции, записываются только при commit.
+    """
+
+    entry = TABLES.get(table_name)
+    if entry is None or table_name in TRANSACTION['tables'] or \
+            not entry['pending']:
+        return
+
+    with locks.table_lock(table_name, exclusive=True):
+        utils.append_table_log(table_name, entry['pending'])
+
+        if utils.log_needs_compaction(table_name):
+            # удалённые строки в снимок не попадают; столбцы в памяти при этом
+            # не меняются (их могут читать), поэтому позиции снимка расходятся
+            # с позициями в памяти и следующий снимок пишется целиком
+            utils.save_table_data(table_name, live_data(entry),
+                                  segments=compacted_segments(entry))
+            # индексы пишутся, пока журнал ещё есть: до его удаления файлы
+            # индексов никто не читает (см. get_index)
+            save_indexes(table_name, entry)
+            utils.get_log_path(table_name).unlink()
+            entry['dirty_segments'] = None if entry['deleted'] else set()
+
+        # очередь очищается после новой подписи: пока она не пуста,
+        # get_entry в другом потоке (фоновая запись) не перечитывает таблицу
+        entry['signature'] = table_signature(table_name)
+        entry['pending'] = []
+
+
+def compacted_segments(entry):
+    """
+    Возвращает изменённые сегменты для записи снимка таблицы: None
+    (снимок целиком), если в столбцах есть удалённые строки.
+    """
+
+    return None if entry['deleted'] else entry['dirty_segments']
+
+
+def flush():
+    """
+    Записывает на диск изменения всех таблиц пула.
+    """
+
+    for table_name in list(TABLES):
+        flush_table(table_name)
+
+
+def start_flusher():
+    """
+    Запускает фоновый поток записи изменений, если он ещё не запущен.
+
+    Поток раз в constants.DURABILITY_FLUSH_MS миллисекунд (или раньше,
+    если накопилось constants.DURABILITY_FLUSH_WRITES изменений) записывает
+    на диск изменения всех таблиц пула одной пачкой, сбрасывая
+    файлы на диск (fsync). При завершении интерпретатора поток
+    останавливается и записывает оставшиеся изменения.
+    """
+
+    with FLUSH_LOCK:
+        if FLUSHER['thread'] is not None:
+            return
+        stop, wake = threading.Event(), threading.Event()
+        thread = threading.Thread(target=run_flusher, args=(stop, wake),
+                                  name='flusher', daemon=True)
+        FLUSHER.update(thread=thread, stop=stop, wake=wake, writes=0)
+        thread.start()
+        if not FLUSHER['atexit']:
+            atexit.register(stop_flusher)
+            FLUSHER['atexit'] = True
+
+
+def run_flusher(stop, wake):
+    # тело фонового потока записи (см. start_flusher)
+    while not stop.is_set():
+        wake.wait(constants.DURABILITY_FLUSH_MS / 1000)
+        wake.clear()
+        with FLUSH_LOCK:
+            if TRANSACTION['active']:
+                continue
+            FLUSHER['writes'] = 0
+            try:
+                flush()
+            except OSError as e:
+                print(f'Ошибка фоновой записи: {e}', file=sys.stderr)
+
+
+def stop_flusher():
+    """
+    Останавливает фоновый поток записи и записывает оставшиеся изменения.
+    """
+
+    thread = FLUSHER['thread']
+    if thread is None:
+        return
+    FLUSHER['stop'].set()
+    FLUSHER['wake'].set()
+    thread.join()
+    FLUSHER['thread'] = None
+    with FLUSH_LOCK:
+        if not TRANSACTION['active']:
+            flush()
+
+
+def evict(keep=None):
+    """
+    Вытесняет давно не использованные таблицы, пока суммарный объём пула
+    превышает constants.BUFFER_POOL_MAX_BYTES. Перед вытеснением изменения
+    таблицы записываются на диск; таблицы активной транзакции не вытесняются.
+
+    Аргументы:
+        keep (str | None): таблица, которую вытеснять нельзя.
+    """
+
+    with POOL_LOCK:
+        total = pool_bytes()
+        for table_name in list(TABLES):
+            if total <= constants.BUFFER_POOL_MAX_BYTES:
+                break
+            if table_name == keep or table_name in TRANSACTION['tables']:
+                continue
+            flush_table(table_name)
+            total -= TABLES.pop(table_name)['bytes']
+            metrics.increment('buffer_pool.evictions')
+
+
+def discard(table_name):
+    """
+    Убирает таблицу из пула без записи изменений (после create_table
+    или drop_table).
+    """
+
+    TABLES.pop(table_name, None)
+    CHANGES['version'] += 1
+
+
+def begin():
+    """
+    Начинает транзакцию.
+
+    Накопленные ранее изменения сбрасываются на диск, затем запоминается
+    снимок метаданных. До commit изменения таблиц и метаданных остаются
+    только в памяти.
+    """
+
+    with FLUSH_LOCK:
+        flush()
+        TRANSACTION['active'] = True
+        TRANSACTION['metadata'] = copy.deepcopy(get_metadata())
+        TRANSACTION['tables'] = set()
+
+
+def commit():
+    """
+    Фиксирует транзакцию одной групповой записью.
+
+    Для каждой изменённой таблицы во временный файл пишется новая версия
+    журнала (прежний журнал и очередь изменений) или, если журнал стал
+    слишком большим, новый снимок таблицы с её вторичными индексами;
+    туда же пишутся метаданные. Затем все файлы заменяются вместе через
+    utils.commit_files.
+
+    Фиксация идёт под исключительными блокировками изменённых таблиц.
+    Если другой процесс успел изменить одну из них после того, как
+    транзакция начала её менять, транзакция отменяется.
+
+    Возвращает:
+        set | None: имена изменённых таблиц или None, если транзакция
+        отменена из-за конфликта.
+    """
+
+    tables = TRANSACTION['tables']
+    with ExitStack() as stack:
+        for table_name in sorted(tables):
+            stack.enter_context(locks.table_lock(table_name, exclusive=True))
+        if any(TABLES[table_name]['signature'] != table_signature(table_name)
+               for table_name in tables):
+            rollback()
+            return None
+
+        renames, removals = [], []
+        for table_name in tables:
+            stage_table(table_name, renames, removals)
+        with locks.metadata_lock(exclusive=True):
+            merged = merge_metadata(tables)
+            renames.append(utils.stage_metadata(merged))
+            utils.commit_files(renames, removals)
+            METADATA['signature'] = file_signature(constants.METADATA_JSON)
+            replace_metadata(merged)
+
+        for table_name in tables:
+            entry = TABLES[table_name]
+            entry['pending'] = []
+            # журнал удаляется, только если записан новый снимок таблицы
+            if utils.get_log_path(table_name) in removals:
+                entry['dirty_segments'] = None if entry['deleted'] else set()
+            utils.get_table_storage(table_name).cleanup(table_name)
+            entry['signature'] = table_signature(table_name)
+
+    end_transaction()
+    evict()
+    return tables
+
+
+def stage_table(table_name, renames, removals):
+    """
+    Записывает во временные файлы изменения таблицы из транзакции.
+
+    Аргументы:
+        table_name (str): имя таблицы.
+        renames (list): сюда добавляются пары (временный файл, основной файл).
+        removals (list): сюда добавляются файлы, удаляемые при фиксации.
+    """
+
+    entry = TABLES[table_name]
+    log_path = utils.get_log_path(table_name)
+    log = log_path.read_text(encoding='utf-8') if log_path.exists() else ''
+    log += utils.format_log_records(entry['pending'])
+
+    table_storage = utils.get_table_storage(table_name)
+    threshold = max(constants.WAL_COMPACT_THRESHOLD, table_storage.size(table_name))
+    if len(log.encode('utf-8')) > threshold:
+        renames.extend(table_storage.stage(table_name, live_data(entry),
+                                           segments=compacted_segments(entry)))
+        renames.extend(utils.stage_index(table_name, col, index_snapshot(entry, col))
+                       for col in table_indexes(table_name))
+        removals.append(log_path)
+    else:
+        renames.append(utils.stage_file(log_path, log))
+
+
+def rollback():
+    """
+    Отменяет транзакцию: изменённые таблицы убираются из пула (при следующем
+    обращении они будут прочитаны с диска), метаданные возвращаются
+    к снимку, сделанному в begin.
+
+    Возвращает:
+        set: имена изменённых таблиц.
+    """
+
+    tables = TRANSACTION['tables']
+    for table_name in tables:
+        discard(table_name)
+    METADATA['data'][:] = TRANSACTION['metadata']
+
+    end_transaction()
+    return tables
+
+
+def end_transaction():
+    TRANSACTION['active'] = False
+    TRANSACTION['metadata'] = None
+    TRANSACTION['tables'] = set()
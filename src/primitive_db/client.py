@@ -0,0 +1,111 @@
+"""
+Клиент сервера базы данных (database serve).
+
+Пример:
+
+    from src.primitive_db import client
+
+    with client.Client(port=5433) as db:
+        ok, output = db.execute('select from users where age > 18')
+
+Для asyncio есть open_connection и execute_async.
+"""
+import asyncio
+import socket
+
+from src.primitive_db import constants
+
+
+def encode_command(command):
+    """
+    Кодирует команду в строку протокола.
+
+    Исключения:
+        ValueError: команда занимает несколько строк.
+    """
+
+    if '\n' in command or '\r' in command:
+        raise ValueError('Команда должна занимать одну строку.')
+    return command.encode('utf-8') + b'\n'
+
+
+def parse_header(line):
+    """
+    Разбирает заголовок ответа «ok <длина>» или «error <длина>».
+
+    Возвращает:
+        tuple: (успех, длина вывода в байтах).
+
+    Исключения:
+        ConnectionError: сервер закрыл соединение или прислал не заголовок.
+    """
+
+    status, _, length = line.decode('ascii', errors='replace').strip().partition(' ')
+    if status not in ('ok', 'error') or not length.isdigit():
+        raise ConnectionError('Сервер закрыл соединение.')
+    return status == 'ok', int(length)
+
+
+class Client:
+    """
+    Синхронное соединение с сервером. Команды выполняются по одной.
+    """
+
+    def __init__(self, host=constants.SERVER_HOST, port=constants.SERVER_PORT,
+                 timeout=None):
+        self.sock = socket.create_connection((host, port), timeout)
+        self.file = self.sock.makefile('rb')
+
+    def execute(self, command):
+        """
+        Выполняет команду на сервере.
+
+        Возвращает:
+            tuple: (успех, вывод команды).
+        """
+
+        self.sock.sendall(encode_command(command))
+        ok, length = parse_header(self.file.readline())
+        payload = self.file.read(length)
+        if len(payload) < length:
+            raise ConnectionError('Сервер закрыл соединение.')
+        return ok, payload.decode('utf-8')
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+async def open_connection(host=constants.SERVER_HOST, port=constants.SERVER_PORT):
+    """
+    Открывает соединение с сервером для asyncio.
+
+    Возвращает:
+        tuple: (asyncio.StreamReader, asyncio.StreamWriter).
+    """
+
+    return await asyncio.open_connection(host, port)
+
+
+async def execute_async(reader, writer, command):
+    """
+    Выполняет команду на сервере через соединение из open_connection.
+
+    Возвращает:
+        tuple: (успех, вывод команды).
+    """
+
+    writer.write(encode_command(command))
+    await writer.drain()
+    ok, length = parse_header(await reader.readline())
+    try:
+        payload = await reader.readexactly(length)
+    except asyncio.IncompleteReadError as e:
+        raise ConnectionError('Сервер закрыл соединение.') from e
+    return ok, payload.decode('utf-8')
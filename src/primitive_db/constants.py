@@ -1,10 +1,83 @@
+import os
 from pathlib import Path
 
 from src.primitive_db import decorators
 
-SELECT_CACHE, SELECT_CACHE_STORE = decorators.create_cacher()
+# ограничения кэша select: число результатов и их примерный объём в байтах
+SELECT_CACHE_MAX_ENTRIES = 128
+SELECT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+SELECT_CACHE, SELECT_CACHE_STORE = decorators.create_cacher(
+    SELECT_CACHE_MAX_ENTRIES, SELECT_CACHE_MAX_BYTES, 'select_cache'
+)
 
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 
 TABLE_DATA_DIR = PROJECT_ROOT / 'src' / 'primitive_db' / 'data'
 METADATA_JSON = PROJECT_ROOT / 'src' / 'primitive_db' / 'db_meta.json'
+
+# формат хранения новых таблиц: json, columnar или segmented
+DEFAULT_STORAGE = 'segmented'
+# число строк в сегменте: единица хранения формата segmented
+# и параллельного просмотра таблицы
+SEGMENT_ROWS = 65_536
+
+# размер журнала изменений (в байтах), после которого он сворачивается в файл таблицы
+WAL_COMPACT_THRESHOLD = 1024 * 1024
+
+# словарное кодирование столбцов str: значения заменяются номерами в
+# отсортированном списке различных значений, если их не больше
+# DICTIONARY_MAX_SIZE и не больше DICTIONARY_MAX_FRACTION от числа строк
+DICTIONARY_MAX_SIZE = 65_536
+DICTIONARY_MAX_FRACTION = 0.5
+# сжатие файлов сегментов таблиц: none или zlib
+STORAGE_COMPRESSION = 'none'
+
+# доля удалённых, но ещё не вычищенных строк таблицы в памяти, после
+# которой они физически убираются из столбцов (см. buffer_pool.vacuum)
+TOMBSTONE_COMPACT_FRACTION = 0.25
+
+# число хешей, по которым статистика таблицы оценивает число различных
+# значений столбца (погрешность оценки — около 1 / sqrt(STATS_SKETCH_SIZE))
+STATS_SKETCH_SIZE = 128
+
+# число пар строк соединения (join), которые условие WHERE, относящееся
+# к обеим таблицам, проверяет за один раз
+JOIN_BATCH_SIZE = 10_000
+
+# число строк, которые массовая вставка и импорт проверяют и записывают за один раз
+INSERT_BATCH_SIZE = 10_000
+
+# уровень надёжности записи: sync — каждое изменение сбрасывается на диск
+# (fsync) до завершения команды, batched — изменения накапливаются и фоновый
+# поток записывает их с fsync раз в DURABILITY_FLUSH_MS миллисекунд или
+# после DURABILITY_FLUSH_WRITES изменений, none — без fsync
+DURABILITY = 'sync'
+DURABILITY_FLUSH_MS = 200
+DURABILITY_FLUSH_WRITES = 1000
+
+# буферный пул таблиц: предельный объём разобранных таблиц в памяти (в байтах)
+BUFFER_POOL_MAX_BYTES = 512 * 1024 * 1024
+# политика записи изменений: write_through — сразу, deferred — накопленными пачками
+BUFFER_POOL_WRITE_POLICY = 'write_through'
+# при политике deferred — число изменений, после которого таблица сбрасывается на диск
+BUFFER_POOL_FLUSH_RECORDS = 10_000
+
+# режим вывода select: table — одна таблица, stream — постранично по мере чтения,
+# tsv — строки через табуляцию для обработки программами
+SELECT_OUTPUT_MODE = 'table'
+# число строк на странице в режиме stream
+SELECT_PAGE_SIZE = 50
+
+# число процессов для параллельного просмотра сегментов; 1 — без параллельности
+PARALLEL_WORKERS = os.cpu_count() or 1
+# таблицы меньше этого числа строк просматриваются в одном процессе
+PARALLEL_MIN_ROWS = 200_000
+
+# число разобранных команд в LRU-кэше разбора
+STATEMENT_CACHE_SIZE = 1024
+
+# режим сервера (database serve): адрес, порт и число потоков, выполняющих команды
+SERVER_HOST = '127.0.0.1'
+SERVER_PORT = 5433
+SERVER_WORKERS = 8
@@ -1,14 +1,39 @@
+import csv
+import heapq
+import itertools
 import os
+import sys
 
 from prettytable import PrettyTable
 
-from src.primitive_db import constants, decorators, utils
+from src.primitive_db import (
+    aggregates,
+    buffer_pool,
+    constants,
+    decorators,
+    indexes,
+    joins,
+    metrics,
+    parallel,
+    predicates,
+    storage,
+    table_stats,
+    utils,
+)
+
+COLUMN_TYPES = {'int': int, 'str': str, 'bool': bool}
+# допустимые значения столбцов int: поколоночное хранилище и numpy хранят
+# их как int64
+INT_MIN, INT_MAX = -2 ** 63, 2 ** 63 - 1
 
 
 @decorators.handle_db_errors
+@buffer_pool.locked_write
 def create_table(metadata, table_name, columns):
     """
-    Создаёт новую таблицу в метаданных и создаёт соответствующий JSON-файл.
+    Создаёт новую таблицу в метаданных и пустое хранилище таблицы в формате
+    constants.DEFAULT_STORAGE (по умолчанию segmented — каталог
+    <таблица>.segments с manifest.json, см. storage.SegmentedStorage).
 
     Аргументы:
         metadata (list): список словарей с описанием всех таблиц.
@@ -20,42 +45,52 @@ def create_table(metadata, table_name, columns):
         • проверяет корректность типов столбцов;
         • не допускает создание таблицы с существующим именем;
         • автоматически добавляет столбец id, если он не указан;
-        • создаёт пустой JSON-файл для таблицы;
-        • очищает кэш SELECT.
+        • заводит в метаданных счётчик id и статистику таблицы;
+        • записывает пустой снимок таблицы (для segmented — manifest.json
+          без сегментов) и удаляет старый журнал;
+        • сбрасывает кэш SELECT этой таблицы.
     """
 
     # допустимые типы
     if not all(t in ('int', 'str', 'bool') for t in columns.values()):
-        print('Недопустимые типы данных. Можно использовать только int, bool, str.')
+        decorators.report_error('Недопустимые типы данных. '
+                                'Можно использовать только int, bool, str.')
         return
     
     # проверка на существование таблицы
     if metadata and any(table['table_name'] == table_name for table in metadata):
-        print('Такая таблица уже существует.')
+        decorators.report_error('Такая таблица уже существует.')
         return
 
     # если нет ID, добавляем автоматически
     if 'id' not in (name.lower() for name in columns.keys()):
         columns = {'id': 'int', **columns}
 
-    # создаём запись
+    # создаём запись со счётчиком id и статистикой пустой таблицы
     metadata.append({
         'table_name': table_name,
-        'columns': columns
+        'columns': columns,
+        'next_id': 1,
+        'stats': table_stats.new_stats(columns),
     })
-    print(f'Таблица {table_name} успешно создана.')
+    decorators.report(f'Таблица {table_name} успешно создана.')
 
-    # создаем json структуру файла таблицы
+    # пустой снимок таблицы в формате хранения по умолчанию
     new_table = {'table_name': table_name}
     for column_name in list(columns.keys()):
         new_table[column_name] = []
-    utils.save_table_data(table_name, new_table)
+    utils.save_table_data(table_name, new_table, columns)
+    log_path = utils.get_log_path(table_name)
+    if log_path.exists():
+        log_path.unlink()
+    buffer_pool.discard(table_name)
 
-    constants.SELECT_CACHE_STORE.clear()
+    constants.SELECT_CACHE_STORE.invalidate(table_name)
 
 
 @decorators.handle_db_errors
 @decorators.confirm_action('удаление таблицы')
+@buffer_pool.locked_write
 def drop_table(metadata, table_name):
     """
     Удаляет таблицу из метаданных и физически удаляет её JSON-файл.
@@ -67,165 +102,707 @@ def drop_table(metadata, table_name):
     Поведение:
         • проверяет, существует ли таблица;
         • удаляет её запись из метаданных;
-        • удаляет файл таблицы, если он существует;
-        • очищает кэш SELECT.
+        • удаляет файл таблицы, её журнал и индексы, если они существуют;
+        • сбрасывает кэш SELECT этой таблицы.
     """
 
     for i, table in enumerate(metadata):
         if table['table_name'] == table_name:
             del metadata[i]
-            table_path = utils.get_table_path(table_name)
-            if os.path.exists(table_path):
-                os.remove(table_path)
-            print(f'Таблица {table_name} удалена.')
+            utils.get_table_storage(table_name).remove(table_name)
+            index_paths = [utils.get_index_path(table_name, column)
+                           for column in table.get('indexes', [])]
+            for path in (utils.get_log_path(table_name), *index_paths):
+                if os.path.exists(path):
+                    os.remove(path)
+            buffer_pool.discard(table_name)
+            decorators.report(f'Таблица {table_name} удалена.')
+            constants.SELECT_CACHE_STORE.invalidate(table_name)
             return
-    print('Такой таблицы не существует.')
-    constants.SELECT_CACHE_STORE.clear()
+    decorators.report_error('Такой таблицы не существует.')
 
 
-def clean_values(values):
+def validate_row(columns, row):
     """
-    Подготавливает значения INSERT: убирает скобки/запятые и приводит типы.
+    Проверяет строку на соответствие схеме таблицы.
 
     Аргументы:
-        values (list[str]): сырые строковые значения из команды INSERT.
+        columns (dict): столбцы таблицы вида {column_name: type}.
+        row (dict): значения строки вида {column_name: value};
+            id может отсутствовать.
 
     Возвращает:
-        tuple: очищенные и сконвертированные значения (int, float, bool или str).
-    """
-
-    cleaned_raw = []
-    for value in values:
-        value = value.strip()
-
-        if value.startswith("("):
-            value = value[1:]
-        if value.endswith(")") or value.endswith(","):
-            value = value[:-1]
-
-        cleaned_raw.append(value)
-
-    def convert(value):
-        v = value.strip()
-        if v.lower() == "true":
-            return True
-        if v.lower() == "false":
-            return False
-        if v.isdigit():
-            return int(v)
-        try:
-            return float(v)
-        except ValueError:
-            return v  
-    
-    values_cleaned = tuple(convert(v) for v in cleaned_raw)
-    return values_cleaned
+        str | None: описание ошибки или None, если строка корректна.
+    """
+
+    if set(row) | {'id'} != set(columns):
+        return f'Неправильный набор столбцов. Таблица содержит {len(columns) - 1} ' \
+               'столбцов (не учитывая id)'
+    return validate_values(columns, row)
+
+
+def validate_values(columns, values):
+    """
+    Проверяет, что значения соответствуют типам своих столбцов, а целые
+    числа укладываются в int64 (INT_MIN..INT_MAX).
+
+    Аргументы:
+        columns (dict): столбцы таблицы вида {column_name: type}.
+        values (dict): значения вида {column_name: value}; все столбцы
+            должны быть в таблице.
+
+    Возвращает:
+        str | None: описание ошибки или None, если значения корректны.
+    """
+
+    for col_name, value in values.items():
+        expected = COLUMN_TYPES[columns[col_name]]
+        if not isinstance(value, expected):
+            return f'Значение {value} не соответствует типу колонки {columns[col_name]}'
+        if expected is int and not INT_MIN <= value <= INT_MAX:
+            return f'Значение {value} выходит за пределы типа int ' \
+                   f'({INT_MIN}..{INT_MAX})'
+    return None
+
+
+def cast_csv_row(columns, row):
+    """
+    Приводит строковые значения строки CSV к типам столбцов таблицы.
+
+    Аргументы:
+        columns (dict): столбцы таблицы вида {column_name: type}.
+        row (dict): строка CSV вида {column_name: str}.
+
+    Возвращает:
+        dict: строка с приведёнными значениями; значения неизвестных
+        столбцов и некорректные значения остаются строками и отсеиваются
+        при проверке validate_row.
+    """
+
+    casted = {}
+    for col_name, value in row.items():
+        match columns.get(col_name):
+            case 'int' if value.strip().lstrip('-').isdigit():
+                casted[col_name] = int(value)
+            case 'bool' if value.strip().lower() in ('true', 'false'):
+                casted[col_name] = value.strip().lower() == 'true'
+            case _:
+                casted[col_name] = value
+    return casted
+
+
+def batched(iterable, size):
+    """
+    Разбивает поток на списки длиной не более size, не читая его целиком.
+    """
+
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def prepare_insert_batch(table_meta, table_data, id_index, batch, offset):
+    """
+    Проверяет пачку строк и выдаёт им id.
+
+    Аргументы:
+        table_meta (dict): запись таблицы из метаданных.
+        table_data (dict): данные таблицы.
+        id_index (dict): индекс первичного ключа таблицы.
+        batch (list[dict]): строки пачки.
+        offset (int): число строк, добавленных до этой пачки
+            (для нумерации строк в сообщениях об ошибках).
+
+    Возвращает:
+        list[dict] | None: строки вместе с id или None, если в пачке есть
+        некорректная строка (тогда счётчик id возвращается в исходное
+        состояние).
+    """
+
+    next_id = table_meta.get('next_id')
+    batch_ids = set()
+    rows = []
+    for number, row in enumerate(batch, start=offset + 1):
+        error = validate_row(table_meta['columns'], row)
+        ID = row.get('id')
+        if error is None and ID is not None and \
+                (ID in id_index or ID in batch_ids):
+            error = f'Такой id уже есть: {ID}'
+        if error is not None:
+            decorators.report_error(f'Строка {number}: {error}.')
+            if next_id is not None:
+                table_meta['next_id'] = next_id
+            return None
+
+        ID = indexes.allocate_id(table_meta, table_data['id'], ID)
+        batch_ids.add(ID)
+        rows.append({'id': ID, **row})
+    return rows
+
+
+def insert_rows(metadata, table_name, rows):
+    """
+    Добавляет в таблицу поток строк пачками.
+
+    Аргументы:
+        metadata (list): список таблиц.
+        table_name (str): имя таблицы.
+        rows (iterable[dict]): строки вида {column_name: value};
+            если id не указан, он берётся из счётчика автоинкремента.
+
+    Поведение:
+        • читает строки пачками по constants.INSERT_BATCH_SIZE;
+        • проверяет всю пачку до записи; при первой ошибке пачка
+          отбрасывается и загрузка прекращается;
+        • добавляет пачку в буферный пул, который записывает её в журнал
+          таблицы и обновляет индексы.
+
+    Возвращает:
+        int | None: число добавленных строк или None, если таблицы нет.
+    """
+
+    table_meta = utils.get_table_meta(metadata, table_name)
+    table_data = buffer_pool.get_table(table_name) if table_meta else {}
+    if not table_data:
+        decorators.report_error('Такой таблицы не существует.')
+        return None
+
+    id_index = buffer_pool.get_id_index(table_name)
+    inserted = 0
+    for batch in batched(rows, constants.INSERT_BATCH_SIZE):
+        batch_rows = prepare_insert_batch(table_meta, table_data, id_index, batch,
+                                          inserted)
+        if batch_rows is None:
+            break
+        buffer_pool.apply_insert(table_meta, batch_rows)
+        inserted += len(batch_rows)
+
+    metrics.increment('rows.inserted', inserted)
+    constants.SELECT_CACHE_STORE.invalidate(table_name)
+    return inserted
 
 
 @decorators.handle_db_errors
 @decorators.log_time
+@buffer_pool.locked_write
 def insert(metadata, table_name, values):
     """
-    Добавляет строку в таблицу.
+    Добавляет одну или несколько строк в таблицу.
 
     Аргументы:
         metadata (list): список таблиц.
         table_name (str): имя таблицы.
-        values (list[str]): значения, переданные пользователем.
+        values (list[tuple]): значения строк, уже приведённые к типам
+            (см. statements.parse); в строке либо все столбцы, кроме id,
+            либо id и все столбцы.
 
     Поведение:
-        • определяет ID автоматически или принимает от пользователя;
+        • определяет ID по счётчику автоинкремента или принимает от пользователя;
         • проверяет соответствие типов значений столбцам;
-        • добавляет новые данные в JSON-файл таблицы;
-        • очищает кэш SELECT.
+        • дописывает новые строки в журнал изменений таблицы;
+        • обновляет вторичные индексы таблицы;
+        • сбрасывает кэш SELECT этой таблицы.
     """
 
-    values = clean_values(values)
-
-    # проверка на существование таблицы
-    if metadata and any(table['table_name'] == table_name for table in metadata):
-        table_to_insert = utils.load_table_data(table_name)
-        if not table_to_insert:
-            print('Произошла ошибка, попробуйте снова')
-            return
-    else:
-        print('Такой таблицы не существует.')
+    table_meta = utils.get_table_meta(metadata, table_name)
+    if table_meta is None:
+        decorators.report_error('Такой таблицы не существует.')
         return
-        
+
     # проверка на длину значений
-    values_len = len(values)
-    input_with_id = False
-    if values_len == len(table_to_insert) - 1:
-        input_with_id = True
-    if not input_with_id and values_len != len(table_to_insert) - 2:
-        print('Неправильное число значений. ' + \
-              f'Таблица {table_name} содержит {len(table_to_insert) - 2} столбцов ' + \
+    data_columns = [col for col in table_meta['columns'] if col != 'id']
+    rows = []
+    for row_values in values:
+        if len(row_values) == len(data_columns) + 1:
+            rows.append(dict(zip(['id', *data_columns], row_values)))
+        elif len(row_values) == len(data_columns):
+            rows.append(dict(zip(data_columns, row_values)))
+        else:
+            decorators.report_error(
+                'Неправильное число значений. '
+                f'Таблица {table_name} содержит {len(data_columns)} столбцов '
                 '(не учитывая id)')
-        return
-    
-    # добавление id
-    if input_with_id:
-        values = values[1:]
-        ID = values[0]
-        if ID in table_to_insert['id']:
-            print('Такой id уже есть.')
             return
+
+    inserted = insert_rows(metadata, table_name, rows)
+    if inserted == len(rows) == 1:
+        decorators.report('Данные успешно добавлены.')
+    elif inserted:
+        decorators.report(f'Добавлено строк: {inserted}.')
+
+
+@decorators.handle_db_errors
+@decorators.log_time
+@buffer_pool.locked_write
+def import_rows(metadata, table_name, filepath):
+    """
+    Загружает строки в таблицу из файла CSV или JSONL.
+
+    Аргументы:
+        metadata (list): список таблиц.
+        table_name (str): имя таблицы.
+        filepath (str): путь к файлу .csv (первая строка — имена столбцов)
+            или .jsonl (по одному JSON-объекту на строку).
+
+    Поведение:
+        • читает файл потоком, не загружая его в память целиком;
+        • для CSV приводит значения к типам столбцов таблицы;
+        • добавляет строки пачками через insert_rows.
+    """
+
+    table_meta = utils.get_table_meta(metadata, table_name)
+    if table_meta is None:
+        decorators.report_error('Такой таблицы не существует.')
+        return
+
+    rows = utils.read_import_file(filepath)
+    if str(filepath).endswith('.csv'):
+        rows = (cast_csv_row(table_meta['columns'], row) for row in rows)
+
+    inserted = insert_rows(metadata, table_name, rows)
+    if inserted is not None:
+        decorators.report(f'Импортировано строк: {inserted}.')
+
+
+def index_candidates(plan, table_data, table_meta):
+    """
+    Находит позиции строк-кандидатов по индексам, если условие это позволяет.
+
+    Индекс используется для равенства или in по столбцу id или столбцу
+    со вторичным индексом — как самостоятельного условия или одной из
+    частей and.
+
+    Возвращает:
+        list[int] | None: отсортированные позиции кандидатов или None,
+        если индекс неприменим.
+    """
+
+    if plan[0] == 'and':
+        for part in plan[1]:
+            candidates = index_candidates(part, table_data, table_meta)
+            if candidates is not None:
+                return candidates
+        return None
+
+    if plan[0] == 'cmp' and plan[2] == '=':
+        values = (plan[3],)
+    elif plan[0] == 'in':
+        values = plan[2]
     else:
-        if not table_to_insert['id']:
-            ID = 1
-        else:
-            ID = max(table_to_insert['id']) + 1
-    table_to_insert['id'].append(ID)
+        return None
 
-    # валидация данных
-    for table in metadata:
-        if table['table_name'] == table_name:
-            columns = table['columns']
-    for value, column_type in zip(values, list(columns.values())[1:]):
-        match column_type:
-            case 'int':
-                if not isinstance(value, int):
-                    print(f'Значение {value} не соответствует типу колноки int')
-                    return
-            case 'str':
-                if not isinstance(value, str):
-                    print(f'Значение {value} не соответствует типу колноки str')
-                    return
-            case 'bool':
-                if not isinstance(value, bool):
-                    print(f'Значение {value} не соответствует типу колноки bool')
-                    return
-
-    # вставка данных
-    columns_to_insert = [col_name for col_name in table_to_insert.keys() 
-                         if col_name not in ('table_name', 'id')]
-    for value, col_name in zip(values, columns_to_insert):
-        table_to_insert[col_name].append(value)
-    utils.save_table_data(table_name, table_to_insert)
-    print('Данные успешно добавлены.')
-    
-    constants.SELECT_CACHE_STORE.clear()
+    col_name = plan[1]
+    indexed = table_meta is not None and col_name in table_meta.get('indexes', [])
+    if col_name != 'id' and not indexed:
+        return None
+
+    if table_meta is None:
+        id_index = indexes.build_id_index(table_data['id'])
+    else:
+        id_index = buffer_pool.get_id_index(table_meta['table_name'])
+
+    if col_name == 'id':
+        positions = {id_index[value] for value in values if value in id_index}
+    else:
+        index = buffer_pool.get_index(table_meta['table_name'], col_name)
+        positions = {id_index[ID] for value in values for ID in index.get(value, [])}
+    return sorted(positions)
+
+
+def iter_positions_by_where_clause(clause, table_data, table_meta=None,
+                                   parallel_scan=True):
+    """
+    Перечисляет позиции строк, удовлетворяющих условию WHERE.
+
+    Если часть условия покрыта индексом (id или вторичным), проверяются
+    только найденные по нему строки. Иначе условие вычисляется целыми
+    столбцами: через numpy, если он установлен и столбцы числовые;
+    для большой таблицы — параллельно по сегментам (см. parallel.scan);
+    иначе лениво через map/compress — тогда перебор останавливается,
+    как только потребитель перестаёт запрашивать позиции.
+
+    Сегменты таблицы, в которых по карте зон (см. table_stats) условие
+    не может выполниться, не просматриваются. Строки, помеченные
+    удалёнными в буферном пуле, пропускаются (индексы их уже не содержат).
+
+    Аргументы:
+        clause (tuple | dict): план условия (см. predicates.parse_where)
+            или условие равенства вида {column: value}.
+        table_data (dict): данные таблицы без поля table_name.
+        table_meta (dict | None): запись таблицы из метаданных; если задана,
+            используются индексы и кэш столбцов из буферного пула.
+        parallel_scan (bool): разрешить параллельный просмотр; select
+            с limit его не использует, чтобы остановиться на первых строках.
+
+    Возвращает:
+        iterator[int]: позиции подходящих строк в порядке их хранения.
+    """
+
+    plan = clause if isinstance(clause, tuple) else predicates.from_dict(clause)
+    columns = table_meta['columns'] if table_meta else {}
+
+    candidates = index_candidates(plan, table_data, table_meta)
+    if candidates is not None:
+        return predicates.evaluate(plan, table_data, columns, positions=candidates)
+
+    # зоны сегментов и параллельный просмотр работают с исходным условием,
+    # сам просмотр — с условием на коды словарей столбцов str
+    segments = prune_segments(plan, table_data, table_meta)
+    scan_plan, scan_data, scan_columns = encode_plan(plan, table_data, table_meta)
+
+    get_array = None
+    if table_meta is not None:
+        def get_array(column):
+            return buffer_pool.get_array(
+                table_meta['table_name'], column,
+                lambda: predicates.as_array(scan_data[column]),
+            )
+
+    if segments is not None:
+        return skip_deleted(itertools.chain.from_iterable(
+            predicates.evaluate(scan_plan, scan_data, scan_columns, get_array,
+                                segment)
+            for segment in segments
+        ), table_meta)
+
+    fully_encoded = all(leaf[1] not in columns
+                        for leaf in predicates.leaves(scan_plan))
+    if parallel_scan and table_meta is not None and not fully_encoded and \
+            not predicates.can_use_numpy(scan_plan, scan_columns):
+        positions = parallel.scan(table_meta['table_name'], plan, columns,
+                                  len(table_data['id']))
+        if positions is not None:
+            return skip_deleted(positions, table_meta)
+
+    return skip_deleted(
+        predicates.evaluate(scan_plan, scan_data, scan_columns, get_array),
+        table_meta,
+    )
+
+
+def encode_plan(plan, table_data, table_meta):
+    """
+    Переводит условия на столбцы str с небольшим числом различных значений
+    в условия на коды словаря этих столбцов.
+
+    Словарь и коды столбца строятся один раз и при изменениях таблицы
+    дополняются (см. buffer_pool.get_codes). Часть условия на такой столбец
+    (=, !=, in, сравнения, between) проверяется по словарю — по разу
+    на каждое различное значение — и заменяется на in по кодам, а коды
+    проверяются целым столбцом байтов (bytes.translate или numpy)
+    вместо сравнения строк.
+
+    Аргументы:
+        plan (tuple): план условия.
+        table_data (dict): данные таблицы.
+        table_meta (dict | None): запись таблицы из метаданных.
+
+    Возвращает:
+        tuple: (план, данные таблицы, столбцы {column: type}) для
+        predicates.evaluate; коды столбца X — в столбце "X#codes".
+    """
+
+    if table_meta is None:
+        return plan, table_data, {}
+    columns = table_meta['columns']
+    codes = {}
+
+    def encode(leaf):
+        column = leaf[1]
+        if columns.get(column) != 'str':
+            return leaf
+        if column not in codes:
+            codes[column] = buffer_pool.get_codes(table_meta['table_name'],
+                                                  column)
+        if codes[column] is None:
+            return leaf
+        dictionary = codes[column][0]
+        matched = itertools.compress(
+            range(len(dictionary)),
+            predicates.python_mask(leaf, lambda name: dictionary),
+        )
+        return ('in', f'{column}#codes', tuple(matched))
+
+    encoded = predicates.map_leaves(plan, encode)
+    used = {column: pair for column, pair in codes.items() if pair is not None}
+    if not used:
+        return plan, table_data, columns
+    scan_data = dict(table_data)
+    scan_columns = dict(columns)
+    for column, (_, values) in used.items():
+        scan_data[f'{column}#codes'] = values
+        scan_columns[f'{column}#codes'] = 'int'
+    return encoded, scan_data, scan_columns
+
+
+def prune_segments(plan, table_data, table_meta):
+    """
+    Отбирает по карте зон сегменты таблицы, в которых условие может
+    выполниться.
+
+    Возвращает:
+        list[range] | None: диапазоны позиций подходящих сегментов или None,
+        если карта зон ничего не отсекает (или таблица из одного сегмента).
+    """
+
+    row_count = len(table_data['id'])
+    if table_meta is None or row_count <= constants.SEGMENT_ROWS:
+        return None
+    zones = buffer_pool.get_zones(table_meta['table_name'])
+    segments, skipped = table_stats.matching_segments(plan, zones, row_count)
+    if not skipped:
+        return None
+    metrics.increment('zones.segments_skipped', skipped)
+    return segments
+
+
+def skip_deleted(positions, table_meta):
+    """
+    Убирает из перечня позиций строки, помеченные удалёнными в буферном
+    пуле (см. buffer_pool.apply_delete).
+
+    Аргументы:
+        positions (iterable[int]): позиции строк.
+        table_meta (dict | None): запись таблицы из метаданных; без неё
+            данные считаются не взятыми из пула и не фильтруются.
+
+    Возвращает:
+        iterator[int]: позиции неудалённых строк.
+    """
+
+    deleted = buffer_pool.get_deleted(table_meta['table_name']) \
+        if table_meta is not None else None
+    if not deleted:
+        return iter(positions)
+    return itertools.filterfalse(deleted.__contains__, positions)
+
+
+def where_error(table_meta, where_clause):
+    """
+    Проверяет условие WHERE по схеме таблицы.
+
+    Возвращает:
+        str | None: описание ошибки или None, если условие корректно.
+    """
+
+    if where_clause is None or table_meta is None:
+        return None
+    plan = where_clause if isinstance(where_clause, tuple) \
+        else predicates.from_dict(where_clause)
+    return predicates.check_types(plan, table_meta['columns'])
+
+
+def select_positions_by_where_clause(clause, table_data, table_meta=None):
+    """
+    Возвращает позиции строк, удовлетворяющих условию WHERE.
+
+    Аргументы:
+        clause (tuple | dict): план условия или условие вида {column: value}.
+        table_data (dict): данные таблицы без поля table_name.
+        table_meta (dict | None): запись таблицы из метаданных.
+
+    Возвращает:
+        list[int]: позиции подходящих строк в порядке их хранения.
+    """
+
+    return list(iter_positions_by_where_clause(clause, table_data, table_meta))
+
+
+def select_row_positions(table_data, where_clause=None, table_meta=None,
+                         limit=None, offset=0):
+    """
+    Лениво перечисляет позиции строк результата select с учётом
+    WHERE, LIMIT и OFFSET.
+
+    Перебор останавливается, как только набрано limit строк, поэтому
+    select с limit не просматривает таблицу целиком.
+
+    Аргументы:
+        table_data (dict): данные таблицы без поля table_name.
+        where_clause (tuple | dict | None): условие выбора.
+        table_meta (dict | None): запись таблицы из метаданных.
+        limit (int | None): наибольшее число строк.
+        offset (int): число пропускаемых строк.
+
+    Возвращает:
+        iterator[int]: позиции строк результата.
+    """
+
+    if where_clause is None:
+        positions = skip_deleted(range(len(table_data['id'])), table_meta)
+    else:
+        positions = iter_positions_by_where_clause(where_clause, table_data,
+                                                   table_meta, limit is None)
+    stop = None if limit is None else offset + limit
+    return itertools.islice(positions, offset, stop)
+
+
+def index_order(column, table_meta, descending=False):
+    """
+    Перечисляет позиции строк в порядке значений столбца по индексу.
+
+    Индекс — словарь {значение: id строк}, поэтому его ключи один раз
+    сортируются и сохраняются в производных данных таблицы (до её
+    следующего изменения); строки с равными значениями идут в порядке
+    хранения. Удалённые строки в индексах уже отсутствуют.
+
+    Аргументы:
+        column (str): столбец сортировки.
+        table_meta (dict | None): запись таблицы из метаданных.
+        descending (bool): по убыванию.
+
+    Возвращает:
+        iterator[int] | None: позиции строк или None, если по столбцу
+        нет индекса (столбец id индексирован всегда).
+    """
+
+    if table_meta is None:
+        return None
+    if column != 'id' and column not in table_meta.get('indexes', []):
+        return None
+
+    table_name = table_meta['table_name']
+    id_index = buffer_pool.get_id_index(table_name)
+    index = id_index if column == 'id' else buffer_pool.get_index(table_name, column)
+    keys = buffer_pool.get_derived(table_name, ('sorted_keys', column),
+                                   lambda data: sorted(index), ())
+    if descending:
+        keys = reversed(keys)
+    if column == 'id':
+        return map(id_index.__getitem__, keys)
+    return itertools.chain.from_iterable(
+        sorted(map(id_index.__getitem__, index[value])) for value in keys)
+
+
+def sorted_row_positions(table_data, where_clause, table_meta, order_by,
+                         limit=None, offset=0):
+    """
+    Возвращает позиции строк результата select с order by.
+
+    Поведение:
+        • если по столбцу есть индекс, строки не сортируются: индекс
+          обходится по порядку значений (см. index_order), и с limit обход
+          останавливается на первых подходящих строках;
+        • иначе с limit из подходящих строк отбираются offset + limit
+          первых кучей (heapq, O(n log k)), без limit — сортируются
+          позиции строк по значениям столбца;
+        • строки с равными значениями идут в порядке хранения.
+
+    Аргументы:
+        table_data (dict): данные таблицы.
+        where_clause (tuple | dict | None): условие выбора.
+        table_meta (dict | None): запись таблицы из метаданных.
+        order_by (tuple): (столбец, по убыванию ли).
+        limit (int | None): наибольшее число строк.
+        offset (int): число пропускаемых строк.
+
+    Возвращает:
+        iterator[int]: позиции строк результата.
+    """
+
+    column, descending = order_by
+    stop = None if limit is None else offset + limit
+    if where_clause is None:
+        positions = skip_deleted(range(len(table_data['id'])), table_meta)
+    else:
+        positions = iter_positions_by_where_clause(where_clause, table_data,
+                                                   table_meta)
+
+    walk = index_order(column, table_meta, descending)
+    if walk is not None:
+        metrics.increment('order_by.index_walks')
+        if where_clause is not None:
+            walk = filter(set(positions).__contains__, walk)
+        return itertools.islice(walk, offset, stop)
+
+    key = table_data[column].__getitem__
+    if stop is None:
+        ordered = sorted(positions, key=key, reverse=descending)
+    else:
+        pick = heapq.nlargest if descending else heapq.nsmallest
+        ordered = pick(stop, positions, key=key)
+    return itertools.islice(ordered, offset, None)
 
 
-def select_ids_by_where_clause(clause, table_data):
+def select_ids_by_where_clause(clause, table_data, table_meta=None):
     """
     Возвращает список ID записей, удовлетворяющих условию WHERE.
 
     Аргументы:
-        clause (dict): условие вида {column: value}.
+        clause (tuple | dict): план условия или условие вида {column: value}.
         table_data (dict): данные таблицы без поля table_name.
+        table_meta (dict | None): запись таблицы из метаданных; если задана,
+            для условия используются вторичные индексы.
 
     Возвращает:
         list[int]: ID подходящих записей.
     """
 
-    col_name, cond = list(clause.items())[0]
-    ids_to_select = []
-    col_to_select = table_data[col_name]
-    for i in range(len(col_to_select)):
-        if col_to_select[i] == cond:
-            ids_to_select.append(table_data['id'][i])
-    return ids_to_select
+    ids = table_data['id']
+    positions = select_positions_by_where_clause(clause, table_data, table_meta)
+    return [ids[i] for i in positions]
+
+
+@decorators.handle_db_errors
+@buffer_pool.locked_write
+def create_index(metadata, table_name, column):
+    """
+    Создаёт вторичный индекс по столбцу таблицы.
+
+    Аргументы:
+        metadata (list): список таблиц.
+        table_name (str): имя таблицы.
+        column (str): индексируемый столбец.
+
+    Поведение:
+        • проверяет существование таблицы и столбца;
+        • строит индекс по текущим данным и сохраняет его рядом с таблицей;
+        • записывает индекс в метаданные таблицы.
+    """
+
+    table_meta = utils.get_table_meta(metadata, table_name)
+    if table_meta is None:
+        decorators.report_error('Такой таблицы не существует.')
+        return
+
+    if column not in table_meta['columns'] or column == 'id':
+        decorators.report_error(f'Нельзя создать индекс по столбцу {column}.')
+        return
+
+    if column in table_meta.get('indexes', []):
+        decorators.report_error(f'Индекс по столбцу {column} уже существует.')
+        return
+
+    table_data = buffer_pool.live_data(buffer_pool.get_entry(table_name))
+    index = indexes.build_index(table_data[column], table_data['id'])
+    buffer_pool.set_index(table_name, column, index)
+    table_meta.setdefault('indexes', []).append(column)
+    decorators.report(f'Индекс по столбцу {column} таблицы {table_name} создан.')
+
+
+@decorators.handle_db_errors
+@buffer_pool.locked_write
+def drop_index(metadata, table_name, column):
+    """
+    Удаляет вторичный индекс по столбцу таблицы.
+
+    Аргументы:
+        metadata (list): список таблиц.
+        table_name (str): имя таблицы.
+        column (str): индексируемый столбец.
+    """
+
+    table_meta = utils.get_table_meta(metadata, table_name)
+    if table_meta is None or column not in table_meta.get('indexes', []):
+        decorators.report_error('Такого индекса не существует.')
+        return
+
+    table_meta['indexes'].remove(column)
+    buffer_pool.forget_index(table_name, column)
+    index_path = utils.get_index_path(table_name, column)
+    if index_path.exists():
+        index_path.unlink()
+    decorators.report(f'Индекс по столбцу {column} таблицы {table_name} удалён.')
 
 
 def print_prettytable(data):
@@ -237,184 +814,650 @@ def print_prettytable(data):
                      все значения — списки одинаковой длины.
     """
 
-    row_count = len(next(iter(data.values()), []))
-    rows = []
-    for i in range(row_count):
-        row = {col: values[i] for col, values in data.items()}
-        rows.append(row)
-        
     table = PrettyTable()
-    table.field_names = rows[0].keys()
-
-    for row in rows:
-        table.add_row(row.values())
+    table.field_names = list(data.keys())
+    table.add_rows(list(zip(*data.values())))
 
     print(table)
 
 
+def print_tsv(data):
+    """
+    Печатает данные таблицы построчно через табуляцию: первая строка —
+    имена столбцов. Значения с табуляцией, переводом строки или кавычками
+    берутся в кавычки по правилам csv.
+
+    Аргументы:
+        data (dict): данные в формате print_prettytable.
+    """
+
+    writer = csv.writer(sys.stdout, delimiter='\t', lineterminator='\n')
+    writer.writerow(data.keys())
+    writer.writerows(zip(*data.values()))
+
+
+def print_paged(field_names, rows, page_size):
+    """
+    Печатает строки страницами по page_size строк по мере их получения.
+
+    Каждая страница выводится отдельной таблицей PrettyTable, поэтому
+    первая страница появляется сразу, а в памяти одновременно находится
+    не больше одной страницы.
+
+    Аргументы:
+        field_names (list[str]): имена столбцов.
+        rows (iterable[list]): строки результата.
+        page_size (int): число строк на странице.
+
+    Возвращает:
+        int: число выведенных строк.
+    """
+
+    printed = 0
+    for page in batched(rows, page_size):
+        table = PrettyTable()
+        table.field_names = field_names
+        table.add_rows(page)
+        print(table)
+        printed += len(page)
+    return printed
+
+
+def query_columns(where_clause=None, columns=None, select_list=None,
+                  group_by=None, order_by=None):
+    """
+    Возвращает столбцы, которые читает select, чтобы загрузить с диска
+    только их (см. buffer_pool.get_entry).
+
+    Возвращает:
+        set[str] | None: столбцы (всегда с id) или None, если нужны все.
+    """
+
+    if columns is None and select_list is None:
+        return None
+    needed = {'id', *(columns or ())}
+    for item in select_list or ():
+        needed.add(item[1] if item[0] == 'column' else item[2])
+    needed.discard('*')
+    if group_by is not None:
+        needed.add(group_by)
+    if order_by is not None:
+        needed.add(order_by[0])
+    if where_clause is not None:
+        plan = where_clause if isinstance(where_clause, tuple) \
+            else predicates.from_dict(where_clause)
+        needed.update(leaf[1] for leaf in predicates.leaves(plan))
+    return needed
+
+
+def stream_select(metadata, table_name, where_clause=None, limit=None, offset=0,
+                  order_by=None, columns=None):
+    """
+    Выводит результат select постранично, не собирая его целиком.
+
+    Аргументы те же, что у select. Результаты в кэш select не попадают.
+    """
+
+    table_data = buffer_pool.get_table(
+        table_name, query_columns(where_clause, columns, order_by=order_by))
+    if not table_data:
+        decorators.report_error('Такой таблицы не существует.')
+        return
+
+    if len(table_data.get('id', [])) == len(buffer_pool.get_deleted(table_name)):
+        decorators.report(f'Таблица {table_name} пуста.')
+        return
+
+    field_names = columns or [col for col in table_data if col != 'table_name']
+    columns = [table_data[col] for col in field_names]
+    table_meta = utils.get_table_meta(metadata, table_name)
+    if order_by is None:
+        positions = select_row_positions(table_data, where_clause, table_meta,
+                                         limit, offset)
+    else:
+        positions = sorted_row_positions(table_data, where_clause, table_meta,
+                                         order_by, limit, offset)
+    rows = ([column[i] for column in columns] for i in positions)
+
+    if not print_paged(field_names, rows, constants.SELECT_PAGE_SIZE):
+        decorators.report('Записей с таким условием не найдено.')
+
+
+def aggregate_rows(table_meta, table_data, select_list, where_clause=None,
+                   group_by=None, limit=None, offset=0):
+    """
+    Считает агрегаты select за один проход по нужным столбцам; большие
+    таблицы без подходящего индекса считаются параллельно по сегментам.
+
+    Аргументы:
+        table_meta (dict): запись таблицы из метаданных.
+        table_data (dict): данные таблицы.
+        select_list (list[tuple]): элементы списка select
+            (см. aggregates.parse_select_list).
+        where_clause (tuple | dict | None): условие отбора строк.
+        group_by (str | None): столбец группировки.
+        limit (int | None): наибольшее число групп в результате.
+        offset (int): число пропускаемых групп.
+
+    Возвращает:
+        dict: {заголовок: список значений} для print_prettytable.
+    """
+
+    plan = where_clause
+    if isinstance(plan, dict):
+        plan = predicates.from_dict(plan)
+
+    states = None
+    deleted = buffer_pool.get_deleted(table_meta['table_name'])
+    if plan is None or index_candidates(plan, table_data, table_meta) is None:
+        states = parallel.aggregate(table_meta['table_name'], select_list, plan,
+                                    table_meta['columns'], group_by,
+                                    len(table_data['id']))
+    if states is None:
+        positions = None
+        if plan is not None:
+            positions = list(iter_positions_by_where_clause(
+                plan, table_data, table_meta, parallel_scan=False))
+        elif deleted:
+            positions = list(skip_deleted(range(len(table_data['id'])), table_meta))
+        states = aggregates.partial(select_list, table_data, positions, group_by)
+    result = aggregates.finalize(select_list, states, group_by)
+    if limit is not None or offset:
+        stop = None if limit is None else offset + limit
+        result = {col: values[offset:stop] for col, values in result.items()}
+    return result
+
+
 @decorators.handle_db_errors
 @decorators.log_time
-def select(table_name, where_clause=None):
+def select(metadata, table_name, where_clause=None, limit=None, offset=0,
+           select_list=None, group_by=None, order_by=None, columns=None):
     """
     Выбирает данные из таблицы с учётом кэширования и условия WHERE.
 
     Аргументы:
+        metadata (list): список таблиц.
         table_name (str): имя таблицы.
-        where_clause (dict | None): условие выбора, например {"age": 18}.
+        where_clause (tuple | dict | None): план условия
+            (см. predicates.parse_where) или равенство вида {"age": 18}.
+        limit (int | None): наибольшее число выводимых строк.
+        offset (int): число пропускаемых строк.
+        select_list (list[tuple] | None): список select с агрегатами
+            (count, sum, avg, min, max); None — все столбцы.
+        group_by (str | None): столбец группировки агрегатов.
+        order_by (tuple | None): (столбец, по убыванию ли) — порядок строк
+            (см. sorted_row_positions); None — порядок хранения.
+        columns (list[str] | None): выводимые столбцы; None — все.
 
     Поведение:
-        • загружает данные таблицы;
+        • загружает данные таблицы; для выбранных столбцов и агрегатов —
+          только столбцы, которые читает запрос (см. query_columns);
         • если where_clause нет — выводит все строки;
         • если есть — выводит только отфильтрованные строки;
-        • использует кэширование результатов;
-        • выводит таблицу через PrettyTable.
+        • с limit прекращает перебор строк, как только набрано нужное число;
+        • с агрегатами выводит по строке на группу (или одну строку);
+        • в режиме вывода table использует кэширование результатов
+          и выводит одну таблицу PrettyTable, в режиме tsv — строки
+          через табуляцию;
+        • в режиме stream выводит строки страницами по мере их получения.
     """
 
-    cache_key = (table_name, tuple(where_clause.items()) if where_clause else None)
+    table_meta = utils.get_table_meta(metadata, table_name)
+    error = where_error(table_meta, where_clause)
+    if error is None and select_list is not None and table_meta is not None:
+        error = aggregates.check_items(select_list, table_meta['columns'], group_by)
+    if error is None and order_by is not None and table_meta is not None and \
+            order_by[0] not in table_meta['columns']:
+        error = f'Столбца {order_by[0]} нет в таблице.'
+    if error is None and columns is not None and table_meta is not None:
+        error = next((f'Столбца {col} нет в таблице.' for col in columns
+                      if col not in table_meta['columns']), None)
+        if error is None and len(set(columns)) < len(columns):
+            error = 'Столбцы в списке select не должны повторяться.'
+    if error:
+        decorators.report_error(error)
+        return
+
+    # перечитывает таблицу, если её изменил другой процесс (и сбрасывает кэш)
+    needed = query_columns(where_clause, columns, select_list, group_by, order_by)
+    buffer_pool.get_entry(table_name, needed)
+
+    if constants.SELECT_OUTPUT_MODE == 'stream' and select_list is None:
+        stream_select(metadata, table_name, where_clause, limit, offset, order_by,
+                      columns)
+        return
+
+    if isinstance(where_clause, dict):
+        where_clause = predicates.from_dict(where_clause)
+    cache_key = (
+        table_name,
+        where_clause,
+        limit,
+        offset,
+        tuple(select_list) if select_list is not None else None,
+        group_by,
+        order_by,
+        tuple(columns) if columns is not None else None,
+    )
 
     def compute():
-        table_data = utils.load_table_data(table_name)
+        table_data = buffer_pool.get_table(table_name, needed)
         if not table_data:
             return 'NO_TABLE'
 
-        if len(table_data.get('id', [])) == 0:
+        metrics.increment('rows.scanned', len(table_data['id']))
+        if select_list is not None:
+            return aggregate_rows(table_meta, table_data, select_list, where_clause,
+                                  group_by, limit, offset)
+
+        deleted = buffer_pool.get_deleted(table_name)
+        if len(table_data.get('id', [])) == len(deleted):
             return 'EMPTY'
 
         full_data = {k: v for k, v in table_data.items() if k != 'table_name'}
+        output = columns or list(full_data)
 
-        if where_clause is None:
-            return full_data
+        if where_clause is None and limit is None and not offset and \
+                not deleted and order_by is None:
+            return {col: full_data[col] for col in output}
 
-        ids = select_ids_by_where_clause(where_clause, full_data)
-        if not ids:
+        if order_by is None:
+            positions = list(select_row_positions(
+                full_data, where_clause, table_meta, limit, offset,
+            ))
+        else:
+            positions = list(sorted_row_positions(
+                full_data, where_clause, table_meta, order_by, limit, offset,
+            ))
+        if not positions:
             return 'NO_RESULTS'
 
-        selected = {k: [] for k in full_data}
-        for ID in ids:
-            ind = full_data['id'].index(ID)
-            for col in full_data:
-                selected[col].append(full_data[col][ind])
-        return selected
+        return {
+            col: [full_data[col][i] for i in positions]
+            for col in output
+        }
 
     result = constants.SELECT_CACHE(cache_key, compute)
 
     if result == 'NO_TABLE':
-        print('Такой таблицы не существует.')
+        decorators.report_error('Такой таблицы не существует.')
         return
 
     if result == 'EMPTY':
-        print(f'Таблица {table_name} пуста.')
+        decorators.report(f'Таблица {table_name} пуста.')
         return
 
-    if result == 'NO_RESULTS':
-        print('Записей с таким условием не найдено.')
+    if result == 'NO_RESULTS' or not next(iter(result.values()), None):
+        decorators.report('Записей с таким условием не найдено.')
         return
 
-    print_prettytable(result)
+    metrics.increment('rows.returned', len(next(iter(result.values()))))
+    if constants.SELECT_OUTPUT_MODE == 'tsv':
+        print_tsv(result)
+    else:
+        print_prettytable(result)
 
 
 @decorators.handle_db_errors
 @decorators.log_time
-def update(table_name, set_clause, where_clause):
+def join_select(metadata, table_name, join, where_clause=None, limit=None,
+                offset=0):
+    """
+    Выводит строки двух таблиц, соединённые по равенству столбцов
+    (select from a join b on a.x = b.y).
+
+    Аргументы:
+        metadata (list): список таблиц.
+        table_name (str): левая таблица.
+        join (dict): {"table": правая таблица, "on": (столбец, столбец)}.
+        where_clause (tuple | None): план условия; столбцы — вида
+            table.column или без таблицы, если имя однозначно.
+        limit (int | None): наибольшее число выводимых строк.
+        offset (int): число пропускаемых строк.
+
+    Поведение:
+        • части условия, относящиеся к одной таблице, проверяются до
+          соединения (с индексами и картой зон этой таблицы), остальные —
+          на соединённых строках (см. joins.split_where);
+        • хеш-таблица строится по таблице с меньшим числом строк, строки
+          другой таблицы перебираются лениво, поэтому с limit перебор
+          останавливается, как только набрано нужное число строк;
+        • столбцы результата называются table.column; вывод — как у select
+          (в режиме stream — постранично); результат не кэшируется.
+    """
+
+    right_name = join['table']
+    metas = [utils.get_table_meta(metadata, name) for name in (table_name, right_name)]
+    if None in metas:
+        decorators.report_error('Такой таблицы не существует.')
+        return
+    if table_name == right_name:
+        decorators.report_error('Соединение таблицы с самой собой не поддерживается.')
+        return
+
+    sides = {meta['table_name']: meta['columns'] for meta in metas}
+    try:
+        keys = joins.resolve_on(join['on'], sides)
+        pushed, residual = joins.split_where(where_clause, sides)
+    except ValueError as e:
+        decorators.report_error(e)
+        return
+    qualified = {f'{table}.{column}': column_type
+                 for table, columns in sides.items()
+                 for column, column_type in columns.items()}
+    error = predicates.check_types(residual, qualified) if residual else None
+    for meta in metas:
+        error = error or where_error(meta, pushed[meta['table_name']])
+    if error:
+        decorators.report_error(error)
+        return
+
+    data = {}
+    for meta in metas:
+        table_data = buffer_pool.get_table(meta['table_name'])
+        data[meta['table_name']] = {k: v for k, v in table_data.items()
+                                    if k != 'table_name'}
+
+    def select_positions(meta):
+        name = meta['table_name']
+        return select_row_positions(data[name], pushed[name], meta)
+
+    def row_count(meta):
+        if 'stats' in meta:
+            return meta['stats']['rows']
+        return len(data[meta['table_name']]['id'])
+
+    build_meta, probe_meta = sorted(metas, key=row_count)
+    build_name, probe_name = build_meta['table_name'], probe_meta['table_name']
+    hash_table = joins.build(data[build_name][keys[build_name]],
+                             select_positions(build_meta))
+    pairs = joins.probe(hash_table, data[probe_name][keys[probe_name]],
+                        select_positions(probe_meta))
+    if probe_name != table_name:
+        pairs = ((j, i) for i, j in pairs)
+
+    sides_data = ((table_name, data[table_name]), (right_name, data[right_name]))
+    if residual is not None:
+        pairs = itertools.chain.from_iterable(
+            joins.filter_pairs(batch, residual, sides_data)
+            for batch in batched(pairs, constants.JOIN_BATCH_SIZE))
+    stop = None if limit is None else offset + limit
+    pairs = itertools.islice(pairs, offset, stop)
+
+    field_names = list(qualified)
+    left_columns = [data[table_name][col] for col in sides[table_name]]
+    right_columns = [data[right_name][col] for col in sides[right_name]]
+    rows = ([column[i] for column in left_columns] +
+            [column[j] for column in right_columns] for i, j in pairs)
+
+    if constants.SELECT_OUTPUT_MODE == 'stream':
+        printed = print_paged(field_names, rows, constants.SELECT_PAGE_SIZE)
+    else:
+        result = dict.fromkeys(field_names)
+        columns = list(zip(*rows))
+        printed = len(columns[0]) if columns else 0
+        if printed:
+            result = dict(zip(field_names, map(list, columns)))
+            if constants.SELECT_OUTPUT_MODE == 'tsv':
+                print_tsv(result)
+            else:
+                print_prettytable(result)
+    if not printed:
+        decorators.report('Записей с таким условием не найдено.')
+        return
+    metrics.increment('rows.returned', printed)
+
+
+@decorators.handle_db_errors
+@decorators.log_time
+@buffer_pool.locked_write
+def update(metadata, table_name, set_clause, where_clause):
     """
     Обновляет значения в строках таблицы, удовлетворяющих WHERE.
 
     Аргументы:
+        metadata (list): список таблиц.
         table_name (str): имя таблицы.
-        set_clause (dict): новое значение, например {"name": "Ivan"}.
-        where_clause (dict): условие выбора строк.
+        set_clause (dict): новые значения, например {"name": "Ivan"}.
+        where_clause (tuple | dict): условие выбора строк.
 
     Поведение:
         • проверяет существование таблицы;
         • запрещает изменять ID;
+        • проверяет типы новых значений по схеме таблицы;
         • обновляет все подходящие строки;
-        • сохраняет изменения в файл;
-        • очищает кэш SELECT.
+        • записывает изменение в журнал таблицы;
+        • обновляет вторичные индексы изменённого столбца;
+        • сбрасывает кэш SELECT этой таблицы.
     """
 
-    table_data = utils.load_table_data(table_name)
+    table_data = buffer_pool.get_table(table_name)
     if not table_data:
-            print('Такой таблицы не существует.')
+            decorators.report_error('Такой таблицы не существует.')
             return 
     
-    col_name, value = list(set_clause.items())[0]
-    if col_name.lower() == 'id':
-        print('Нельзя менять id в ручную.')
+    if any(col_name.lower() == 'id' for col_name in set_clause):
+        decorators.report_error('Нельзя менять id в ручную.')
         return
     
-    ids_to_select = select_ids_by_where_clause(
+    table_meta = utils.get_table_meta(metadata, table_name)
+    for col_name in set_clause:
+        if col_name not in table_meta['columns']:
+            raise KeyError(col_name)
+    error = where_error(table_meta, where_clause) or \
+        validate_values(table_meta['columns'], set_clause)
+    if error:
+        decorators.report_error(error)
+        return
+
+    positions = select_positions_by_where_clause(
         where_clause,
-        {k: v for k, v in table_data.items() if k != 'table_name'}
+        {k: v for k, v in table_data.items() if k != 'table_name'},
+        table_meta,
     )
-    if not ids_to_select:
-        print('Записей с таким условмием не найдено.')
+    if not positions:
+        decorators.report('Записей с таким условмием не найдено.')
         return
 
-    for ID in ids_to_select:
-        ind = table_data['id'].index(ID)
-        table_data[col_name][ind] = value
-    utils.save_table_data(table_name, table_data)
+    ids_to_select = [table_data['id'][i] for i in positions]
+    buffer_pool.apply_update(table_meta, positions, set_clause)
+    metrics.increment('rows.updated', len(positions))
 
     field = 'Запись' if len(ids_to_select) == 1 else 'Записи'
     deleted = 'обновлена' if len(ids_to_select) == 1 else 'обновлены'
-    print(f'{field} с ID = {ids_to_select} успешно {deleted} из таблицы {table_name}.')
+    decorators.report(f'{field} с ID = {ids_to_select} успешно {deleted} '
+                      f'из таблицы {table_name}.')
 
-    constants.SELECT_CACHE_STORE.clear()
+    constants.SELECT_CACHE_STORE.invalidate(table_name)
 
 
 @decorators.handle_db_errors
 @decorators.confirm_action('удаление записи')
-def delete(table_name, where_clause):
+@decorators.log_time
+@buffer_pool.locked_write
+def delete(metadata, table_name, where_clause):
     """
     Удаляет строки таблицы, удовлетворяющие условию WHERE.
 
     Аргументы:
+        metadata (list): список таблиц.
         table_name (str): имя таблицы.
-        where_clause (dict): условие удаления.
+        where_clause (tuple | dict): условие удаления.
 
     Поведение:
         • находит строки, соответствующие условию;
-        • удаляет строки по индексам;
-        • сохраняет обновлённые данные;
-        • очищает кэш SELECT.
+        • записывает удаление найденных строк в журнал таблицы;
+        • удаляет эти строки из вторичных индексов;
+        • сбрасывает кэш SELECT этой таблицы.
     """
 
-    table_data = utils.load_table_data(table_name)
+    table_data = buffer_pool.get_table(table_name)
     if not table_data:
-        print('Такой таблицы не существует.')
+        decorators.report_error('Такой таблицы не существует.')
         return 
 
-    ids_to_select = select_ids_by_where_clause(
+    table_meta = utils.get_table_meta(metadata, table_name)
+    error = where_error(table_meta, where_clause)
+    if error:
+        decorators.report_error(error)
+        return
+
+    positions = select_positions_by_where_clause(
         where_clause,
-        {k: v for k, v in table_data.items() if k != 'table_name'}
+        {k: v for k, v in table_data.items() if k != 'table_name'},
+        table_meta,
     )
-    if not ids_to_select:
-        print('Записей с таким условмием не найдено.')
+    if not positions:
+        decorators.report('Записей с таким условмием не найдено.')
         return
 
-    indices = sorted(
-        [table_data['id'].index(ID) for ID in ids_to_select],
-        reverse=True,   
-    )
+    ids_to_select = [table_data['id'][i] for i in positions]
+    buffer_pool.apply_delete(table_meta, positions)
+    metrics.increment('rows.deleted', len(positions))
+
+    field = 'Запись' if len(ids_to_select) == 1 else 'Записи'
+    deleted = 'удалена' if len(ids_to_select) == 1 else 'удалены'
+    decorators.report(f'{field} с ID = {ids_to_select} успешно {deleted} '
+                      f'из таблицы {table_name}.')
+
+    constants.SELECT_CACHE_STORE.invalidate(table_name)
+
+
+@decorators.handle_db_errors
+@buffer_pool.locked_write
+def convert_table(metadata, table_name, storage_name):
+    """
+    Переводит таблицу в другой формат хранения.
+
+    Аргументы:
+        metadata (list): список таблиц.
+        table_name (str): имя таблицы.
+        storage_name (str): json, columnar или segmented.
+
+    Поведение:
+        • записывает накопленные изменения таблицы;
+        • сохраняет снимок таблицы в новом формате и удаляет старый;
+        • удаляет журнал изменений, так как он уже учтён в снимке;
+        • записывает формат в метаданные таблицы.
+    """
+
+    table_meta = utils.get_table_meta(metadata, table_name)
+    if table_meta is None:
+        decorators.report_error('Такой таблицы не существует.')
+        return
 
-    for ind in indices:
-        for col in table_data:
-            if col != "table_name":
-                del table_data[col][ind]
+    if storage_name not in storage.STORAGES:
+        decorators.report_error(f'Неизвестный формат хранения {storage_name}. '
+                                f'Доступны: {", ".join(storage.STORAGES)}.')
+        return
+
+    current = utils.get_table_storage(table_name)
+    if current.name == storage_name:
+        decorators.report(f'Таблица {table_name} уже хранится '
+                          f'в формате {storage_name}.')
+        return
+
+    buffer_pool.flush_table(table_name)
+    table_data = buffer_pool.live_data(buffer_pool.get_entry(table_name))
+    utils.save_table_data(table_name, table_data, table_meta['columns'],
+                          storage.STORAGES[storage_name])
+    current.remove(table_name)
+    log_path = utils.get_log_path(table_name)
+    if log_path.exists():
+        log_path.unlink()
+    buffer_pool.discard(table_name)
+
+    table_meta['storage'] = storage_name
+    decorators.report(f'Таблица {table_name} переведена в формат {storage_name}.')
+
+
+@decorators.handle_db_errors
+@buffer_pool.locked_write
+def vacuum_table(metadata, table_name):
+    """
+    Физически убирает из таблицы в памяти строки, помеченные удалёнными.
+
+    Аргументы:
+        metadata (list): список таблиц.
+        table_name (str): имя таблицы.
+
+    Поведение:
+        • delete только помечает строки удалёнными, а убирает их из столбцов,
+          когда их доля превышает constants.TOMBSTONE_COMPACT_FRACTION;
+          команда убирает их сразу и уточняет границы значений в статистике;
+        • содержимое таблицы не меняется, поэтому кэш select не сбрасывается.
+    """
+
+    table_meta = utils.get_table_meta(metadata, table_name)
+    if table_meta is None:
+        decorators.report_error('Такой таблицы не существует.')
+        return
+
+    removed = buffer_pool.vacuum(table_meta)
+    decorators.report(f'Таблица {table_name}: убрано удалённых строк: {removed}.')
+
+
+@decorators.handle_db_errors
+def begin_transaction():
+    """
+    Начинает транзакцию: изменения таблиц и метаданных до commit
+    остаются в памяти.
+    """
+
+    if buffer_pool.TRANSACTION['active']:
+        decorators.report_error('Транзакция уже начата.')
+        return
+
+    buffer_pool.begin()
+    decorators.report('Транзакция начата.')
+
+
+@decorators.handle_db_errors
+@decorators.log_time
+def commit_transaction():
+    """
+    Фиксирует транзакцию.
+
+    Поведение:
+        • записывает изменения всех таблиц, их индексов и метаданные
+          одной групповой записью;
+        • файлы заменяются атомарно (временный файл и переименование),
+          поэтому после сбоя видны либо все изменения, либо ни одного.
+    """
+
+    if not buffer_pool.TRANSACTION['active']:
+        decorators.report_error('Нет активной транзакции.')
+        return
+
+    tables = buffer_pool.commit()
+    if tables is None:
+        decorators.report_error('Транзакция отменена: изменённые в ней таблицы '
+                                'за это время изменил другой процесс.')
+        return
+    decorators.report(f'Транзакция зафиксирована (изменено таблиц: {len(tables)}).')
 
-    utils.save_table_data(table_name, table_data)
 
-    field = 'Запись' if len(indices) == 1 else 'Записи'
-    deleted = 'удалена' if len(indices) == 1 else 'удалены'
-    print(f'{field} с ID = {ids_to_select} успешно {deleted} из таблицы {table_name}.')
+@decorators.handle_db_errors
+def rollback_transaction():
+    """
+    Отменяет транзакцию: таблицы и метаданные возвращаются к состоянию
+    на момент begin, кэш select для изменённых таблиц сбрасывается.
+    """
+
+    if not buffer_pool.TRANSACTION['active']:
+        decorators.report_error('Нет активной транзакции.')
+        return
 
-    constants.SELECT_CACHE_STORE.clear()
+    for table_name in buffer_pool.rollback():
+        constants.SELECT_CACHE_STORE.invalidate(table_name)
+    decorators.report('Транзакция отменена.')
 
 
 @decorators.handle_db_errors
 def info(table_name, metadata):
     """
-    Выводит информацию о таблице: название, столбцы, количество записей.
+    Выводит информацию о таблице: название, столбцы, количество записей,
+    статистику столбцов и вторичные индексы.
 
     Аргументы:
         table_name (str): имя таблицы.
@@ -423,7 +1466,10 @@ def info(table_name, metadata):
     Поведение:
         • проверяет существование таблицы;
         • выводит список столбцов с типами;
-        • считает число записей по длине списка id.
+        • берёт число записей и статистику столбцов (границы значений
+          и примерное число различных) из метаданных, не читая данные
+          таблицы; для таблиц без статистики она вычисляется по данным;
+        • для каждого индекса выводит число ключей и размер файла.
     """
 
     table_exists = False
@@ -433,14 +1479,28 @@ def info(table_name, metadata):
             table_exists = True
     
     if not table_exists:
-        print('Такой таблицы не существует.')
+        decorators.report_error('Такой таблицы не существует.')
         return
 
     columns = ', '.join(f'{key}:{value}' for key, value in table['columns'].items())
 
-    table_data = utils.load_table_data(table_name)
-    record_count = len(table_data['id']) if 'id' in table_data else 0
+    if 'stats' not in table:
+        entry = buffer_pool.get_entry(table_name)
+        table['stats'] = table_stats.compute(table['columns'],
+                                             buffer_pool.live_data(entry))
+    stats = table['stats']
 
     print(f'Таблица: {table_name}')
     print(f'Столбцы: {columns}')
-    print(f'Количество записей: {record_count}')
+    print(f'Формат хранения: {utils.get_table_storage(table_name).name}')
+    print(f'Количество записей: {stats["rows"]}')
+    if stats['rows']:
+        for column, column_stats in stats['columns'].items():
+            print(f'Столбец {column}: min {column_stats["min"]}, '
+                  f'max {column_stats["max"]}, '
+                  f'различных ≈ {table_stats.distinct_count(column_stats)}')
+
+    for column in table.get('indexes', []):
+        index = buffer_pool.get_index(table_name, column)
+        size = utils.get_index_path(table_name, column).stat().st_size
+        print(f'Индекс: {column} (ключей: {len(index)}, размер: {size} байт)')
@@ -1,5 +1,61 @@
 import functools
+import sys
+import threading
 import time
+from collections import OrderedDict
+
+from src.primitive_db import metrics
+
+# готовый ответ на подтверждение опасных действий ('y' или 'n');
+# None — спрашивать пользователя (в пакетном режиме ответ задаёт флаг --yes)
+CONFIRM_ANSWER = None
+
+# выводить время выполнения функций, отмеченных log_time
+# (время в любом случае попадает в метрики, см. metrics)
+LOG_TIME = False
+
+# выводить сообщения команд (об успехе и ошибках) в stderr, а в stdout —
+# только результаты select, info и т. п. (пакетный режим)
+MESSAGES_TO_STDERR = False
+
+# состояние выполняемой команды: failed — команда завершилась ошибкой
+# (см. report_error); у каждого потока своё (в режиме сервера команды
+# клиентов выполняются в разных потоках)
+COMMAND = threading.local()
+
+
+def report(message):
+    """
+    Выводит сообщение команды, не относящееся к её результату
+    (в пакетном режиме — в stderr, см. MESSAGES_TO_STDERR).
+    """
+
+    print(message, file=sys.stderr if MESSAGES_TO_STDERR else sys.stdout)
+
+
+def report_error(message):
+    """
+    Выводит сообщение об ошибке и отмечает выполняемую команду неуспешной.
+    """
+
+    COMMAND.failed = True
+    report(message)
+
+
+def start_command():
+    """
+    Начинает учёт ошибок новой команды (см. command_failed).
+    """
+
+    COMMAND.failed = False
+
+
+def command_failed():
+    """
+    Проверяет, сообщила ли выполняемая команда об ошибке через report_error.
+    """
+
+    return getattr(COMMAND, 'failed', False)
 
 
 def handle_db_errors(func):
@@ -18,19 +74,19 @@ def handle_db_errors(func):
             return func(*args, **kwargs)
 
         except FileNotFoundError:
-            print('Ошибка: файл данных не найден.')
+            report_error('Ошибка: файл данных не найден.')
             raise
 
         except KeyError as e:
-            print(f'Ошибка: отсутствует ключ или столбец: {e}')
+            report_error(f'Ошибка: отсутствует ключ или столбец: {e}')
             raise
 
         except ValueError as e:
-            print(f'Ошибка валидации: {e}')
+            report_error(f'Ошибка валидации: {e}')
             raise
 
         except IndexError:
-            print('Команда введена неправильно. Введите help.')
+            report_error('Команда введена неправильно. Введите help.')
             raise
 
     return wrapper
@@ -42,6 +98,7 @@ def confirm_action(action_name):
     
     Перед вызовом функции спрашивает пользователя, действительно ли он хочет
     выполнить действие (например, удаление таблицы или записей).
+    Если задан CONFIRM_ANSWER, вместо вопроса используется он.
     
     Аргументы:
         action_name — строка с описанием действия (используется в сообщении).
@@ -49,10 +106,12 @@ def confirm_action(action_name):
 
     def real_decorator(func):
         def wrapper(*args, **kwargs):
-            user_input = input('Вы уверены, что хотите ' + 
-                               f'выполнить {action_name}? [y/n]: ')
+            user_input = CONFIRM_ANSWER
+            if user_input is None:
+                user_input = input('Вы уверены, что хотите ' +
+                                   f'выполнить {action_name}? [y/n]: ')
             if user_input.lower() != 'y':
-                print("Операция отменена.")
+                report_error("Операция отменена.")
                 return
             return func(*args, **kwargs)
         return wrapper
@@ -63,30 +122,153 @@ def log_time(func):
     """
     Декоратор для измерения времени выполнения функции.
     
-    Выводит время выполнения в формате:
-    'Функция <имя> выполнилась за X.XXX секунд.'
+    Записывает время выполнения в гистограмму задержек metrics
+    с именем core.<имя функции>. С флагом LOG_TIME также выводит его
+    в формате 'Функция <имя> выполнилась за X.XXX секунд.'
+    Если метрики выключены и LOG_TIME не задан, время не замеряется.
     
-    Используется для замера скорости операций select и insert.
+    Используется для замера скорости операций select, insert, update и др.
     """
 
+    name = f'core.{func.__name__}'
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        start = time.monotonic()
+        if not metrics.ENABLED and not LOG_TIME:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
         result = func(*args, **kwargs)
-        end = time.monotonic()
-        elapsed = end - start
-        print(f"Функция {func.__name__} выполнилась за {elapsed:.3f} секунд.")
+        elapsed = time.perf_counter() - start
+        metrics.observe(name, elapsed)
+        if LOG_TIME:
+            report(f"Функция {func.__name__} выполнилась за {elapsed:.3f} секунд.")
         return result
     return wrapper
 
 
-def create_cacher():
+class LRUCache:
+    """
+    Ограниченный LRU-кэш результатов select.
+    
+    Ключи — кортежи, первый элемент которых — имя таблицы. Кэш ограничен
+    числом записей и примерным объёмом в байтах; при переполнении
+    вытесняются давно не использованные записи. Сбросить можно как весь
+    кэш, так и только записи одной таблицы. Методы можно вызывать
+    из нескольких потоков. Попадания, промахи и вытеснения также
+    считаются в метриках <name>.hits, <name>.misses и <name>.evictions.
+    """
+
+    def __init__(self, max_entries, max_bytes, name='cache'):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.keys_by_table = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.RLock()
+        self.name = name
+        metrics.register_gauge(f'{name}.entries', lambda: len(self.entries))
+        metrics.register_gauge(f'{name}.bytes', lambda: self.total_bytes)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                metrics.increment(f'{self.name}.misses')
+                return default
+            self.hits += 1
+            metrics.increment(f'{self.name}.hits')
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            self.pop(key)
+            self.entries[key] = value
+            self.sizes[key] = size
+            self.keys_by_table.setdefault(key[0], set()).add(key)
+            self.total_bytes += size
+
+            while len(self.entries) > self.max_entries or \
+                    self.total_bytes > self.max_bytes:
+                self.pop(next(iter(self.entries)))
+                self.evictions += 1
+                metrics.increment(f'{self.name}.evictions')
+
+    def pop(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return
+            del self.entries[key]
+            self.total_bytes -= self.sizes.pop(key)
+            table_keys = self.keys_by_table[key[0]]
+            table_keys.discard(key)
+            if not table_keys:
+                del self.keys_by_table[key[0]]
+
+    def invalidate(self, table_name):
+        with self.lock:
+            for key in list(self.keys_by_table.get(table_name, ())):
+                self.pop(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.sizes.clear()
+            self.keys_by_table.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+def estimate_size(value, sample=64):
+    """
+    Приблизительно оценивает объём результата select в байтах.
+    
+    Для столбцов-списков размер элементов оценивается по выборке
+    из первых sample значений, чтобы не обходить весь результат.
+    """
+
+    if not isinstance(value, dict):
+        return sys.getsizeof(value)
+
+    total = sys.getsizeof(value)
+    for column in value.values():
+        total += sys.getsizeof(column)
+        head = column[:sample]
+        if head:
+            item_size = sum(sys.getsizeof(item) for item in head) / len(head)
+            total += int(item_size * len(column))
+    return total
+
+
+def create_cacher(max_entries=128, max_bytes=64 * 1024 * 1024, name='cache'):
     """
     Создает замыкание для кэширования результатов.
     
     Возвращает пару:
         cache_result — функция, принимающая ключ и функцию-вычислитель.
-        cache — словарь с текущим состоянием кэша.
+        cache — LRUCache с текущим состоянием кэша.
     
     При повторных вызовах с одинаковым ключом возвращается сохранённый результат,
     без повторного вычисления.
@@ -94,13 +276,15 @@ def create_cacher():
     Используется для оптимизации запросов select.
     """
     
-    cache = {}   
+    cache = LRUCache(max_entries, max_bytes, name)
+    missing = object()
 
     def cache_result(key, value_func):
-        if key in cache:
-            return cache[key]
+        result = cache.get(key, missing)
+        if result is not missing:
+            return result
         result = value_func()
-        cache[key] = result
+        cache.put(key, result)
         return result
 
     return cache_result, cache
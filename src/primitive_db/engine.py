@@ -1,8 +1,26 @@
-import shlex
+import signal
+import sys
+import time
 
 import prompt
 
-from src.primitive_db import core, utils
+from src.primitive_db import (
+    buffer_pool,
+    constants,
+    core,
+    decorators,
+    metrics,
+    parallel,
+    statements,
+    utils,
+)
+
+# команды, меняющие схему или файлы таблиц; внутри транзакции недоступны
+DDL_COMMANDS = ('create_table', 'drop_table', 'create_index', 'drop_index', 'convert')
+
+# для обработчика сигналов: выполняется ли сейчас команда и пришёл ли
+# во время неё сигнал завершения
+RUNNING = {'busy': False, 'stop': False}
 
 
 def print_help():
@@ -18,127 +36,448 @@ def print_help():
     print("<command> create_table <имя_таблицы> <столбец1:тип> .. - создать таблицу")
     print("<command> list_tables - показать список всех таблиц")
     print("<command> drop_table <имя_таблицы> - удалить таблицу")
+    print("<command> create_index <имя_таблицы> <столбец> - создать индекс")
+    print("<command> drop_index <имя_таблицы> <столбец> - удалить индекс")
+    print("<command> import <имя_таблицы> <файл.csv|файл.jsonl> - загрузить строки")
+    print("<command> convert <имя_таблицы> <json|columnar|segmented> - сменить "
+          "формат хранения")
+    print("<command> vacuum <имя_таблицы> - убрать из памяти удалённые строки")
+    print("<command> cache_stats - статистика кэша select")
+    print("<command> stats [reset | json [файл]] - метрики: вывести, обнулить "
+          "или выгрузить в JSON")
+    print("<command> prepare <имя> <команда с ?> - подготовить команду")
+    print("<command> execute <имя> <значение1> <значение2> .. - выполнить "
+          "подготовленную команду")
+    print("<command> begin / commit / rollback - начать, зафиксировать "
+          "или отменить транзакцию")
+    print("<command> set <настройка> <значение> - изменить настройку "
+          f"({', '.join(SETTINGS)})")
     
     print("\nОбщие команды:")
     print("<command> exit - выход из программы")
     print("<command> help - справочная информация\n")
 
 
-def parse(col_name, cond):
+# настройки, доступные команде set:
+# имя -> (модуль, атрибут модуля, допустимые значения)
+SETTINGS = {
+    'output': (constants, 'SELECT_OUTPUT_MODE', ('table', 'stream', 'tsv')),
+    'page_size': (constants, 'SELECT_PAGE_SIZE', int),
+    'write_policy': (constants, 'BUFFER_POOL_WRITE_POLICY',
+                     ('write_through', 'deferred')),
+    'durability': (constants, 'DURABILITY', ('sync', 'batched', 'none')),
+    'compression': (constants, 'STORAGE_COMPRESSION', ('none', 'zlib')),
+    'parallel_workers': (constants, 'PARALLEL_WORKERS', int),
+    'metrics': (metrics, 'ENABLED', bool),
+    'profile': (metrics, 'PROFILE', ('off', 'cpu', 'memory')),
+}
+
+
+def apply_setting(name, value):
+    """
+    Изменяет настройку работы базы данных (команда set).
+
+    Аргументы:
+        name (str): имя настройки из SETTINGS.
+        value (str): новое значение.
     """
-    Преобразует строковое значение условия в корректный тип данных.
 
-    Определяет, является ли значение булевым, числом или строкой,
-    затем возвращает словарь вида: {<имя_столбца>: <значение>}.
+    if name not in SETTINGS:
+        decorators.report_error(f'Неизвестная настройка {name}. '
+                                f'Доступны: {", ".join(SETTINGS)}.')
+        return
 
-    Используется для обработки команд WHERE и SET.
+    module, attr, allowed = SETTINGS[name]
+    text = value
+    if allowed is int:
+        if not value.isdigit() or int(value) == 0:
+            decorators.report_error(f'Значение {name} должно быть '
+                                    'положительным целым числом.')
+            return
+        value = int(value)
+    elif allowed is bool:
+        if value not in ('on', 'off'):
+            decorators.report_error(f'Значение {name} должно быть on или off.')
+            return
+        value = value == 'on'
+    elif value not in allowed:
+        decorators.report_error(f'Недопустимое значение {value}. '
+                                f'Доступны: {", ".join(allowed)}.')
+        return
+
+    if attr == 'DURABILITY':
+        buffer_pool.stop_flusher()
+    if attr in ('BUFFER_POOL_WRITE_POLICY', 'DURABILITY'):
+        buffer_pool.flush()
+    setattr(module, attr, value)
+    decorators.report(f'{name} = {text}')
+
+
+def startup():
+    """
+    Готовит базу данных к работе: доводит до конца прерванную фиксацию
+    транзакции и применяет к таблицам журналы изменений, оставшиеся
+    после предыдущего запуска.
     """
 
-    cond = cond.strip()
+    utils.recover_commit()
+    data = buffer_pool.get_metadata()
+    if utils.recover_tables(data):
+        buffer_pool.save_metadata(data)
 
-    if cond.lower() == "true":
-        return {col_name: True}
-    if cond.lower() == "false":
-        return {col_name: False}
 
-    if cond.lstrip("-").isdigit():
-        return {col_name: int(cond)}
-    
-    return {col_name: cond}
+def shutdown():
+    """
+    Завершает работу: отменяет незафиксированную транзакцию, останавливает
+    фоновую запись и записывает на диск накопленные изменения таблиц.
+    """
+
+    if buffer_pool.TRANSACTION['active']:
+        decorators.report('Незафиксированная транзакция отменена.')
+        core.rollback_transaction()
+    buffer_pool.stop_flusher()
+    buffer_pool.flush()
+    parallel.shutdown()
+
+
+def handle_signal(signum, frame):
+    """
+    Обработчик SIGTERM и SIGHUP: завершает работу через SystemExit, чтобы
+    выполнился shutdown. Если сигнал пришёл во время команды, команда
+    доводится до конца, и цикл команд завершается после неё.
+    """
+
+    if RUNNING['busy']:
+        RUNNING['stop'] = True
+        return
+    raise SystemExit(128 + signum)
+
+
+def install_signal_handlers():
+    for name in ('SIGTERM', 'SIGHUP'):
+        signum = getattr(signal, name, None)
+        if signum is not None:
+            signal.signal(signum, handle_signal)
+
+
+def execute(user_input):
+    """
+    Выполняет одну текстовую команду.
+
+    Команда разбирается через statements.parse (разбор кэшируется
+    по тексту команды) и передаётся в run_statement.
+
+    Аргументы:
+        user_input (str): текст команды.
+
+    Возвращает:
+        bool: False, если введена команда exit или во время команды пришёл
+        сигнал завершения, иначе True. Завершилась ли команда ошибкой,
+        сообщает decorators.command_failed.
+    """
+
+    decorators.start_command()
+    if RUNNING['stop']:
+        return False
+    if not user_input.strip():
+        return True
+    try:
+        statement = statements.parse(user_input)
+    except ValueError as e:
+        decorators.report_error(e)
+        return True
+    RUNNING['busy'] = True
+    try:
+        return run_statement(statement) and not RUNNING['stop']
+    finally:
+        RUNNING['busy'] = False
+
+
+def run_statement(statement, prepared=None):
+    """
+    Выполняет разобранную команду: вызывает соответствующую функцию ядра
+    (core.py) — create_table, insert, select, update, delete и др.
+
+    Аргументы:
+        statement (dict): команда из statements.parse.
+        prepared (dict | None): подготовленные команды {имя: команда};
+            по умолчанию statements.PREPARED (у клиентов сервера — свои).
+
+    Поведение:
+        • считает команды в метриках statements.<команда>, ошибки
+          (исключения и сообщения decorators.report_error) —
+          в statements.errors, время — в гистограмме statement.<команда>;
+        • с настройкой profile выводит профиль команды (см. metrics.profile).
+
+    Возвращает:
+        bool: False для команды exit, иначе True.
+    """
+
+    if not metrics.ENABLED and metrics.PROFILE == 'off':
+        return dispatch(statement, prepared)
+
+    command = statement['command']
+    metrics.increment(f'statements.{command}')
+    started = time.perf_counter()
+    try:
+        if metrics.PROFILE == 'off':
+            running = dispatch(statement, prepared)
+        else:
+            with metrics.profile(command):
+                running = dispatch(statement, prepared)
+    except Exception:
+        metrics.increment('statements.errors')
+        raise
+    finally:
+        metrics.observe(f'statement.{command}', time.perf_counter() - started)
+    if decorators.command_failed():
+        metrics.increment('statements.errors')
+    return running
+
+
+def dispatch(statement, prepared=None):
+    """
+    Вызывает функцию ядра для разобранной команды (см. run_statement).
+    """
+
+    if prepared is None:
+        prepared = statements.PREPARED
+    data = buffer_pool.get_metadata()
+    command = statement['command']
+    if command in DDL_COMMANDS and buffer_pool.TRANSACTION['active']:
+        decorators.report_error(f'Команда {command} недоступна внутри транзакции.')
+        return True
+    if statement['params'] and command != 'prepare':
+        decorators.report_error('Команду с параметрами ? нужно выполнять '
+                                'через prepare и execute.')
+        return True
+
+    match command:
+        case 'create_table':
+            core.create_table(data, statement['table'], statement['columns'])
+
+        case 'drop_table':
+            core.drop_table(data, statement['table'])
+
+        case 'list_tables':
+            if data:
+                for table in data:
+                    print(f"- {table['table_name']}")
+            else:
+                print('Нет сохраненных таблиц.')
+
+        case 'insert':
+            core.insert(data, statement['table'], statement['rows'])
+
+        case 'import':
+            core.import_rows(data, statement['table'], statement['path'])
+
+        case 'select' if statement['join'] is not None:
+            core.join_select(data, statement['table'], statement['join'],
+                             statement['where'], statement['limit'],
+                             statement['offset'])
+
+        case 'select':
+            core.select(data, statement['table'], statement['where'],
+                        statement['limit'], statement['offset'],
+                        statement['select_list'], statement['group_by'],
+                        statement['order_by'], statement['columns'])
+
+        case 'update':
+            core.update(data, statement['table'], statement['set'],
+                        statement['where'])
+
+        case 'delete':
+            core.delete(data, statement['table'], statement['where'])
+
+        case 'create_index':
+            core.create_index(data, statement['table'], statement['column'])
+
+        case 'drop_index':
+            core.drop_index(data, statement['table'], statement['column'])
+
+        case 'convert':
+            core.convert_table(data, statement['table'], statement['storage'])
+
+        case 'vacuum':
+            core.vacuum_table(data, statement['table'])
+
+        case 'info':
+            core.info(statement['table'], data)
+
+        case 'set':
+            apply_setting(statement['name'], statement['value'])
+
+        case 'cache_stats':
+            stats = constants.SELECT_CACHE_STORE.stats()
+            print(', '.join(f'{key}: {value}' for key, value in stats.items()))
+            parsed = statements.parse.cache_info()
+            print(f'statements: hits: {parsed.hits}, misses: {parsed.misses}, '
+                  f'entries: {parsed.currsize}')
+
+        case 'stats':
+            show_stats(statement['action'], statement['path'])
+
+        case 'prepare':
+            inner = statement['statement']
+            if inner['command'] in ('prepare', 'execute'):
+                decorators.report_error('Подготовить можно только обычную команду.')
+                return True
+            prepared[statement['name']] = inner
+            decorators.report(f'Команда {statement["name"]} подготовлена '
+                              f'(параметров: {inner["params"]}).')
+
+        case 'execute':
+            bound = bind_prepared(statement, prepared)
+            if bound is None:
+                return True
+            return dispatch(bound, prepared)
+
+        case 'help':
+            print_help()
+
+        case 'begin':
+            core.begin_transaction()
+
+        case 'commit':
+            core.commit_transaction()
+
+        case 'rollback':
+            core.rollback_transaction()
+
+        case 'exit':
+            return False
+
+    return True
+
+
+def show_stats(action, path=None):
+    """
+    Выполняет команду stats.
+
+    Аргументы:
+        action (str): show — вывести метрики, reset — обнулить их,
+            json — вывести метрики в JSON или записать их в файл path.
+        path (str | None): файл для выгрузки JSON.
+    """
+
+    if action == 'reset':
+        metrics.reset()
+        decorators.report('Метрики обнулены.')
+    elif action == 'json' and path is not None:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(metrics.dump() + '\n')
+        decorators.report(f'Метрики записаны в {path}.')
+    elif action == 'json':
+        print(metrics.dump())
+    else:
+        print(metrics.format_report())
+
+
+def bind_prepared(statement, prepared):
+    """
+    Подставляет значения команды execute в подготовленную команду.
+
+    Аргументы:
+        statement (dict): команда execute.
+        prepared (dict): подготовленные команды {имя: команда}.
+
+    Возвращает:
+        dict | None: готовая к выполнению команда или None, если
+        подготовленной команды нет или не подходит число значений
+        (сообщение уже выведено).
+    """
+
+    inner = prepared.get(statement['name'])
+    if inner is None:
+        decorators.report_error(f'Подготовленной команды {statement["name"]} нет.')
+        return None
+    try:
+        return statements.bind(inner, statement['values'])
+    except ValueError as e:
+        decorators.report_error(e)
+        return None
 
 
 def run():
     """
-    Запускает основной цикл обработки пользовательских команд.
+    Запускает интерактивный цикл обработки пользовательских команд.
 
-    Принимает текстовые команды, разбирает их,
-    вызывает соответствующие функции ядра (core.py):
-    create_table, insert, select, update, delete и др.
+    Работает до тех пор, пока пользователь не введёт команду exit
+    или процесс не получит SIGINT, SIGTERM или SIGHUP; накопленные
+    изменения в любом случае записываются на диск.
+    """
 
-    Работает до тех пор, пока пользователь не введёт команду exit.
+    install_signal_handlers()
+    startup()
+    try:
+        while execute(prompt.string('>>>Введите команду: ')):
+            pass
+    finally:
+        shutdown()
+
+
+def run_script(lines, timings=False):
     """
-    
-    while True:
-        data = utils.load_metadata()
-        user_input = prompt.string('>>>Введите команду: ')
-        args = shlex.split(user_input)
-        match args[0]:
-            case 'create_table':
-                if len(args) < 3:
-                    print('Недостаточно аргументов.')
-                    continue
-
-                table_name = args[1]
-                columns = {}
-
-                for token in args[2:]:
-                    try:
-                        col, type_ = token.split(':')
-                    except ValueError:
-                        print(f'Ошибка в аргументе {token}.')
-                        break
-                    columns[col] = type_
-
-                core.create_table(data, table_name, columns)
-                utils.save_metadata(data)
-
-            case 'drop_table':
-                    core.drop_table(data, args[1])
-                    utils.save_metadata(data)
-
-            case 'list_tables':
-                if data:
-                    for table in data:
-                        print(f"- {table['table_name']}")
-                else:
-                    print('Нет сохраненных таблиц.')
-
-            case 'insert':
-                table_name = args[2]            
-                values_idx = args.index('values')
-                raw_values = args[values_idx+1:]
-                core.insert(data, table_name, raw_values)
-                utils.save_metadata(data)
-
-            case 'select':
-                if 'where' in args:
-                    where_index = args.index('where')
-                    where_clause = parse(args[where_index + 1], args[where_index + 3])
-                else:
-                    where_clause = None
-                core.select(args[2], where_clause)
-
-            case 'update':
-                if 'set' not in args or 'where' not in args:
-                    print('Команда update должна содержать set и where.')
-                    break
-                table_name = args[1]
-                set_idx = args.index('set')
-                set_col = args[set_idx + 1]              
-                set_value = args[set_idx + 3]            
-                set_clause = parse(set_col, set_value)
-                where_idx = args.index('where')
-                where_col = args[where_idx + 1]
-                where_value = args[where_idx + 3]
-                where_clause = parse(where_col, where_value)
-                core.update(table_name, set_clause, where_clause)
-
-            case 'delete':
-                table_name = args[2]                
-                where_idx = args.index('where')
-                col = args[where_idx + 1]
-                cond = args[where_idx + 3]
-                where_clause = parse(col, cond)
-                core.delete(table_name, where_clause)
-
-            case 'info':
-                core.info(args[1], data)
-
-            case 'help':
-                print_help()
-
-            case 'exit':
-                break
+    Выполняет команды из файла или стандартного ввода без диалога.
+
+    Пустые строки и строки, начинающиеся с -- или #, пропускаются.
+    Состояние (буферный пул, кэш select) сохраняется между командами,
+    поэтому длинный скрипт выполняется со скоростью ядра.
+
+    Аргументы:
+        lines (iterable[str]): строки скрипта.
+        timings (bool): выводить время каждой команды.
 
-            case _:
-                print('Неизвестная команда.')
+    Поведение:
+        • выполняет команды по очереди до конца скрипта или до exit;
+        • ошибка в команде (любое исключение или сообщение об ошибке, см.
+          decorators.report_error) не прерывает скрипт, а учитывается
+          в сводке и коде завершения;
+        • при SIGTERM или SIGHUP завершается после текущей команды,
+          записав накопленные изменения;
+        • в конце выводит в stderr сводку: число команд, ошибок,
+          общее и среднее время; с timings — также время каждой команды
+          в виде строк <номер>\t<секунды>\t<команда>.
+
+    Возвращает:
+        int: код завершения — 0 или 1, если в командах были ошибки.
+    """
+
+    install_signal_handlers()
+    startup()
+    count = errors = 0
+    started = time.perf_counter()
+    try:
+        for line in lines:
+            statement = line.strip()
+            if not statement or statement.startswith(('--', '#')):
+                continue
+
+            count += 1
+            statement_started = time.perf_counter()
+            try:
+                running = execute(statement)
+                if decorators.command_failed():
+                    errors += 1
+            except (FileNotFoundError, KeyError, ValueError, IndexError):
+                # сообщение уже выведено (см. decorators.handle_db_errors)
+                errors += 1
+                running = True
+            except Exception as e:
+                decorators.report_error(f'Ошибка выполнения команды: {e!r}')
+                errors += 1
+                running = True
+            if timings:
+                elapsed = time.perf_counter() - statement_started
+                print(f'{count}\t{elapsed:.6f}\t{statement}', file=sys.stderr)
+            if not running:
+                break
+    finally:
+        shutdown()
+    total = time.perf_counter() - started
+    average = total / count if count else 0.0
+    print(f'statements\t{count}\nerrors\t{errors}\n'
+          f'total_seconds\t{total:.6f}\nper_statement_seconds\t{average:.6f}',
+          file=sys.stderr)
+    return 1 if errors else 0
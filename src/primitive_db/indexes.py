@@ -0,0 +1,101 @@
+def build_id_index(ids):
+    """
+    Строит индекс первичного ключа.
+
+    Аргументы:
+        ids (list[int]): столбец id таблицы.
+
+    Возвращает:
+        dict: словарь вида {id: позиция строки в столбцах таблицы}.
+    """
+
+    return {ID: i for i, ID in enumerate(ids)}
+
+
+def allocate_id(table_meta, ids, ID=None):
+    """
+    Выдаёт следующий id из счётчика автоинкремента таблицы.
+
+    Счётчик хранится в метаданных таблицы под ключом next_id. Для таблиц,
+    созданных до его появления, счётчик один раз вычисляется по данным.
+    Если id задан пользователем, счётчик сдвигается за него.
+
+    Аргументы:
+        table_meta (dict): запись таблицы из метаданных.
+        ids (list[int]): столбец id таблицы.
+        ID (int | None): id, указанный пользователем.
+
+    Возвращает:
+        int: id новой строки.
+    """
+
+    if 'next_id' not in table_meta:
+        sync_next_id(table_meta, ids)
+    if ID is None:
+        ID = table_meta['next_id']
+    table_meta['next_id'] = max(table_meta['next_id'], ID + 1)
+    return ID
+
+
+def sync_next_id(table_meta, ids):
+    """
+    Согласует счётчик автоинкремента с фактическими данными таблицы,
+    чтобы он был больше любого существующего id.
+
+    Аргументы:
+        table_meta (dict): запись таблицы из метаданных.
+        ids (list[int]): столбец id таблицы.
+    """
+
+    max_id = max(ids, default=0)
+    table_meta['next_id'] = max(table_meta.get('next_id', 1), max_id + 1)
+
+
+def build_index(values, ids):
+    """
+    Строит вторичный индекс по столбцу.
+
+    Аргументы:
+        values (list): значения индексируемого столбца.
+        ids (list[int]): столбец id таблицы.
+
+    Возвращает:
+        dict: словарь вида {значение: [id строк с этим значением]}.
+    """
+
+    index = {}
+    for value, ID in zip(values, ids):
+        index.setdefault(value, []).append(ID)
+    return index
+
+
+def index_add(index, value, ID):
+    """
+    Добавляет id строки в индекс под заданным значением.
+
+    Аргументы:
+        index (dict): вторичный индекс.
+        value: значение индексируемого столбца.
+        ID (int): id строки.
+    """
+
+    index.setdefault(value, []).append(ID)
+
+
+def index_remove(index, value, ids):
+    """
+    Удаляет id строк из индекса под заданным значением.
+
+    Пустые ключи удаляются из индекса.
+
+    Аргументы:
+        index (dict): вторичный индекс.
+        value: значение индексируемого столбца.
+        ids (set[int]): id удаляемых строк.
+    """
+
+    remaining = [ID for ID in index.get(value, []) if ID not in ids]
+    if remaining:
+        index[value] = remaining
+    else:
+        index.pop(value, None)
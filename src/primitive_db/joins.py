@@ -0,0 +1,182 @@
+"""
+Соединение двух таблиц по равенству столбцов (hash join).
+
+select from a join b on a.x = b.y [where ...] выполняется так:
+    • условие WHERE делится на части, относящиеся только к a или только
+      к b (они проверяются до соединения при отборе строк каждой таблицы),
+      и остаток, который проверяется на соединённых строках;
+    • по меньшей из таблиц строится хеш-таблица {значение ключа: позиции};
+    • строки большей таблицы перебираются лениво, и для каждой из
+      хеш-таблицы берутся парные строки.
+В памяти хранится только хеш-таблица меньшей стороны; пары строк
+выдаются потоком.
+"""
+from src.primitive_db import predicates
+
+
+def resolve_column(name, sides):
+    """
+    Определяет таблицу столбца из условия соединения.
+
+    Аргументы:
+        name (str): столбец с таблицей (a.x) или без неё (x).
+        sides (dict): столбцы соединяемых таблиц {table_name: {column: type}}.
+
+    Возвращает:
+        tuple: (имя таблицы, имя столбца).
+
+    Исключения:
+        ValueError: столбца нет ни в одной таблице или он есть в обеих,
+            а таблица не указана.
+    """
+
+    table, sep, column = name.rpartition('.')
+    if sep:
+        if table not in sides or column not in sides[table]:
+            raise ValueError(f'Столбца {name} нет в соединяемых таблицах.')
+        return table, column
+
+    owners = [table for table, columns in sides.items() if name in columns]
+    if not owners:
+        raise ValueError(f'Столбца {name} нет в соединяемых таблицах.')
+    if len(owners) > 1:
+        raise ValueError(f'Столбец {name} есть в обеих таблицах: '
+                         f'укажите таблицу, например {owners[0]}.{name}.')
+    return owners[0], name
+
+
+def resolve_on(on, sides):
+    """
+    Разбирает условие on.
+
+    Аргументы:
+        on (tuple): пара столбцов из условия on, например ('a.x', 'b.y').
+        sides (dict): столбцы соединяемых таблиц.
+
+    Возвращает:
+        dict: ключ соединения каждой таблицы {table_name: column}.
+
+    Исключения:
+        ValueError: столбцы не найдены или относятся к одной таблице.
+    """
+
+    first, second = (resolve_column(name, sides) for name in on)
+    if first[0] == second[0]:
+        raise ValueError('Условие on должно связывать столбцы разных таблиц.')
+    if sides[first[0]][first[1]] != sides[second[0]][second[1]]:
+        raise ValueError(f'Столбцы {on[0]} и {on[1]} имеют разные типы.')
+    return dict((first, second))
+
+
+def rename(plan, func):
+    """
+    Возвращает план условия, в котором имена столбцов заменены на func(имя).
+    """
+
+    if plan[0] in ('and', 'or'):
+        return (plan[0], tuple(rename(part, func) for part in plan[1]))
+    return (plan[0], func(plan[1]), *plan[2:])
+
+
+def combine(parts):
+    if not parts:
+        return None
+    return parts[0] if len(parts) == 1 else ('and', tuple(parts))
+
+
+def split_where(plan, sides):
+    """
+    Делит условие WHERE соединения на части для каждой таблицы и остаток.
+
+    Части условия, связанные через and и упоминающие столбцы только
+    одной таблицы, проверяются до соединения; остальные — после.
+
+    Аргументы:
+        plan (tuple | None): план условия (см. predicates.parse_where).
+        sides (dict): столбцы соединяемых таблиц.
+
+    Возвращает:
+        tuple: ({table_name: план для таблицы или None}, остаток или None);
+        в планах таблиц столбцы без имени таблицы, в остатке — вида
+        table.column.
+
+    Исключения:
+        ValueError: в условии есть неизвестный или неоднозначный столбец.
+    """
+
+    pushed = {table: [] for table in sides}
+    residual = []
+    parts = () if plan is None else plan[1] if plan[0] == 'and' else (plan,)
+    for part in parts:
+        tables = {resolve_column(leaf[1], sides)[0]
+                  for leaf in predicates.leaves(part)}
+        if len(tables) == 1:
+            pushed[tables.pop()].append(
+                rename(part, lambda name: resolve_column(name, sides)[1]))
+        else:
+            residual.append(
+                rename(part, lambda name: '.'.join(resolve_column(name, sides))))
+    return ({table: combine(parts) for table, parts in pushed.items()},
+            combine(residual))
+
+
+def build(keys, positions):
+    """
+    Строит хеш-таблицу {значение ключа: [позиции строк]}.
+
+    Аргументы:
+        keys (list): столбец-ключ таблицы.
+        positions (iterable[int]): позиции отобранных строк.
+    """
+
+    table = {}
+    for i in positions:
+        table.setdefault(keys[i], []).append(i)
+    return table
+
+
+def probe(table, keys, positions):
+    """
+    Лениво перебирает пары строк с равными ключами.
+
+    Аргументы:
+        table (dict): хеш-таблица из build.
+        keys (list): столбец-ключ перебираемой таблицы.
+        positions (iterable[int]): позиции отобранных строк этой таблицы.
+
+    Возвращает:
+        iterator[tuple]: пары (позиция перебираемой строки, позиция строки
+        из хеш-таблицы).
+    """
+
+    get = table.get
+    for i in positions:
+        matches = get(keys[i])
+        if matches:
+            for j in matches:
+                yield i, j
+
+
+def filter_pairs(pairs, plan, sides_data):
+    """
+    Оставляет пары строк, удовлетворяющие остатку условия WHERE.
+
+    Аргументы:
+        pairs (list[tuple]): пары позиций (левая строка, правая строка).
+        plan (tuple): остаток условия (столбцы вида table.column).
+        sides_data (tuple): ((имя, данные) левой и правой таблицы).
+
+    Возвращает:
+        list[tuple]: подходящие пары.
+    """
+
+    side_numbers = {name: number for number, (name, _) in enumerate(sides_data)}
+
+    def get_column(name):
+        table, _, column = name.rpartition('.')
+        number = side_numbers[table]
+        values = sides_data[number][1][column]
+        return [values[pair[number]] for pair in pairs]
+
+    mask = predicates.python_mask(plan, get_column)
+    return [pair for pair, matched in zip(pairs, mask) if matched]
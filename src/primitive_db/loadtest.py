@@ -0,0 +1,181 @@
+"""
+Нагрузочный тест сервера базы данных на localhost.
+
+Запуск: python -m src.primitive_db.loadtest --clients 32 --requests 200
+
+Поднимает сервер во временном каталоге в отдельном процессе, заполняет
+таблицу и запускает clients одновременных клиентов; каждый выполняет
+requests команд — выборки по условию, агрегаты и (в доле --writes)
+вставки. В конце выводит пропускную способность и задержки команд.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import random
+import socket
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from src.primitive_db import client, constants, server
+
+TABLE_NAME = 'load'
+INSERT_BATCH_ROWS = 500
+
+
+def run_server(base_dir, port, workers):
+    """
+    Запускает сервер с базой в каталоге base_dir (в отдельном процессе).
+    """
+
+    constants.TABLE_DATA_DIR = base_dir / 'data'
+    constants.METADATA_JSON = base_dir / 'db_meta.json'
+    server.serve('127.0.0.1', port, workers)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def wait_for_server(port, timeout=30.0):
+    """
+    Ждёт, пока сервер начнёт принимать соединения.
+
+    Возвращает:
+        tuple: соединение из client.open_connection.
+    """
+
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return await client.open_connection('127.0.0.1', port)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+async def fill_table(reader, writer, rows):
+    """
+    Создаёт таблицу и добавляет в неё rows строк пачками.
+    """
+
+    await client.execute_async(
+        reader, writer,
+        f'create_table {TABLE_NAME} name:str age:int active:bool')
+    await client.execute_async(reader, writer, f'create_index {TABLE_NAME} age')
+    for start in range(0, rows, INSERT_BATCH_ROWS):
+        values = ', '.join(
+            f'("user{i}", {i % 100}, {"true" if i % 3 else "false"})'
+            for i in range(start, min(start + INSERT_BATCH_ROWS, rows))
+        )
+        ok, output = await client.execute_async(
+            reader, writer, f'insert into {TABLE_NAME} values {values}')
+        if not ok:
+            raise RuntimeError(output)
+
+
+def make_command(rng, client_id, number, writes):
+    if rng.random() < writes:
+        return (f'insert into {TABLE_NAME} values '
+                f'("c{client_id}_{number}", {rng.randrange(100)}, true)')
+    if rng.random() < 0.5:
+        return f'select from {TABLE_NAME} where age = {rng.randrange(100)} limit 20'
+    return (f'select active, count(*), avg(age) from {TABLE_NAME} '
+            f'where age < {rng.randrange(100)} group by active')
+
+
+async def run_client(port, client_id, requests, writes, latencies):
+    """
+    Выполняет requests команд одного клиента и собирает их задержки.
+
+    Возвращает:
+        int: число команд, завершившихся ошибкой.
+    """
+
+    rng = random.Random(client_id)
+    reader, writer = await client.open_connection('127.0.0.1', port)
+    errors = 0
+    try:
+        for number in range(requests):
+            command = make_command(rng, client_id, number, writes)
+            started = time.perf_counter()
+            ok, _ = await client.execute_async(reader, writer, command)
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+        await client.execute_async(reader, writer, 'exit')
+    finally:
+        writer.close()
+    return errors
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def load(port, clients, requests, rows, writes):
+    """
+    Заполняет таблицу и запускает клиентов одновременно.
+
+    Возвращает:
+        int: код завершения — 0, если ошибок нет.
+    """
+
+    reader, writer = await wait_for_server(port)
+    await fill_table(reader, writer, rows)
+    writer.close()
+
+    latencies = []
+    started = time.perf_counter()
+    errors = await asyncio.gather(*(
+        run_client(port, client_id, requests, writes, latencies)
+        for client_id in range(clients)
+    ))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    total = len(latencies)
+    print(f'Клиентов: {clients}, команд: {total}, строк в таблице: {rows}, '
+          f'доля записи: {writes:.0%}')
+    print(f'Время: {elapsed:.2f} с, команд в секунду: {total / elapsed:.0f}')
+    print('Задержка, мс: ' + ', '.join(
+        f'p{int(fraction * 100)} {percentile(latencies, fraction) * 1000:.2f}'
+        for fraction in (0.5, 0.95, 0.99)
+    ) + f', max {latencies[-1] * 1000:.2f}')
+    print(f'Ошибок: {sum(errors)}')
+    return 1 if sum(errors) else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный тест сервера '
+                                                 'базы данных.')
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=200,
+                        help='число команд каждого клиента')
+    parser.add_argument('--rows', type=int, default=20_000,
+                        help='число строк в таблице перед началом теста')
+    parser.add_argument('--writes', type=float, default=0.1,
+                        help='доля команд insert')
+    parser.add_argument('--workers', type=int, default=constants.SERVER_WORKERS)
+    args = parser.parse_args()
+
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        context = multiprocessing.get_context('spawn')
+        process = context.Process(target=run_server,
+                                  args=(Path(tmp), port, args.workers))
+        process.start()
+        try:
+            status = asyncio.run(load(port, args.clients, args.requests,
+                                      args.rows, args.writes))
+        finally:
+            process.terminate()
+            process.join()
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # fcntl есть только в POSIX: без него блокировок между
+    fcntl = None     # процессами нет, и базой должен пользоваться один процесс
+
+from src.primitive_db import constants
+
+# блокировки, которые удерживает текущий поток: {путь: [файл, exclusive, глубина]};
+# у каждого потока свой набор, потому что flock различает открытые файлы,
+# а не потоки, и потоки одного процесса (режим сервера) блокируют друг друга
+LOCAL = threading.local()
+
+
+def held_locks():
+    """
+    Возвращает блокировки, которые удерживает текущий поток.
+    """
+
+    if not hasattr(LOCAL, 'held'):
+        LOCAL.held = {}
+    return LOCAL.held
+
+
+def get_table_lock_path(table_name):
+    """
+    Возвращает путь к файлу блокировки таблицы.
+    """
+
+    return constants.TABLE_DATA_DIR / f'{table_name}.lock'
+
+
+def get_metadata_lock_path():
+    """
+    Возвращает путь к файлу блокировки метаданных (рядом с db_meta.json).
+    """
+
+    return Path(constants.METADATA_JSON).with_suffix('.lock')
+
+
+@contextmanager
+def file_lock(path, exclusive=False):
+    """
+    Удерживает блокировку файла flock на время блока with.
+
+    Разделяемую блокировку (exclusive=False) одновременно держат несколько
+    читателей, исключительную — только один писатель. Повторный вход
+    в блокировку, которую поток уже держит, не блокирует: при запросе
+    исключительной блокировки поверх разделяемой она повышается на время
+    вложенного блока.
+
+    Аргументы:
+        path (pathlib.Path): файл блокировки; создаётся при необходимости.
+        exclusive (bool): исключительная блокировка для записи.
+    """
+
+    if fcntl is None:
+        yield
+        return
+
+    key = str(path)
+    registry = held_locks()
+    held = registry.get(key)
+    if held is not None:
+        upgraded = exclusive and not held[1]
+        if upgraded:
+            fcntl.flock(held[0], fcntl.LOCK_EX)
+            held[1] = True
+        held[2] += 1
+        try:
+            yield
+        finally:
+            held[2] -= 1
+            if upgraded:
+                fcntl.flock(held[0], fcntl.LOCK_SH)
+                held[1] = False
+        return
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a+b') as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        registry[key] = [f, exclusive, 1]
+        try:
+            yield
+        finally:
+            del registry[key]
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def table_lock(table_name, exclusive=False):
+    """
+    Блокировка файлов таблицы: разделяемая для чтения, исключительная
+    для записи.
+    """
+
+    return file_lock(get_table_lock_path(table_name), exclusive)
+
+
+def metadata_lock(exclusive=False):
+    """
+    Блокировка файла метаданных db_meta.json.
+
+    Чтобы не было взаимных блокировок, блокировку метаданных берут после
+    блокировок таблиц и не удерживают, запрашивая блокировку таблицы.
+    """
+
+    return file_lock(get_metadata_lock_path(), exclusive)
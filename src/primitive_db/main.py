@@ -1,11 +1,89 @@
 #!/usr/bin/env python
-from src.primitive_db import engine
+import argparse
+import sys
 
+from src.primitive_db import constants, decorators, engine, metrics, server
 
-def main():
-    print('DB project is running!')
-    engine.run()
+
+def parse_args(argv=None):
+    """
+    Разбирает аргументы командной строки.
+    """
+
+    parser = argparse.ArgumentParser(
+        prog='database',
+        description='Primitive DB. Без аргументов запускает диалоговый режим; '
+                    'с --exec или при вводе из канала выполняет команды скрипта.',
+    )
+    parser.add_argument('--exec', dest='script', metavar='FILE',
+                        help='выполнить команды из файла (- — из stdin)')
+    parser.add_argument('--yes', action='store_true',
+                        help='выполнять drop_table и delete без подтверждения '
+                             '(без флага при чтении из stdin они отменяются)')
+    parser.add_argument('--format', choices=('tsv', 'table'), default='tsv',
+                        help='вывод select в пакетном режиме (по умолчанию tsv)')
+    parser.add_argument('--timings', action='store_true',
+                        help='выводить в stderr время каждой команды')
+    parser.add_argument('--stats-json', metavar='FILE',
+                        help='после скрипта записать метрики в JSON-файл')
+    parser.add_argument('--durability', choices=('sync', 'batched', 'none'),
+                        default=constants.DURABILITY,
+                        help='уровень надёжности записи (по умолчанию '
+                             f'{constants.DURABILITY})')
+
+    modes = parser.add_subparsers(dest='mode')
+    serve = modes.add_parser('serve', help='принимать команды от клиентов по сети')
+    serve.add_argument('--host', default=constants.SERVER_HOST)
+    serve.add_argument('--port', type=int, default=constants.SERVER_PORT)
+    serve.add_argument('--workers', type=int, default=constants.SERVER_WORKERS,
+                       help='число потоков, выполняющих команды')
+    serve.add_argument('--format', choices=('tsv', 'table'), default='tsv',
+                       help='вывод select (по умолчанию tsv)')
+    serve.add_argument('--yes', action='store_true',
+                       help='выполнять drop_table и delete без подтверждения '
+                            '(без флага они отменяются)')
+    serve.add_argument('--durability', choices=('sync', 'batched', 'none'),
+                       default=constants.DURABILITY,
+                       help='уровень надёжности записи')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    constants.DURABILITY = args.durability
+    if args.mode == 'serve':
+        # спросить подтверждение у клиента сервера негде
+        decorators.CONFIRM_ANSWER = 'y' if args.yes else 'n'
+        constants.SELECT_OUTPUT_MODE = args.format
+        server.serve(args.host, args.port, args.workers)
+        return
+
+    if args.script is None and sys.stdin.isatty():
+        print('DB project is running!')
+        engine.run()
+        return
+
+    # пакетный режим: без вопросов, без построчных замеров log_time,
+    # изменения пишутся пачками и сбрасываются в конце скрипта
+    # при чтении скрипта из stdin спросить подтверждение негде
+    from_stdin = args.script in (None, '-')
+    decorators.CONFIRM_ANSWER = 'y' if args.yes else 'n' if from_stdin else None
+    decorators.LOG_TIME = False
+    # в stdout — только результаты команд, сообщения — в stderr
+    decorators.MESSAGES_TO_STDERR = True
+    constants.SELECT_OUTPUT_MODE = args.format
+    constants.BUFFER_POOL_WRITE_POLICY = 'deferred'
+
+    if from_stdin:
+        status = engine.run_script(sys.stdin, args.timings)
+    else:
+        with open(args.script, 'r', encoding='utf-8') as f:
+            status = engine.run_script(f, args.timings)
+    if args.stats_json:
+        with open(args.stats_json, 'w', encoding='utf-8') as f:
+            f.write(metrics.dump() + '\n')
+    sys.exit(status)
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
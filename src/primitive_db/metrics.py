@@ -0,0 +1,246 @@
+"""
+Метрики работы базы данных: счётчики, гистограммы задержек и датчики.
+
+Счётчики (increment) считают события — выполненные команды, добавленные
+и удалённые строки, попадания в кэш. Гистограммы (observe) собирают
+распределение задержек команд и функций ядра по корзинам BUCKETS.
+Датчики (add_gauge, register_gauge) хранят текущие величины — объём
+прочитанных и записанных байт, объём буферного пула и кэша select.
+
+Сбор выключается флагом ENABLED (команда set metrics off); выключенный
+сбор почти ничего не стоит: функции записи сразу возвращаются.
+Профилирование каждой команды (set profile cpu|memory) выводит
+в stderr отчёт cProfile или tracemalloc после выполнения команды.
+"""
+import bisect
+import cProfile
+import io
+import json
+import math
+import pstats
+import sys
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+# собирать метрики
+ENABLED = True
+# профилирование каждой команды: off, cpu (cProfile) или memory (tracemalloc)
+PROFILE = 'off'
+# число строк в отчёте профилировщика
+PROFILE_TOP = 15
+
+# верхние границы корзин гистограмм задержек, в секундах
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+
+# собранные метрики; collectors — датчики, значение которых вычисляется
+# при чтении метрик: {имя: функция без аргументов}
+REGISTRY = {'counters': {}, 'histograms': {}, 'gauges': {}, 'collectors': {}}
+# метрики пишут несколько потоков (режим сервера)
+LOCK = threading.Lock()
+
+
+def increment(name, value=1):
+    """
+    Увеличивает счётчик name на value.
+    """
+
+    if not ENABLED:
+        return
+    counters = REGISTRY['counters']
+    with LOCK:
+        counters[name] = counters.get(name, 0) + value
+
+
+def add_gauge(name, value):
+    """
+    Прибавляет value к датчику name (например, к числу прочитанных байт).
+    """
+
+    if not ENABLED:
+        return
+    gauges = REGISTRY['gauges']
+    with LOCK:
+        gauges[name] = gauges.get(name, 0) + value
+
+
+def register_gauge(name, func):
+    """
+    Регистрирует датчик, значение которого вычисляет func при чтении метрик.
+    """
+
+    REGISTRY['collectors'][name] = func
+
+
+def observe(name, seconds):
+    """
+    Добавляет задержку в гистограмму name.
+
+    Аргументы:
+        name (str): имя гистограммы.
+        seconds (float): задержка в секундах.
+    """
+
+    if not ENABLED:
+        return
+    histograms = REGISTRY['histograms']
+    with LOCK:
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = {
+                'count': 0, 'sum': 0.0, 'min': seconds, 'max': seconds,
+                'buckets': [0] * len(BUCKETS),
+            }
+        histogram['count'] += 1
+        histogram['sum'] += seconds
+        histogram['min'] = min(histogram['min'], seconds)
+        histogram['max'] = max(histogram['max'], seconds)
+        histogram['buckets'][bisect.bisect_left(BUCKETS, seconds)] += 1
+
+
+def percentile(histogram, fraction):
+    """
+    Оценивает перцентиль задержки по корзинам гистограммы: возвращает
+    верхнюю границу корзины, в которую он попадает (но не больше max).
+    """
+
+    rank = fraction * histogram['count']
+    seen = 0
+    for bound, count in zip(BUCKETS, histogram['buckets']):
+        seen += count
+        if seen >= rank:
+            return min(bound, histogram['max'])
+    return histogram['max']
+
+
+def snapshot():
+    """
+    Возвращает текущие значения всех метрик.
+
+    Возвращает:
+        dict: {"counters": {...}, "gauges": {...}, "histograms": {имя:
+        {count, sum, mean, min, max, p50, p95, p99, buckets}}}; задержки —
+        в секундах, buckets — пары [верхняя граница, число].
+    """
+
+    with LOCK:
+        counters = dict(REGISTRY['counters'])
+        gauges = dict(REGISTRY['gauges'])
+        histograms = {name: {**histogram, 'buckets': list(histogram['buckets'])}
+                      for name, histogram in REGISTRY['histograms'].items()}
+    for name, func in REGISTRY['collectors'].items():
+        gauges[name] = func()
+
+    report = {}
+    for name, histogram in sorted(histograms.items()):
+        report[name] = {
+            'count': histogram['count'],
+            'sum': histogram['sum'],
+            'mean': histogram['sum'] / histogram['count'],
+            'min': histogram['min'],
+            'max': histogram['max'],
+            'p50': percentile(histogram, 0.5),
+            'p95': percentile(histogram, 0.95),
+            'p99': percentile(histogram, 0.99),
+            'buckets': [[bound if bound != math.inf else 'inf', count]
+                        for bound, count in zip(BUCKETS, histogram['buckets'])
+                        if count],
+        }
+    return {
+        'counters': dict(sorted(counters.items())),
+        'gauges': dict(sorted(gauges.items())),
+        'histograms': report,
+    }
+
+
+def reset():
+    """
+    Обнуляет счётчики, гистограммы и накопленные датчики.
+    """
+
+    with LOCK:
+        REGISTRY['counters'].clear()
+        REGISTRY['histograms'].clear()
+        REGISTRY['gauges'].clear()
+
+
+def dump():
+    """
+    Возвращает метрики (см. snapshot) текстом JSON.
+    """
+
+    return json.dumps(snapshot(), ensure_ascii=False, indent=4)
+
+
+def format_report():
+    """
+    Возвращает метрики в виде текста для команды stats.
+    """
+
+    data = snapshot()
+    lines = ['Счётчики:']
+    lines += [f'  {name}: {value}' for name, value in data['counters'].items()]
+    lines.append('Датчики:')
+    lines += [f'  {name}: {value}' for name, value in data['gauges'].items()]
+    lines.append('Задержки, мс (число, среднее, p50, p95, p99, max):')
+    for name, histogram in data['histograms'].items():
+        values = ', '.join(f'{histogram[key] * 1000:.3f}'
+                           for key in ('mean', 'p50', 'p95', 'p99', 'max'))
+        lines.append(f'  {name}: {histogram["count"]}, {values}')
+    return '\n'.join(lines)
+
+
+@contextmanager
+def profile(label):
+    """
+    Профилирует блок with в режиме PROFILE и выводит отчёт в stderr.
+
+    Аргументы:
+        label (str): название блока в отчёте (например, имя команды).
+
+    Поведение:
+        • cpu — отчёт cProfile: PROFILE_TOP функций по общему времени;
+        • memory — пик памяти и PROFILE_TOP строк кода, выделивших
+          больше всего памяти (tracemalloc);
+        • off — блок выполняется без профилирования.
+    """
+
+    if PROFILE == 'cpu':
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            out = io.StringIO()
+            stats = pstats.Stats(profiler, stream=out)
+            stats.sort_stats('cumulative').print_stats(PROFILE_TOP)
+            print(f'Профиль команды {label}:\n{out.getvalue()}', file=sys.stderr)
+        return
+
+    if PROFILE == 'memory':
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+            if started:
+                tracemalloc.stop()
+            # выделения самого профилирования в отчёт не попадают
+            ignore = (tracemalloc.Filter(False, tracemalloc.__file__),
+                      tracemalloc.Filter(False, __file__))
+            top = after.filter_traces(ignore).compare_to(
+                before.filter_traces(ignore), 'lineno')[:PROFILE_TOP]
+            print(f'Память команды {label}: занято {current} байт, '
+                  f'пик {peak} байт', file=sys.stderr)
+            for stat in top:
+                print(f'  {stat}', file=sys.stderr)
+        return
+
+    yield
@@ -0,0 +1,236 @@
+"""
+Параллельный просмотр таблиц по сегментам в пуле процессов.
+
+Таблица делится на сегменты по constants.SEGMENT_ROWS строк; каждый
+сегмент проверяется условием WHERE (или сворачивается в частичные
+состояния агрегатов) в отдельном процессе, а результаты объединяются
+по порядку сегментов; строки, помеченные удалёнными, пропускаются.
+Процессы пула создаются через fork и видят копию буферного пула родителя
+на момент fork без передачи её по каналу. Изменения таблиц пул
+не пересоздают: сегменты, изменённые после fork (или столбцы, прочитанные
+после него), передаются задаче снимком — срезами нужных столбцов
+(см. segment_task). Если передавать пришлось бы больше половины
+сегментов, пул создаётся заново, но только пока не работает фоновый
+поток записи (уровень надёжности batched): fork процесса с работающими
+потоками небезопасен, поэтому тогда таблица просматривается в текущем
+процессе. Каждый fork копирует таблицы страниц родителя, а каждый снимок
+сегмента — его значения, поэтому пул пересоздаётся лишь после изменения
+большей части таблицы или её перечитывания (например, после записи
+другим процессом).
+
+Маленькие таблицы, отключённая параллельность (PARALLEL_WORKERS = 1)
+и системы без fork обрабатываются в одном процессе.
+"""
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from src.primitive_db import aggregates, buffer_pool, constants, predicates
+
+try:
+    FORK_CONTEXT = multiprocessing.get_context('fork')
+except ValueError:  # fork есть только в POSIX: без него просмотр идёт
+    FORK_CONTEXT = None  # в одном процессе
+
+# пул процессов и число процессов, с которым он создан
+POOL = {'executor': None, 'workers': None}
+
+
+def get_executor(entry, columns, row_count):
+    """
+    Возвращает пул процессов для просмотра таблицы из row_count строк
+    и номера сегментов, которые нужно передать задачам снимком.
+
+    Аргументы:
+        entry (dict): запись буферного пула таблицы.
+        columns (iterable[str]): столбцы, которые читают задачи.
+        row_count (int): число строк таблицы.
+
+    Возвращает:
+        tuple | None: (пул, множество номеров сегментов) или None, если
+        таблицу выгоднее просмотреть в текущем процессе.
+    """
+
+    workers = constants.PARALLEL_WORKERS
+    if FORK_CONTEXT is None or workers < 2 or \
+            row_count < max(constants.PARALLEL_MIN_ROWS, 2 * constants.SEGMENT_ROWS):
+        return None
+
+    segment_count = len(segment_ranges(row_count))
+    stale = stale_segments(entry, columns, segment_count)
+    if POOL['executor'] is not None and POOL['workers'] == workers and \
+            2 * len(stale) <= segment_count:
+        return POOL['executor'], stale
+    if not can_fork():
+        return None
+
+    shutdown()
+    for shared_entry in list(buffer_pool.TABLES.values()):
+        shared_entry['shared'] = {'columns': set(shared_entry['data']),
+                                  'changed': set()}
+    executor = ProcessPoolExecutor(workers, mp_context=FORK_CONTEXT)
+    # процессы создаются при первой задаче; пустая задача создаёт их сразу,
+    # пока копия пула совпадает с отмеченной выше
+    executor.submit(int).result()
+    POOL['executor'] = executor
+    POOL['workers'] = workers
+    return executor, set()
+
+
+def stale_segments(entry, columns, segment_count):
+    """
+    Возвращает номера сегментов, которых нет в копии пула процессов:
+    все, если таблица или какой-то из столбцов columns им не передавались,
+    иначе изменённые после fork.
+    """
+
+    shared = entry['shared']
+    if POOL['executor'] is None or shared is None or \
+            not shared['columns'].issuperset(columns):
+        return set(range(segment_count))
+    return shared['changed']
+
+
+def can_fork():
+    # fork при работающем фоновом потоке записи может скопировать его
+    # блокировки в захваченном состоянии
+    thread = buffer_pool.FLUSHER['thread']
+    return thread is None or not thread.is_alive()
+
+
+def shutdown():
+    """
+    Останавливает пул процессов, если он создан, и дожидается его потока
+    управления, чтобы следующий fork не застал его работающим.
+    """
+
+    if POOL['executor'] is not None:
+        POOL['executor'].shutdown(wait=True, cancel_futures=True)
+        POOL['executor'] = None
+
+
+def segment_ranges(row_count):
+    size = constants.SEGMENT_ROWS
+    return [range(start, min(start + size, row_count))
+            for start in range(0, row_count, size)]
+
+
+def segment_task(entry, columns, positions, stale):
+    """
+    Возвращает аргументы задачи для сегмента positions: (начало сегмента,
+    число строк, снимок сегмента или None, позиции удалённых строк
+    относительно начала сегмента). Снимок — {column: срез значений} для
+    столбцов columns; он передаётся, только если сегмент в stale, иначе
+    процесс пула берёт значения из своей копии.
+    """
+
+    start, stop = positions.start, positions.stop
+    data = None
+    if start // constants.SEGMENT_ROWS in stale:
+        data = {column: entry['data'][column][start:stop] for column in columns}
+    deleted = sorted(i - start for i in entry['deleted'] if start <= i < stop)
+    return start, stop - start, data, deleted
+
+
+def segment_data(table_name, columns, start, rows, data):
+    # выполняется в процессе пула: присланный снимок сегмента или срезы
+    # копии буферного пула, доставшейся процессу при fork
+    if data is not None:
+        return data
+    table_data = buffer_pool.TABLES[table_name]['data']
+    return {column: table_data[column][start:start + rows] for column in columns}
+
+
+def run(table_name, row_count, columns, task, *args):
+    """
+    Выполняет task(*args, table_name, columns, *аргументы сегмента) для
+    каждого сегмента таблицы (см. segment_task).
+
+    Возвращает:
+        list | None: результаты по порядку сегментов или None, если
+        просмотр нужно выполнить в текущем процессе.
+    """
+
+    entry = buffer_pool.get_entry(table_name, columns)
+    pool = get_executor(entry, columns, row_count)
+    if pool is None:
+        return None
+    executor, stale = pool
+    try:
+        futures = [executor.submit(task, *args, table_name, columns,
+                                   *segment_task(entry, columns, positions, stale))
+                   for positions in segment_ranges(row_count)]
+        return [future.result() for future in futures]
+    except BrokenProcessPool:
+        shutdown()
+        return None
+
+
+def scan_segment(plan, columns, table_name, needed, start, rows, data, deleted):
+    # выполняется в процессе пула; удалённые строки пропускает вызывающий
+    # (см. core.skip_deleted)
+    data = segment_data(table_name, needed, start, rows, data)
+    positions = predicates.evaluate(plan, data, columns, positions=range(rows))
+    return [start + i for i in positions]
+
+
+def aggregate_segment(items, plan, columns, group_by, table_name, needed, start,
+                      rows, data, deleted):
+    data = segment_data(table_name, needed, start, rows, data)
+    positions = range(rows)
+    if plan is not None:
+        positions = predicates.evaluate(plan, data, columns, positions=positions)
+    if plan is not None or deleted:
+        # строки, помеченные удалёнными, в агрегаты не попадают
+        deleted = set(deleted)
+        positions = [i for i in positions if i not in deleted]
+    return aggregates.partial(items, data, positions, group_by)
+
+
+def plan_columns(plan):
+    return set() if plan is None else {leaf[1] for leaf in predicates.leaves(plan)}
+
+
+def scan(table_name, plan, columns, row_count):
+    """
+    Находит позиции строк, удовлетворяющих плану, параллельно по сегментам.
+
+    Аргументы:
+        table_name (str): имя таблицы в буферном пуле.
+        plan (tuple): план условия.
+        columns (dict): столбцы таблицы вида {column_name: type}.
+        row_count (int): число строк таблицы.
+
+    Возвращает:
+        list[int] | None: позиции в порядке хранения или None, если
+        просмотр нужно выполнить в текущем процессе.
+    """
+
+    parts = run(table_name, row_count, plan_columns(plan), scan_segment, plan,
+                columns)
+    return None if parts is None else list(itertools.chain.from_iterable(parts))
+
+
+def aggregate(table_name, items, plan, columns, group_by, row_count):
+    """
+    Считает частичные состояния агрегатов по сегментам параллельно
+    и объединяет их (см. aggregates.partial и aggregates.merge).
+
+    Аргументы:
+        plan (tuple | None): план условия WHERE.
+        остальные — как у scan; items и group_by — как у aggregates.partial.
+
+    Возвращает:
+        dict | None: состояния агрегатов или None, если просмотр нужно
+        выполнить в текущем процессе.
+    """
+
+    needed = plan_columns(plan)
+    needed.update(item[2] for item in items
+                  if item[0] == 'agg' and item[2] != '*' and item[1] != 'count')
+    if group_by is not None:
+        needed.add(group_by)
+    parts = run(table_name, row_count, needed, aggregate_segment, items, plan,
+                columns, group_by)
+    return None if parts is None else aggregates.merge(items, parts)
@@ -0,0 +1,391 @@
+import operator
+import re
+from functools import reduce
+from itertools import compress, repeat
+
+try:
+    import numpy as np
+except ImportError:  # numpy не обязателен: без него работает чистый Python
+    np = None
+
+COMPARISONS = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+# ключевые слова, на которых заканчивается условие WHERE
+END_KEYWORDS = ('group', 'order', 'limit', 'offset')
+
+# лексемы условия: строка в двойных или одинарных кавычках, оператор
+# или скобка, слово; SPACE_PATTERN пропускает пробелы между лексемами
+SPACE_PATTERN = re.compile(r'\s*')
+LEXEME_PATTERN = re.compile(
+    r'"((?:[^"\\]|\\.)*)"|\'([^\']*)\'|(<=|>=|!=|[()<>=!,]|[^\s()<>=!,"\']+)'
+)
+UNESCAPE_PATTERN = re.compile(r'\\(.)')
+
+# типы столбцов, которые можно сравнивать целыми столбцами через numpy
+NUMPY_TYPES = ('int', 'bool')
+
+
+def tokenize(text):
+    """
+    Разбивает текст условия на лексемы.
+
+    Операторы и скобки выделяются в отдельные лексемы даже без пробелов
+    (age>=18), строки в кавычках остаются одной лексемой (без кавычек).
+    Разбор идёт одним регулярным выражением, а не посимвольно, как в shlex.
+
+    Исключения:
+        ValueError: не закрыта кавычка.
+    """
+
+    tokens = []
+    pos = 0
+    end = len(text)
+    while True:
+        match = SPACE_PATTERN.match(text, pos)
+        pos = match.end()
+        if pos == end:
+            return tokens
+        match = LEXEME_PATTERN.match(text, pos)
+        if match is None:
+            raise ValueError('не закрыта кавычка')
+        double_quoted, single_quoted, token = match.groups()
+        if double_quoted is not None:
+            token = UNESCAPE_PATTERN.sub(r'\1', double_quoted)
+        elif single_quoted is not None:
+            token = single_quoted
+        tokens.append(token)
+        pos = match.end()
+
+
+def convert_literal(token):
+    """
+    Преобразует лексему значения в bool, int или str.
+    """
+
+    if token.lower() == 'true':
+        return True
+    if token.lower() == 'false':
+        return False
+    if token.lstrip('-').isdigit():
+        return int(token)
+    return token
+
+
+def parse_where(tokens):
+    """
+    Разбирает условие WHERE в план проверки.
+
+    Поддерживаются сравнения (=, !=, <, <=, >, >=), in (...), between .. and ..,
+    комбинации and / or и скобки; and связывает сильнее, чем or.
+
+    План — вложенные кортежи, поэтому его можно использовать как ключ кэша:
+        ('cmp', column, op, value)
+        ('in', column, (value, ...))
+        ('between', column, low, high)
+        ('and', (plan, ...)) и ('or', (plan, ...))
+
+    Аргументы:
+        tokens (list[str]): лексемы условия (см. tokenize).
+
+    Возвращает:
+        tuple: (план, число разобранных лексем). Разбор останавливается
+        на ключевых словах END_KEYWORDS.
+
+    Исключения:
+        ValueError: условие записано неверно.
+    """
+
+    parser = WhereParser(tokens)
+    plan = parser.parse_or()
+    return plan, parser.pos
+
+
+class WhereParser:
+    """
+    Рекурсивный нисходящий разбор условия WHERE.
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return None
+
+    def take(self):
+        token = self.peek()
+        if token is None:
+            raise ValueError('условие WHERE оборвано')
+        self.pos += 1
+        return token
+
+    def expect(self, expected):
+        token = self.take()
+        if token.lower() != expected:
+            raise ValueError(f'ожидалось {expected}, получено {token}')
+
+    def at_keyword(self, *keywords):
+        token = self.peek()
+        return token is not None and token.lower() in keywords
+
+    def parse_or(self):
+        parts = [self.parse_and()]
+        while self.at_keyword('or'):
+            self.take()
+            parts.append(self.parse_and())
+        return parts[0] if len(parts) == 1 else ('or', tuple(parts))
+
+    def parse_and(self):
+        parts = [self.parse_atom()]
+        while self.at_keyword('and'):
+            self.take()
+            parts.append(self.parse_atom())
+        return parts[0] if len(parts) == 1 else ('and', tuple(parts))
+
+    def parse_atom(self):
+        if self.peek() == '(':
+            self.take()
+            plan = self.parse_or()
+            self.expect(')')
+            return plan
+
+        column = self.take()
+        if self.at_keyword('in'):
+            self.take()
+            self.expect('(')
+            values = [convert_literal(self.take())]
+            while self.peek() == ',':
+                self.take()
+                values.append(convert_literal(self.take()))
+            self.expect(')')
+            return ('in', column, tuple(values))
+
+        if self.at_keyword('between'):
+            self.take()
+            low = convert_literal(self.take())
+            self.expect('and')
+            high = convert_literal(self.take())
+            return ('between', column, low, high)
+
+        op = self.take()
+        if op not in COMPARISONS:
+            raise ValueError(f'неизвестный оператор {op}')
+        return ('cmp', column, op, convert_literal(self.take()))
+
+
+def from_dict(clause):
+    """
+    Переводит условие в старом виде {column: value} в план равенства.
+    """
+
+    parts = tuple(('cmp', column, '=', value) for column, value in clause.items())
+    return parts[0] if len(parts) == 1 else ('and', parts)
+
+
+def leaves(plan):
+    """
+    Перечисляет элементарные условия плана (cmp, in, between).
+    """
+
+    if plan[0] in ('and', 'or'):
+        for part in plan[1]:
+            yield from leaves(part)
+    else:
+        yield plan
+
+
+def map_leaves(plan, func):
+    """
+    Возвращает план, в котором каждое простое условие заменено на func(условие).
+    """
+
+    if plan[0] in ('and', 'or'):
+        return (plan[0], tuple(map_leaves(part, func) for part in plan[1]))
+    return func(plan)
+
+
+def check_types(plan, columns):
+    """
+    Проверяет, что столбцы условия существуют и значения подходят по типу.
+
+    Аргументы:
+        plan (tuple): план условия.
+        columns (dict): столбцы таблицы вида {column_name: type}.
+
+    Возвращает:
+        str | None: описание ошибки или None.
+    """
+
+    expected_types = {'int': int, 'str': str, 'bool': (bool, int)}
+    for leaf in leaves(plan):
+        column = leaf[1]
+        if column not in columns:
+            return f'Столбца {column} нет в таблице.'
+
+        if leaf[0] == 'in':
+            values = leaf[2]
+        elif leaf[0] == 'between':
+            values = leaf[2:]
+        else:
+            values = (leaf[3],)
+        expected = expected_types[columns[column]]
+        for value in values:
+            if not isinstance(value, expected):
+                return f'Значение {value} не соответствует типу ' \
+                       f'столбца {column} ({columns[column]}).'
+    return None
+
+
+def python_mask(plan, get_column):
+    """
+    Строит ленивую маску строк для плана средствами стандартной библиотеки.
+
+    Сравнение выполняется целыми столбцами через map с функциями модуля
+    operator, то есть без вызова Python-функции на каждую строку.
+
+    Аргументы:
+        plan (tuple): план условия.
+        get_column (callable): возвращает список значений столбца по имени
+            (или bytes — коды словаря столбца для условия in).
+
+    Возвращает:
+        iterator[bool]: маска подходящих строк.
+    """
+
+    kind = plan[0]
+    if kind == 'cmp':
+        _, column, op, value = plan
+        return map(COMPARISONS[op], get_column(column), repeat(value))
+    if kind == 'in':
+        values = get_column(plan[1])
+        if isinstance(values, bytes):
+            # коды словаря (см. core.encode_plan): маска — байты 0/1,
+            # которые строит bytes.translate без цикла на Python
+            table = bytearray(256)
+            for code in plan[2]:
+                table[code] = 1
+            return values.translate(table)
+        return map(frozenset(plan[2]).__contains__, values)
+    if kind == 'between':
+        _, column, low, high = plan
+        values = get_column(column)
+        return map(operator.and_,
+                   map(operator.ge, values, repeat(low)),
+                   map(operator.le, values, repeat(high)))
+
+    combine = operator.and_ if kind == 'and' else operator.or_
+    masks = [python_mask(part, get_column) for part in plan[1]]
+    return reduce(lambda left, right: map(combine, left, right), masks)
+
+
+def numpy_mask(plan, get_array):
+    """
+    Строит маску строк для плана векторными операциями numpy.
+
+    Аргументы:
+        plan (tuple): план условия.
+        get_array (callable): возвращает numpy-массив столбца по имени.
+
+    Возвращает:
+        numpy.ndarray: булева маска подходящих строк.
+    """
+
+    kind = plan[0]
+    if kind == 'cmp':
+        _, column, op, value = plan
+        return COMPARISONS[op](get_array(column), value)
+    if kind == 'in':
+        return np.isin(get_array(plan[1]), list(plan[2]))
+    if kind == 'between':
+        _, column, low, high = plan
+        values = get_array(column)
+        return (values >= low) & (values <= high)
+
+    masks = [numpy_mask(part, get_array) for part in plan[1]]
+    combine = np.logical_and if kind == 'and' else np.logical_or
+    return reduce(combine, masks)
+
+
+def as_array(values):
+    """
+    Возвращает numpy-массив значений столбца; коды словаря (bytes)
+    отображаются в массив uint8 без копирования.
+    """
+
+    if isinstance(values, bytes):
+        return np.frombuffer(values, dtype=np.uint8)
+    return np.asarray(values)
+
+
+def can_use_numpy(plan, columns):
+    """
+    Проверяет, можно ли вычислить план через numpy: numpy установлен
+    и все столбцы условия имеют тип int или bool.
+    """
+
+    return np is not None and \
+        all(columns.get(leaf[1]) in NUMPY_TYPES for leaf in leaves(plan))
+
+
+def evaluate(plan, table_data, columns, get_array=None, positions=None):
+    """
+    Возвращает позиции строк, удовлетворяющих плану.
+
+    Аргументы:
+        plan (tuple): план условия.
+        table_data (dict): данные таблицы.
+        columns (dict): столбцы таблицы вида {column_name: type}.
+        get_array (callable | None): источник numpy-массивов столбцов
+            (например, кэш буферного пула); по умолчанию массив строится
+            из списка.
+        positions (list[int] | range | None): если заданы, проверяются
+            только эти строки (например, найденные по индексу или один
+            сегмент таблицы); подряд идущие строки (range) проверяются
+            через numpy, если это возможно.
+
+    Возвращает:
+        iterator[int]: позиции подходящих строк в порядке их хранения.
+        Без numpy перебор ленивый и останавливается вместе с потребителем.
+    """
+
+    if isinstance(positions, range) and positions.step == 1 and \
+            can_use_numpy(plan, columns):
+        start, stop = positions.start, positions.stop
+        if get_array is None:
+            def get_slice(column):
+                return as_array(table_data[column][start:stop])
+        else:
+            def get_slice(column):
+                return get_array(column)[start:stop]
+        return iter((np.flatnonzero(numpy_mask(plan, get_slice)) + start).tolist())
+
+    if positions is not None:
+        subset = {}
+
+        def get_subset(column):
+            if column not in subset:
+                values = table_data[column]
+                if isinstance(positions, range) and positions.step == 1:
+                    subset[column] = values[positions.start:positions.stop]
+                else:
+                    subset[column] = [values[i] for i in positions]
+            return subset[column]
+
+        return compress(positions, python_mask(plan, get_subset))
+
+    if can_use_numpy(plan, columns):
+        get_array = get_array or (lambda column: as_array(table_data[column]))
+        return iter(np.flatnonzero(numpy_mask(plan, get_array)).tolist())
+
+    row_count = len(table_data['id'])
+    return compress(range(row_count),
+                    python_mask(plan, table_data.__getitem__))
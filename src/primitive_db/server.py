@@ -0,0 +1,283 @@
+"""
+Сервер базы данных: тот же язык команд для многих клиентов одновременно.
+
+Запуск: database serve --port 5433
+
+Протокол строковый. Клиент отправляет команду одной строкой в UTF-8,
+сервер отвечает строкой заголовка «ok <длина>» или «error <длина>»
+и затем <длина> байт вывода команды — того, что в диалоговом режиме
+печатается в терминал. Команда exit закрывает соединение.
+
+Все клиенты работают с одним буферным пулом и одним кэшем select.
+Команды выполняются в пуле потоков: чтения одной таблицы идут
+одновременно, изменения таблицы — по одному и без одновременных чтений
+этой таблицы; create_table и drop_table ждут, пока завершатся все
+остальные команды.
+"""
+import asyncio
+import contextlib
+import contextvars
+import io
+import signal
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from src.primitive_db import constants, decorators, engine, statements
+
+# буфер вывода команды, которую выполняет текущий клиент;
+# None — печать в настоящий stdout
+OUTPUT = contextvars.ContextVar('output', default=None)
+
+# команды, которые только читают таблицу
+READ_COMMANDS = ('select', 'info')
+# команды, которые меняют одну таблицу
+WRITE_COMMANDS = ('insert', 'import', 'update', 'delete', 'create_index',
+                  'drop_index', 'convert', 'vacuum')
+# команды, которые меняют список таблиц
+CATALOG_COMMANDS = ('create_table', 'drop_table')
+# команды, меняющие состояние всего процесса, общее для всех клиентов сервера
+UNSUPPORTED_COMMANDS = ('begin', 'commit', 'rollback', 'set')
+
+# блокировки сервера: общая для списка таблиц и по одной на таблицу,
+# а также задачи открытых соединений {задача: StreamWriter}
+SERVER = {'catalog': None, 'tables': {}, 'clients': {}}
+
+
+class OutputRouter:
+    """
+    Замена sys.stdout: печать направляется в буфер из OUTPUT, если он задан
+    (команда клиента), иначе — в исходный поток.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        buffer = OUTPUT.get()
+        return (self.stream if buffer is None else buffer).write(text)
+
+    def flush(self):
+        if OUTPUT.get() is None:
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def new_lock():
+    """
+    Создаёт блокировку «много читателей или один писатель» для asyncio.
+
+    Возвращает:
+        dict: состояние блокировки для acquire.
+    """
+
+    return {'readers': 0, 'writer': False, 'waiting': 0,
+            'condition': asyncio.Condition()}
+
+
+@contextlib.asynccontextmanager
+async def acquire(lock, exclusive=False):
+    """
+    Удерживает блокировку new_lock на время блока async with.
+
+    Писатели, ждущие блокировку, пропускаются вперёд новых читателей,
+    чтобы поток чтений не откладывал запись бесконечно.
+
+    Аргументы:
+        lock (dict): блокировка из new_lock.
+        exclusive (bool): исключительная блокировка для записи.
+    """
+
+    condition = lock['condition']
+    async with condition:
+        if exclusive:
+            lock['waiting'] += 1
+            try:
+                await condition.wait_for(
+                    lambda: not lock['writer'] and not lock['readers'])
+            finally:
+                lock['waiting'] -= 1
+            lock['writer'] = True
+        else:
+            await condition.wait_for(
+                lambda: not lock['writer'] and not lock['waiting'])
+            lock['readers'] += 1
+    try:
+        yield
+    finally:
+        async with condition:
+            if exclusive:
+                lock['writer'] = False
+            else:
+                lock['readers'] -= 1
+            condition.notify_all()
+
+
+def get_table_lock(table_name):
+    if table_name not in SERVER['tables']:
+        SERVER['tables'][table_name] = new_lock()
+    return SERVER['tables'][table_name]
+
+
+def run_captured(statement, prepared):
+    """
+    Выполняет команду в потоке пула; вывод команды попадает в буфер OUTPUT.
+
+    Возвращает:
+        bool: True, если команда выполнилась без ошибки (не было исключения
+        и сообщения decorators.report_error).
+    """
+
+    decorators.start_command()
+    try:
+        engine.run_statement(statement, prepared)
+    except (FileNotFoundError, KeyError, ValueError, IndexError):
+        return False
+    except Exception as e:
+        print(f'Внутренняя ошибка сервера: {e!r}')
+        return False
+    return not decorators.command_failed()
+
+
+async def execute(text, session):
+    """
+    Выполняет команду клиента под блокировками сервера.
+
+    Аргументы:
+        text (str): текст команды.
+        session (dict): состояние соединения (подготовленные команды).
+
+    Возвращает:
+        tuple: (успех, вывод команды, продолжать ли соединение).
+    """
+
+    buffer = io.StringIO()
+    OUTPUT.set(buffer)
+    try:
+        statement = statements.parse(text)
+    except ValueError as e:
+        return False, f'{e}\n', True
+
+    command = statement['command']
+    if command == 'exit':
+        return True, '', False
+    if command in UNSUPPORTED_COMMANDS:
+        return False, f'Команда {command} недоступна в режиме сервера.\n', True
+    if command == 'execute':
+        statement = engine.bind_prepared(statement, session['prepared'])
+        if statement is None:
+            return False, buffer.getvalue(), True
+        command = statement['command']
+
+    async with contextlib.AsyncExitStack() as stack:
+        await stack.enter_async_context(
+            acquire(SERVER['catalog'], exclusive=command in CATALOG_COMMANDS))
+        if command in READ_COMMANDS or command in WRITE_COMMANDS:
+            tables = {statement['table']}
+            if statement.get('join'):
+                tables.add(statement['join']['table'])
+            # несколько таблиц блокируются по порядку имён, чтобы
+            # встречные соединения не ждали друг друга
+            for table_name in sorted(tables):
+                await stack.enter_async_context(
+                    acquire(get_table_lock(table_name),
+                            exclusive=command in WRITE_COMMANDS))
+        # to_thread копирует контекст, поэтому поток пишет в buffer клиента
+        ok = await asyncio.to_thread(run_captured, statement, session['prepared'])
+    return ok, buffer.getvalue(), True
+
+
+async def handle_client(reader, writer):
+    """
+    Обслуживает одно соединение: читает команды по строке и отвечает
+    на каждую заголовком и выводом команды.
+    """
+
+    SERVER['clients'][asyncio.current_task()] = writer
+    session = {'prepared': {}}
+    try:
+        while line := await reader.readline():
+            text = line.decode('utf-8', errors='replace').strip()
+            ok, output, running = await execute(text, session) if text else \
+                (True, '', True)
+            payload = output.encode('utf-8')
+            status = 'ok' if ok else 'error'
+            writer.write(f'{status} {len(payload)}\n'.encode('ascii') + payload)
+            await writer.drain()
+            if not running:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        SERVER['clients'].pop(asyncio.current_task(), None)
+        writer.close()
+        with contextlib.suppress(ConnectionError):
+            await writer.wait_closed()
+
+
+async def run_server(host, port, workers):
+    """
+    Принимает соединения, пока процесс не получит SIGINT или SIGTERM.
+    """
+
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=workers))
+    SERVER['catalog'] = new_lock()
+    SERVER['tables'] = {}
+
+    stop = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        with contextlib.suppress(NotImplementedError):
+            loop.add_signal_handler(signum, stop.set)
+
+    server = await asyncio.start_server(handle_client, host, port)
+    print(f'Сервер принимает команды на {host}:{port}.', flush=True)
+    async with server:
+        await stop.wait()
+        server.close()
+        # соединения закрываются после текущей команды клиента
+        for writer in SERVER['clients'].values():
+            writer.transport.close()
+        await asyncio.gather(*SERVER['clients'], return_exceptions=True)
+    print('Сервер остановлен.')
+
+
+def serve(host=None, port=None, workers=None):
+    """
+    Запускает сервер базы данных.
+
+    Аргументы:
+        host (str | None): адрес; по умолчанию constants.SERVER_HOST.
+        port (int | None): порт; по умолчанию constants.SERVER_PORT.
+        workers (int | None): число потоков, выполняющих команды;
+            по умолчанию constants.SERVER_WORKERS.
+
+    Поведение:
+        • доводит до конца прерванную фиксацию и применяет журналы таблиц;
+        • вывод команд каждого клиента собирается отдельно (OUTPUT);
+        • команды выполняются без параллельного просмотра сегментов;
+        • изменения пишутся сразу (политика write_through; при уровне
+          надёжности batched — фоновым потоком), замеры
+          log_time не выводятся, подтверждение опасных действий
+          берётся из decorators.CONFIRM_ANSWER (по умолчанию — отказ);
+        • при остановке записывает на диск накопленные изменения.
+    """
+
+    decorators.LOG_TIME = False
+    if decorators.CONFIRM_ANSWER is None:
+        decorators.CONFIRM_ANSWER = 'n'
+    constants.BUFFER_POOL_WRITE_POLICY = 'write_through'
+    # процессы параллельного просмотра создаются через fork, а fork
+    # многопоточного процесса небезопасен
+    constants.PARALLEL_WORKERS = 1
+    engine.startup()
+
+    sys.stdout = OutputRouter(sys.stdout)
+    try:
+        asyncio.run(run_server(host or constants.SERVER_HOST,
+                               port or constants.SERVER_PORT,
+                               workers or constants.SERVER_WORKERS))
+    finally:
+        sys.stdout = sys.stdout.stream
+        engine.shutdown()
@@ -0,0 +1,424 @@
+import functools
+import itertools
+import shlex
+
+from src.primitive_db import aggregates, constants, predicates
+
+# метка параметра ? в разобранной команде: (PARAM, номер параметра)
+PARAM = '?'
+
+# команды без аргументов
+SIMPLE_COMMANDS = ('list_tables', 'cache_stats', 'help', 'begin', 'commit',
+                   'rollback', 'exit')
+
+# команды вида <команда> <таблица> <аргумент>: имя поля аргумента
+TABLE_ARGUMENT_COMMANDS = {
+    'create_index': 'column',
+    'drop_index': 'column',
+    'convert': 'storage',
+    'import': 'path',
+}
+
+# действия команды stats: вывести метрики, обнулить их или выгрузить в JSON
+STATS_ACTIONS = ('show', 'reset', 'json')
+
+# подготовленные команды: {имя: разобранная команда}
+PREPARED = {}
+
+
+def convert_value(token):
+    """
+    Преобразует значение из команды в bool, int, float или str.
+    """
+
+    if token.lower() == 'true':
+        return True
+    if token.lower() == 'false':
+        return False
+    if token.lstrip('-').isdigit():
+        return int(token)
+    try:
+        return float(token)
+    except ValueError:
+        return token
+
+
+@functools.lru_cache(maxsize=constants.STATEMENT_CACHE_SIZE)
+def parse(text):
+    """
+    Разбирает текст команды в словарь команды.
+
+    Результаты хранятся в LRU-кэше по тексту команды, поэтому повторяющиеся
+    команды не разбираются заново. Возвращаемый словарь общий для всех
+    вызовов с тем же текстом, и изменять его нельзя; значения параметров
+    подставляются функцией bind.
+
+    Аргументы:
+        text (str): текст команды.
+
+    Возвращает:
+        dict: {'command': имя команды, 'params': число параметров ?, ...}
+        и поля, зависящие от команды (table, where, rows, set и др.).
+
+    Исключения:
+        ValueError: команда записана неверно; текст исключения — сообщение
+            для пользователя.
+    """
+
+    words = text.split(None, 1)
+    if not words:
+        raise ValueError('Пустая команда.')
+
+    command = words[0]
+    counter = itertools.count()
+    if command in SIMPLE_COMMANDS:
+        statement = {'command': command}
+    elif command == 'create_table':
+        statement = parse_create_table(split_args(text))
+    elif command in TABLE_ARGUMENT_COMMANDS:
+        args = split_args(text)
+        if len(args) < 3:
+            raise ValueError('Недостаточно аргументов.')
+        statement = {'command': command, 'table': args[1],
+                     TABLE_ARGUMENT_COMMANDS[command]: args[2]}
+    elif command in ('drop_table', 'info', 'vacuum'):
+        args = split_args(text)
+        if len(args) < 2:
+            raise ValueError('Недостаточно аргументов.')
+        statement = {'command': command, 'table': args[1]}
+    elif command == 'set':
+        args = split_args(text)
+        if len(args) < 3:
+            raise ValueError('Недостаточно аргументов.')
+        statement = {'command': command, 'name': args[1], 'value': args[2]}
+    elif command == 'stats':
+        args = split_args(text)
+        action = args[1] if len(args) > 1 else 'show'
+        if action not in STATS_ACTIONS or len(args) > (3 if action == 'json' else 2):
+            raise ValueError('Команда stats: stats [reset | json [файл]].')
+        statement = {'command': command, 'action': action,
+                     'path': args[2] if len(args) > 2 else None}
+    elif command == 'prepare':
+        parts = text.split(None, 2)
+        if len(parts) < 3:
+            raise ValueError('Команда prepare: prepare <имя> <команда>.')
+        statement = {'command': command, 'name': parts[1],
+                     'statement': parse(parts[2])}
+    elif command == 'execute':
+        args = split_args(text)
+        if len(args) < 2:
+            raise ValueError('Команда execute: execute <имя> [значения ...].')
+        values = [value.rstrip(',') for value in args[2:]]
+        statement = {'command': command, 'name': args[1],
+                     'values': tuple(convert_value(v) for v in values if v)}
+    else:
+        parser = STATEMENT_PARSERS.get(command)
+        if parser is None:
+            raise ValueError('Неизвестная команда.')
+        try:
+            tokens = predicates.tokenize(text)
+        except ValueError as e:
+            raise ValueError(f'Ошибка в команде: {e}') from e
+        statement = parser(tokens, counter)
+
+    statement['params'] = next(counter)
+    return statement
+
+
+def split_args(text):
+    """
+    Разбивает команду на аргументы по пробелам с учётом кавычек.
+    """
+
+    try:
+        return shlex.split(text)
+    except ValueError as e:
+        raise ValueError(f'Ошибка в команде: {e}') from e
+
+
+def parse_create_table(args):
+    if len(args) < 3:
+        raise ValueError('Недостаточно аргументов.')
+
+    columns = {}
+    for token in args[2:]:
+        col, sep, type_ = token.partition(':')
+        if not sep or not col or ':' in type_:
+            raise ValueError(f'Ошибка в аргументе {token}.')
+        columns[col] = type_
+    return {'command': 'create_table', 'table': args[1], 'columns': columns}
+
+
+def literal(token, counter):
+    """
+    Возвращает значение лексемы или метку параметра для ?.
+    """
+
+    if token == PARAM:
+        return (PARAM, next(counter))
+    return convert_value(token)
+
+
+def parse_insert(tokens, counter):
+    """
+    insert into <таблица> values (<значение>, ...), (...), ...
+    """
+
+    if len(tokens) < 4 or tokens[1].lower() != 'into' or \
+            tokens[3].lower() != 'values':
+        raise ValueError('Команда insert: insert into <таблица> values (...).')
+
+    rows = []
+    pos = 4
+    while pos < len(tokens):
+        if tokens[pos] != '(':
+            raise ValueError('Значения строки должны быть в скобках.')
+        row = []
+        pos += 1
+        while pos < len(tokens) and tokens[pos] != ')':
+            if tokens[pos] != ',':
+                row.append(literal(tokens[pos], counter))
+            pos += 1
+        if pos == len(tokens):
+            raise ValueError('Не закрыта скобка в списке значений.')
+        rows.append(tuple(row))
+        pos += 1
+        if pos < len(tokens) and tokens[pos] == ',':
+            pos += 1
+
+    if not rows:
+        raise ValueError('Не указаны значения.')
+    return {'command': 'insert', 'table': tokens[2], 'rows': rows}
+
+
+def parse_select(tokens, counter):
+    """
+    select [<список>] from <таблица> [join <таблица> on <столбец> = <столбец>]
+    [where ...] [group by <столбец>] [order by <столбец> [asc | desc]]
+    [limit N] [offset M]
+
+    Список из одних столбцов без group by (select name, age from ...) —
+    выбор столбцов (columns), список с агрегатами — select_list;
+    select * и select без списка выбирают все столбцы.
+    """
+
+    lowered = [token.lower() for token in tokens]
+    if 'from' not in lowered or lowered.index('from') + 1 >= len(tokens):
+        raise ValueError('Команда select должна содержать from <имя_таблицы>.')
+
+    from_idx = lowered.index('from')
+    select_list = None
+    if from_idx > 1:
+        try:
+            select_list = aggregates.parse_select_list(' '.join(tokens[1:from_idx]))
+        except ValueError as e:
+            raise ValueError(f'Ошибка в запросе: {e}') from e
+
+    rest = tokens[from_idx + 2:]
+    join = None
+    if rest[:1] and rest[0].lower() == 'join':
+        if len(rest) < 6 or rest[2].lower() != 'on' or rest[4] != '=':
+            raise ValueError('Ожидалось join <таблица> on <столбец> = <столбец>.')
+        join = {'table': rest[1], 'on': (rest[3], rest[5])}
+        rest = rest[6:]
+
+    where, rest = parse_tail(rest, counter)
+    group_by = None
+    if rest[:2] and [token.lower() for token in rest[:2]] == ['group', 'by']:
+        if len(rest) < 3:
+            raise ValueError('После group by должен идти столбец.')
+        group_by = rest[2]
+        rest = rest[3:]
+    if group_by is not None and select_list is None:
+        raise ValueError('group by используется только вместе с агрегатами.')
+
+    columns = None
+    if group_by is None and select_list is not None and \
+            all(item[0] == 'column' for item in select_list):
+        columns = [item[1] for item in select_list]
+        select_list = None
+        if columns == ['*']:
+            columns = None
+    if join is not None and (select_list is not None or columns is not None):
+        raise ValueError('С join выбираются все столбцы обеих таблиц.')
+
+    order_by = None
+    if rest[:2] and [token.lower() for token in rest[:2]] == ['order', 'by']:
+        if len(rest) < 3:
+            raise ValueError('После order by должен идти столбец.')
+        direction = rest[3].lower() if len(rest) > 3 else ''
+        order_by = (rest[2], direction == 'desc')
+        rest = rest[4:] if direction in ('asc', 'desc') else rest[3:]
+    if order_by is not None and (select_list is not None or join is not None):
+        raise ValueError('order by используется только в select строк одной '
+                         'таблицы, без агрегатов.')
+
+    limit = parse_count(rest, 'limit')
+    offset = parse_count(rest, 'offset') or 0
+    return {
+        'command': 'select',
+        'table': tokens[from_idx + 1],
+        'select_list': select_list,
+        'columns': columns,
+        'join': join,
+        'where': where,
+        'group_by': group_by,
+        'order_by': order_by,
+        'limit': limit,
+        'offset': offset,
+    }
+
+
+def parse_update(tokens, counter):
+    """
+    update <таблица> set <столбец> = <значение>[, ...] where ...
+    """
+
+    lowered = [token.lower() for token in tokens]
+    if len(tokens) < 2 or 'set' not in lowered or 'where' not in lowered:
+        raise ValueError('Команда update должна содержать set и where.')
+
+    set_clause = {}
+    pos = lowered.index('set') + 1
+    while lowered[pos] != 'where':
+        if pos + 2 >= len(tokens) or tokens[pos + 1] != '=':
+            raise ValueError('Ожидалось set <столбец> = <значение>.')
+        set_clause[tokens[pos]] = literal(tokens[pos + 2], counter)
+        pos += 3
+        if tokens[pos] == ',':
+            pos += 1
+    if not set_clause:
+        raise ValueError('Команда update должна содержать set и where.')
+
+    where, rest = parse_tail(tokens[pos:], counter)
+    if rest:
+        raise ValueError(f'Лишние слова в команде: {" ".join(rest)}')
+    return {'command': 'update', 'table': tokens[1], 'set': set_clause,
+            'where': where}
+
+
+def parse_delete(tokens, counter):
+    """
+    delete from <таблица> where ...
+    """
+
+    if len(tokens) < 3 or tokens[1].lower() != 'from':
+        raise ValueError('Команда delete: delete from <таблица> where ...')
+
+    where, rest = parse_tail(tokens[3:], counter)
+    if where is None:
+        raise ValueError('Команда delete должна содержать where.')
+    if rest:
+        raise ValueError(f'Лишние слова в команде: {" ".join(rest)}')
+    return {'command': 'delete', 'table': tokens[2], 'where': where}
+
+
+def parse_tail(tokens, counter):
+    """
+    Разбирает необязательное условие where в начале лексем.
+
+    Возвращает:
+        tuple: (план условия или None, оставшиеся лексемы).
+    """
+
+    if not tokens or tokens[0].lower() != 'where':
+        return None, tokens
+
+    try:
+        plan, consumed = predicates.parse_where(tokens[1:])
+    except ValueError as e:
+        raise ValueError(f'Ошибка в условии: {e}') from e
+
+    rest = tokens[1 + consumed:]
+    if rest and rest[0].lower() not in predicates.END_KEYWORDS:
+        raise ValueError(f'Ошибка в условии: лишние слова в условии WHERE: '
+                         f'{" ".join(rest)}')
+    return mark_params(plan, counter), rest
+
+
+def mark_params(plan, counter):
+    """
+    Заменяет значения ? в плане условия метками параметров
+    (в порядке следования в тексте).
+    """
+
+    kind = plan[0]
+    if kind in ('and', 'or'):
+        return (kind, tuple(mark_params(part, counter) for part in plan[1]))
+    if kind == 'cmp':
+        _, column, op, value = plan
+        return ('cmp', column, op, param_or_value(value, counter))
+    if kind == 'in':
+        return ('in', plan[1], tuple(param_or_value(v, counter) for v in plan[2]))
+    _, column, low, high = plan
+    return ('between', column, param_or_value(low, counter),
+            param_or_value(high, counter))
+
+
+def param_or_value(value, counter):
+    return (PARAM, next(counter)) if value == PARAM else value
+
+
+def parse_count(tokens, keyword):
+    """
+    Возвращает неотрицательное целое после ключевого слова (limit, offset)
+    или None, если ключевого слова в команде нет.
+
+    При некорректном значении выбрасывает ValueError с понятным сообщением.
+    """
+
+    lowered = [token.lower() for token in tokens]
+    if keyword not in lowered:
+        return None
+
+    idx = lowered.index(keyword)
+    value = tokens[idx + 1] if idx + 1 < len(tokens) else ''
+    if not value.isdigit():
+        raise ValueError(f'Ошибка в запросе: после {keyword} должно идти '
+                         'неотрицательное целое число.')
+    return int(value)
+
+
+STATEMENT_PARSERS = {
+    'insert': parse_insert,
+    'select': parse_select,
+    'update': parse_update,
+    'delete': parse_delete,
+}
+
+
+def bind(statement, values):
+    """
+    Подставляет значения параметров ? в разобранную команду.
+
+    Аргументы:
+        statement (dict): команда из parse.
+        values (tuple): значения параметров по порядку.
+
+    Возвращает:
+        dict: новая команда без параметров; исходная не меняется.
+
+    Исключения:
+        ValueError: число значений не совпадает с числом параметров.
+    """
+
+    if len(values) != statement['params']:
+        raise ValueError(f'Команда ожидает параметров: {statement["params"]}, '
+                         f'передано: {len(values)}.')
+    if not values:
+        return statement
+
+    def substitute(obj):
+        if isinstance(obj, tuple):
+            if len(obj) == 2 and obj[0] == PARAM and isinstance(obj[1], int):
+                return values[obj[1]]
+            return tuple(substitute(item) for item in obj)
+        if isinstance(obj, list):
+            return [substitute(item) for item in obj]
+        if isinstance(obj, dict):
+            return {key: substitute(value) for key, value in obj.items()}
+        return obj
+
+    bound = substitute(statement)
+    bound['params'] = 0
+    return bound
@@ -0,0 +1,646 @@
+import base64
+import json
+import mmap
+import os
+import zlib
+from array import array
+from contextlib import contextmanager
+from itertools import accumulate
+
+from src.primitive_db import constants, metrics, table_stats
+
+try:
+    import numpy as np
+except ImportError:  # numpy не обязателен: без него работает чистый Python
+    np = None
+
+# коды типов array/memoryview для столбцов фиксированной ширины
+FIXED_WIDTH_TYPES = {'int': 'q', 'bool': 'B'}
+# типы numpy тех же столбцов (см. ColumnarStorage.map_array)
+NUMPY_DTYPES = {'int': 'int64', 'bool': 'bool'}
+# компактная запись JSON: без отступов и пробелов после разделителей
+JSON_SEPARATORS = (',', ':')
+# окончание имени файла сегмента, сжатого zlib
+COMPRESSED_SUFFIX = '.zlib'
+
+
+def dictionary_encode(values):
+    """
+    Кодирует столбец str словарём: каждое значение заменяется номером
+    в отсортированном списке различных значений.
+
+    Аргументы:
+        values (list[str]): значения столбца.
+
+    Возвращает:
+        tuple | None: (список различных значений, array кодов типа B или H)
+        или None, если столбец пуст или различных значений слишком много
+        (см. constants.DICTIONARY_MAX_SIZE и DICTIONARY_MAX_FRACTION).
+    """
+
+    dictionary = sorted(set(values))
+    if not values or len(dictionary) > constants.DICTIONARY_MAX_SIZE or \
+            len(dictionary) > len(values) * constants.DICTIONARY_MAX_FRACTION:
+        return None
+    codes = {value: code for code, value in enumerate(dictionary)}
+    typecode = 'B' if len(dictionary) <= 256 else 'H'
+    return dictionary, array(typecode, map(codes.__getitem__, values))
+
+
+def encode_segment_column(values):
+    """
+    Возвращает значения столбца сегмента для записи в JSON: словарь
+    и коды (байты кодов в base64), если столбец стоит кодировать,
+    иначе — сам список значений.
+    """
+
+    if not values or type(values[0]) is not str:
+        return values
+    encoded = dictionary_encode(values)
+    if encoded is None:
+        return values
+    dictionary, codes = encoded
+    return {'dictionary': dictionary, 'type': codes.typecode,
+            'codes': base64.b64encode(codes.tobytes()).decode('ascii')}
+
+
+def decode_segment_column(stored):
+    """
+    Восстанавливает значения столбца сегмента, записанные
+    encode_segment_column. Равные строки — один и тот же объект str.
+    """
+
+    if not isinstance(stored, dict):
+        return stored
+    codes = array(stored['type'], base64.b64decode(stored['codes']))
+    return list(map(stored['dictionary'].__getitem__, codes))
+
+
+def sync_file(f):
+    """
+    Сбрасывает записанный файл на диск (fsync), если уровень надёжности
+    constants.DURABILITY не none.
+    """
+
+    if constants.DURABILITY != 'none':
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def sync_dir(path):
+    """
+    Сбрасывает на диск каталог path, чтобы переименования и удаления
+    файлов в нём пережили сбой питания (если DURABILITY не none).
+    """
+
+    if constants.DURABILITY == 'none' or not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def replace(tmp_path, path):
+    """
+    Атомарно заменяет файл path временным файлом tmp_path
+    и сбрасывает каталог на диск.
+    """
+
+    os.replace(tmp_path, path)
+    sync_dir(path.parent)
+
+
+class JsonStorage:
+    """
+    Хранение таблицы в одном JSON-файле вида {column: list_of_values}.
+    """
+
+    name = 'json'
+
+    def get_path(self, table_name):
+        return constants.TABLE_DATA_DIR / f'{table_name}.json'
+
+    def exists(self, table_name):
+        return self.get_path(table_name).exists()
+
+    def signature_path(self, table_name):
+        return self.get_path(table_name)
+
+    def size(self, table_name):
+        path = self.get_path(table_name)
+        return path.stat().st_size if path.exists() else 0
+
+    def load(self, table_name, columns=None):
+        # файл разбирается целиком, поэтому читаются все столбцы
+        with open(self.get_path(table_name), 'r', encoding='utf-8') as f:
+            table_data = json.load(f)
+            metrics.add_gauge('io.bytes_read', f.tell())
+        return table_data
+
+    def save(self, table_name, data, column_types=None, segments=None):
+        for tmp_path, path in self.stage(table_name, data, column_types):
+            replace(tmp_path, path)
+
+    def stage(self, table_name, data, column_types=None, segments=None):
+        """
+        Записывает снимок во временный файл, не трогая текущий.
+
+        Возвращает:
+            list[tuple]: пары (временный файл, основной файл) для os.replace.
+        """
+
+        filepath = self.get_path(table_name)
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+
+        tmp_path = filepath.with_suffix('.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=JSON_SEPARATORS)
+            metrics.add_gauge('io.bytes_written', f.tell())
+            sync_file(f)
+        return [(tmp_path, filepath)]
+
+    def load_zones(self, table_name):
+        return None
+
+    def map_array(self, table_name, column):
+        return None
+
+    def cleanup(self, table_name):
+        pass
+
+    def remove(self, table_name):
+        path = self.get_path(table_name)
+        if path.exists():
+            path.unlink()
+
+
+class ColumnarStorage:
+    """
+    Двоичное поколоночное хранение таблицы.
+
+    Таблица хранится в каталоге <table>.columns: столбцы int и bool —
+    массивами фиксированной ширины (int64 и uint8 в порядке байтов машины),
+    столбцы str — парой файлов: смещения строк (int64) и общий текст UTF-8.
+    Столбцы str с небольшим числом различных значений кодируются словарём
+    (см. dictionary_encode): различные значения хранятся так же, парой
+    файлов, а строки — массивом кодов (uint8 или uint16).
+    Файл manifest.json описывает столбцы, их кодирование, число строк
+    и номер поколения файлов. Проверка условий на столбцы int и bool
+    читает файлы через отображение в память без копирования
+    (см. map_array, buffer_pool.get_array). Новое поколение пишется рядом со старым,
+    после чего manifest атомарно заменяется, поэтому при сбое таблица
+    остаётся целой.
+    """
+
+    name = 'columnar'
+
+    def get_dir(self, table_name):
+        return constants.TABLE_DATA_DIR / f'{table_name}.columns'
+
+    def get_manifest_path(self, table_name):
+        return self.get_dir(table_name) / 'manifest.json'
+
+    def exists(self, table_name):
+        return self.get_manifest_path(table_name).exists()
+
+    def signature_path(self, table_name):
+        return self.get_manifest_path(table_name)
+
+    def size(self, table_name):
+        table_dir = self.get_dir(table_name)
+        if not table_dir.exists():
+            return 0
+        return sum(path.stat().st_size for path in table_dir.iterdir())
+
+    def load_manifest(self, table_name):
+        with open(self.get_manifest_path(table_name), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def column_path(self, table_name, manifest, column, suffix):
+        return self.get_dir(table_name) / \
+            f'{column}.{manifest["generation"]}.{suffix}'
+
+    @contextmanager
+    def open_column(self, table_name, column, manifest=None):
+        """
+        Отображает в память столбец фиксированной ширины без копирования.
+
+        Возвращает (через with) memoryview нужного типа поверх mmap файла;
+        view действителен только внутри блока with.
+        """
+
+        manifest = manifest or self.load_manifest(table_name)
+        typecode = FIXED_WIDTH_TYPES[manifest['columns'][column]]
+        path = self.column_path(table_name, manifest, column, 'bin')
+        with mapped(path, typecode) as view:
+            yield view
+
+    def map_array(self, table_name, column):
+        """
+        Возвращает numpy-массив столбца int или bool текущего поколения,
+        отображённый из файла без копирования, или None, если numpy нет,
+        столбец другого типа или файл пуст.
+
+        Отображение живёт, пока жив массив; файлы старых поколений cleanup
+        удаляет, но отображённые данные при этом остаются доступны.
+        """
+
+        manifest = self.load_manifest(table_name)
+        dtype = NUMPY_DTYPES.get(manifest['columns'].get(column))
+        if np is None or dtype is None or not manifest['rows']:
+            return None
+        path = self.column_path(table_name, manifest, column, 'bin')
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return np.frombuffer(mm, dtype=dtype)
+
+    def load(self, table_name, columns=None):
+        manifest = self.load_manifest(table_name)
+        table_data = {'table_name': table_name}
+        for column, column_type in manifest['columns'].items():
+            if columns is not None and column not in columns:
+                continue
+            typecode = manifest.get('encodings', {}).get(column)
+            if typecode is not None:
+                dictionary = self.load_str_column(table_name, manifest, column,
+                                                  'dict.')
+                path = self.column_path(table_name, manifest, column, 'codes')
+                with mapped(path, typecode) as view:
+                    table_data[column] = list(map(dictionary.__getitem__, view))
+                continue
+            if column_type == 'str':
+                table_data[column] = self.load_str_column(table_name, manifest,
+                                                          column)
+                continue
+            with self.open_column(table_name, column, manifest) as view:
+                values = view.tolist()
+            table_data[column] = list(map(bool, values)) \
+                if column_type == 'bool' else values
+        if metrics.ENABLED:
+            prefixes = tuple(f'{column}.{manifest["generation"]}.'
+                             for column in table_data)
+            metrics.add_gauge('io.bytes_read', sum(
+                path.stat().st_size for path in self.get_dir(table_name).iterdir()
+                if path.name.startswith(prefixes)))
+        return table_data
+
+    def load_str_column(self, table_name, manifest, column, prefix=''):
+        offsets_path = self.column_path(table_name, manifest, column,
+                                        f'{prefix}off')
+        with mapped(offsets_path, 'q') as view:
+            offsets = view.tolist()
+        text_path = self.column_path(table_name, manifest, column, f'{prefix}str')
+        with open(text_path, 'r', encoding='utf-8', newline='') as f:
+            text = f.read()
+        return [text[start:end] for start, end in zip(offsets, offsets[1:])]
+
+    def save(self, table_name, data, column_types=None, segments=None):
+        for tmp_path, path in self.stage(table_name, data, column_types):
+            replace(tmp_path, path)
+        self.cleanup(table_name)
+
+    def stage(self, table_name, data, column_types=None, segments=None):
+        """
+        Записывает файлы нового поколения и manifest во временный файл.
+
+        Текущее поколение остаётся действительным, пока manifest
+        не заменён; после замены старые файлы удаляет cleanup.
+
+        Возвращает:
+            list[tuple]: пары (временный файл, основной файл) для os.replace.
+        """
+
+        table_dir = self.get_dir(table_name)
+        table_dir.mkdir(parents=True, exist_ok=True)
+
+        previous = self.load_manifest(table_name) \
+            if self.exists(table_name) else {'generation': 0, 'columns': {}}
+        column_types = column_types or previous['columns']
+        manifest = {
+            'table_name': table_name,
+            'generation': previous['generation'] + 1,
+            'rows': len(data['id']),
+            'columns': dict(column_types),
+            'encodings': {},
+        }
+
+        for column, column_type in column_types.items():
+            values = data[column]
+            encoded = dictionary_encode(values) if column_type == 'str' else None
+            if encoded is not None:
+                dictionary, codes = encoded
+                self.write_str_column(table_name, manifest, column, dictionary,
+                                      'dict.')
+                self.write_file(self.column_path(table_name, manifest, column,
+                                                 'codes'), codes.tobytes())
+                manifest['encodings'][column] = codes.typecode
+            elif column_type == 'str':
+                self.write_str_column(table_name, manifest, column, values)
+            else:
+                typecode = FIXED_WIDTH_TYPES[column_type]
+                self.write_file(self.column_path(table_name, manifest, column, 'bin'),
+                                array(typecode, values).tobytes())
+
+        manifest_path = self.get_manifest_path(table_name)
+        tmp_path = manifest_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+            sync_file(f)
+        return [(tmp_path, manifest_path)]
+
+    def write_str_column(self, table_name, manifest, column, values, prefix=''):
+        offsets = array('q', accumulate(map(len, values), initial=0))
+        self.write_file(self.column_path(table_name, manifest, column,
+                                         f'{prefix}off'), offsets.tobytes())
+        self.write_file(self.column_path(table_name, manifest, column,
+                                         f'{prefix}str'),
+                        ''.join(values).encode('utf-8'))
+
+    def load_zones(self, table_name):
+        return None
+
+    def cleanup(self, table_name):
+        """
+        Удаляет файлы поколений, на которые не ссылается manifest.
+        """
+
+        current = f'.{self.load_manifest(table_name)["generation"]}.'
+        for path in self.get_dir(table_name).iterdir():
+            if path.name != 'manifest.json' and current not in path.name:
+                path.unlink()
+
+    def write_file(self, path, content):
+        with open(path, 'wb') as f:
+            f.write(content)
+            sync_file(f)
+        metrics.add_gauge('io.bytes_written', len(content))
+
+    def remove(self, table_name):
+        table_dir = self.get_dir(table_name)
+        if not table_dir.exists():
+            return
+        for path in table_dir.iterdir():
+            path.unlink()
+        table_dir.rmdir()
+
+
+class SegmentedStorage:
+    """
+    Хранение таблицы сегментами по constants.SEGMENT_ROWS строк.
+
+    Таблица хранится в каталоге <table>.segments: каждый сегмент — JSON-файл
+    {column: list_of_values} с частью строк; столбцы str с небольшим числом
+    различных значений записываются словарём и кодами (см.
+    encode_segment_column). При constants.STORAGE_COMPRESSION = zlib файлы
+    сегментов сжимаются (имя оканчивается на .zlib). manifest.json
+    перечисляет файлы сегментов по порядку вместе с их зонами (границами
+    значений столбцов, см. table_stats) и смещениями значений каждого
+    столбца в файле, поэтому отдельные столбцы читаются без разбора
+    остальных. При записи снимка заново пишутся
+    только изменённые сегменты (при вставке — последний); файлы изменённых
+    сегментов получают новые имена, а manifest заменяется атомарно,
+    поэтому при сбое таблица остаётся целой.
+    """
+
+    name = 'segmented'
+
+    def get_dir(self, table_name):
+        return constants.TABLE_DATA_DIR / f'{table_name}.segments'
+
+    def get_manifest_path(self, table_name):
+        return self.get_dir(table_name) / 'manifest.json'
+
+    def exists(self, table_name):
+        return self.get_manifest_path(table_name).exists()
+
+    def signature_path(self, table_name):
+        return self.get_manifest_path(table_name)
+
+    def size(self, table_name):
+        table_dir = self.get_dir(table_name)
+        if not table_dir.exists():
+            return 0
+        return sum(path.stat().st_size for path in table_dir.iterdir())
+
+    def load_manifest(self, table_name):
+        with open(self.get_manifest_path(table_name), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def load(self, table_name, columns=None):
+        manifest = self.load_manifest(table_name)
+        wanted = [column for column in manifest['columns']
+                  if columns is None or column in columns]
+        table_data = {'table_name': table_name}
+        for column in wanted:
+            table_data[column] = []
+        for segment in manifest['segments']:
+            part = self.read_segment(table_name, segment, wanted)
+            for column in wanted:
+                table_data[column].extend(decode_segment_column(part[column]))
+        return table_data
+
+    def read_segment(self, table_name, segment, columns):
+        """
+        Читает из файла сегмента значения столбцов columns.
+
+        Если в manifest записаны смещения столбцов, разбираются только
+        нужные столбцы, а из несжатого файла только они и читаются.
+
+        Возвращает:
+            dict: {column: значения в виде, записанном encode_segment_column}.
+        """
+
+        path = self.get_dir(table_name) / segment['file']
+        offsets = segment.get('offsets')
+        compressed = path.suffix == COMPRESSED_SUFFIX
+        if offsets is None or compressed:
+            content = path.read_bytes()
+            metrics.add_gauge('io.bytes_read', len(content))
+            if compressed:
+                content = zlib.decompress(content)
+            if offsets is None:
+                part = json.loads(content)
+                return {column: part[column] for column in columns}
+            pieces = {column: content[slice(*offsets[column])]
+                      for column in columns}
+        else:
+            pieces = {}
+            with open(path, 'rb') as f:
+                for column in columns:
+                    start, stop = offsets[column]
+                    f.seek(start)
+                    pieces[column] = f.read(stop - start)
+            metrics.add_gauge('io.bytes_read', sum(map(len, pieces.values())))
+        return {column: json.loads(piece) for column, piece in pieces.items()}
+
+    def save(self, table_name, data, column_types=None, segments=None):
+        for tmp_path, path in self.stage(table_name, data, column_types, segments):
+            replace(tmp_path, path)
+        self.cleanup(table_name)
+
+    def stage(self, table_name, data, column_types=None, segments=None):
+        """
+        Записывает изменённые сегменты в новые файлы и manifest
+        во временный файл.
+
+        Аргументы:
+            segments (set[int] | None): номера сегментов, изменённых
+                с прошлой записи снимка; None — все сегменты.
+
+        Возвращает:
+            list[tuple]: пары (временный файл, основной файл) для os.replace.
+        """
+
+        table_dir = self.get_dir(table_name)
+        table_dir.mkdir(parents=True, exist_ok=True)
+
+        columns = [column for column in data if column != 'table_name']
+        size = constants.SEGMENT_ROWS
+        previous = self.load_manifest(table_name) if self.exists(table_name) \
+            else {'generation': 0, 'segment_rows': size, 'columns': columns,
+                  'segments': []}
+        reusable = previous['segments'] if segments is not None and \
+            previous['segment_rows'] == size and previous['columns'] == columns \
+            else []
+        generation = previous['generation'] + 1
+
+        rows = len(data['id'])
+        files = []
+        for number, start in enumerate(range(0, rows, size)):
+            stop = min(start + size, rows)
+            if number < len(reusable) and number not in segments and \
+                    reusable[number]['rows'] == stop - start:
+                files.append(reusable[number])
+                continue
+
+            name = f'{number}.{generation}.json'
+            content, offsets = segment_content(data, columns, start, stop)
+            if constants.STORAGE_COMPRESSION == 'zlib':
+                name += COMPRESSED_SUFFIX
+                content = zlib.compress(content)
+            with open(table_dir / name, 'wb') as f:
+                f.write(content)
+                sync_file(f)
+            metrics.add_gauge('io.bytes_written', len(content))
+            files.append({'file': name, 'rows': stop - start,
+                          'zone': table_stats.segment_zone(data, columns,
+                                                           start, stop),
+                          'offsets': offsets})
+
+        manifest = {
+            'table_name': table_name,
+            'generation': generation,
+            'segment_rows': size,
+            'rows': rows,
+            'columns': columns,
+            'segments': files,
+        }
+        manifest_path = self.get_manifest_path(table_name)
+        tmp_path = manifest_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+            sync_file(f)
+        return [(tmp_path, manifest_path)]
+
+    def load_zones(self, table_name):
+        """
+        Возвращает карту зон сегментов из manifest (см. table_stats)
+        или None, если она записана не для всех сегментов или с другим
+        размером сегмента.
+        """
+
+        manifest = self.load_manifest(table_name)
+        segments = manifest['segments']
+        if manifest['segment_rows'] != constants.SEGMENT_ROWS or \
+                any('zone' not in segment for segment in segments):
+            return None
+        return [segment['zone'] for segment in segments]
+
+    def map_array(self, table_name, column):
+        return None
+
+    def cleanup(self, table_name):
+        """
+        Удаляет файлы сегментов, на которые не ссылается manifest.
+        """
+
+        manifest = self.load_manifest(table_name)
+        current = {segment['file'] for segment in manifest['segments']}
+        for path in self.get_dir(table_name).iterdir():
+            if path.name != 'manifest.json' and path.name not in current:
+                path.unlink()
+
+    def remove(self, table_name):
+        table_dir = self.get_dir(table_name)
+        if not table_dir.exists():
+            return
+        for path in table_dir.iterdir():
+            path.unlink()
+        table_dir.rmdir()
+
+
+def segment_content(data, columns, start, stop):
+    """
+    Собирает JSON-объект сегмента {column: значения} из строк [start, stop).
+
+    Возвращает:
+        tuple: (содержимое файла в UTF-8, {column: [начало, конец]} —
+        смещения значений столбца в байтах).
+    """
+
+    parts = []
+    offsets = {}
+    position = 1
+    for column in columns:
+        key = json.dumps(column, ensure_ascii=False).encode('utf-8') + b':'
+        value = json.dumps(encode_segment_column(data[column][start:stop]),
+                           ensure_ascii=False,
+                           separators=JSON_SEPARATORS).encode('utf-8')
+        offsets[column] = [position + len(key), position + len(key) + len(value)]
+        position += len(key) + len(value) + 1
+        parts.append(key + value)
+    return b'{' + b','.join(parts) + b'}', offsets
+
+
+@contextmanager
+def mapped(path, typecode):
+    """
+    Отображает файл в память и возвращает memoryview с элементами typecode.
+    Пустой файл отображается в пустой view.
+    """
+
+    if os.path.getsize(path) == 0:
+        with memoryview(array(typecode)) as view:
+            yield view
+        return
+
+    with open(path, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+            memoryview(mm) as raw, raw.cast(typecode) as view:
+        yield view
+
+
+STORAGES = {
+    storage.name: storage
+    for storage in (JsonStorage(), ColumnarStorage(), SegmentedStorage())
+}
+
+
+def get_storage(table_name):
+    """
+    Определяет формат хранения таблицы по файлам на диске.
+
+    Аргументы:
+        table_name (str): имя таблицы.
+
+    Возвращает:
+        JsonStorage | ColumnarStorage | SegmentedStorage: хранилище таблицы;
+        для новых таблиц — constants.DEFAULT_STORAGE.
+    """
+
+    for table_storage in STORAGES.values():
+        if table_storage.exists(table_name):
+            return table_storage
+    return STORAGES[constants.DEFAULT_STORAGE]
@@ -0,0 +1,221 @@
+"""
+Нагрузочная проверка одновременной работы нескольких процессов с одной базой.
+
+Запуск: python -m src.primitive_db.stress --processes 8 --operations 200
+[--write-policy deferred] [--durability batched]
+
+Каждый процесс добавляет свои строки, изменяет и часть из них удаляет,
+перемежая запись чтением. После завершения всех процессов проверяется,
+что ни одно изменение не потеряно, id не повторяются, индекс совпадает
+с данными, а файлы таблицы, журнала, индекса и метаданных читаются целиком.
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from src.primitive_db import (
+    buffer_pool,
+    constants,
+    core,
+    decorators,
+    indexes,
+    utils,
+)
+
+TABLE_NAME = 'stress'
+
+
+def configure(base_dir, write_policy='write_through', durability='sync'):
+    """
+    Направляет базу данных текущего процесса в каталог base_dir и задаёт
+    политику записи и уровень надёжности.
+    """
+
+    constants.BUFFER_POOL_WRITE_POLICY = write_policy
+    constants.DURABILITY = durability
+    constants.TABLE_DATA_DIR = base_dir / 'data'
+    constants.METADATA_JSON = base_dir / 'db_meta.json'
+    # маленький порог, чтобы журнал сворачивался и во время нагрузки
+    constants.WAL_COMPACT_THRESHOLD = 16 * 1024
+    decorators.LOG_TIME = False
+    decorators.CONFIRM_ANSWER = 'y'
+
+
+def row_name(worker_id, i):
+    return f'w{worker_id}_{i}'
+
+
+def is_deleted(i):
+    return i % 10 == 9
+
+
+def worker(worker_id, base_dir, operations, write_policy, durability):
+    """
+    Выполняет смешанную нагрузку одного процесса: insert, update, select
+    и delete своих строк.
+    """
+
+    configure(base_dir, write_policy, durability)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        metadata = buffer_pool.get_metadata()
+        for i in range(operations):
+            name = row_name(worker_id, i)
+            core.insert(metadata, TABLE_NAME, [(name, 0)])
+            core.update(metadata, TABLE_NAME, {'value': i + 1},
+                        ('cmp', 'name', '=', name))
+            core.select(metadata, TABLE_NAME, ('cmp', 'value', '>', i), limit=5)
+            if is_deleted(i):
+                core.delete(metadata, TABLE_NAME, ('cmp', 'name', '=', name))
+        buffer_pool.stop_flusher()
+        buffer_pool.flush()
+
+
+def check_files(table_name):
+    """
+    Проверяет, что файлы таблицы не оборваны: JSON-файлы разбираются
+    целиком, каждая строка журнала завершена и разбирается.
+
+    Возвращает:
+        list[str]: описания найденных ошибок.
+    """
+
+    errors = []
+    paths = [constants.METADATA_JSON, utils.get_table_path(table_name)]
+    paths += [utils.get_index_path(table_name, 'name')]
+    for path in paths:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            errors.append(f'файл {path} не читается: {e}')
+
+    log_path = utils.get_log_path(table_name)
+    if log_path.exists():
+        with open(log_path, 'r', encoding='utf-8') as f:
+            for number, line in enumerate(f, start=1):
+                try:
+                    if not line.endswith('\n'):
+                        raise ValueError('строка не завершена')
+                    json.loads(line)
+                except ValueError as e:
+                    errors.append(f'журнал, строка {number}: {e}')
+    return errors
+
+
+def check_data(processes, operations):
+    """
+    Сравнивает итоговое состояние таблицы с ожидаемым.
+
+    Возвращает:
+        list[str]: описания найденных ошибок.
+    """
+
+    errors = check_files(TABLE_NAME)
+    table_data = utils.load_table_data(TABLE_NAME)
+    rows = dict(zip(table_data['name'], table_data['value']))
+
+    expected = {
+        row_name(worker_id, i): i + 1
+        for worker_id in range(processes)
+        for i in range(operations)
+        if not is_deleted(i)
+    }
+    if len(rows) != len(table_data['name']):
+        errors.append('имена строк повторяются')
+    missing = expected.keys() - rows.keys()
+    extra = rows.keys() - expected.keys()
+    if missing:
+        errors.append(f'потеряно строк: {len(missing)}')
+    if extra:
+        errors.append(f'лишних строк: {len(extra)}')
+    stale = [name for name, value in expected.items()
+             if name in rows and rows[name] != value]
+    if stale:
+        errors.append(f'потеряно изменений: {len(stale)}')
+
+    ids = table_data['id']
+    if len(set(ids)) != len(ids):
+        errors.append('id строк повторяются')
+
+    table_meta = utils.get_table_meta(utils.load_metadata(), TABLE_NAME)
+    if table_meta['next_id'] <= max(ids, default=0):
+        errors.append('счётчик next_id отстаёт от данных')
+
+    # файл индекса читается, только если журнал свёрнут в снимок,
+    # иначе индекс строится по данным
+    index = buffer_pool.get_index(TABLE_NAME, 'name')
+    expected_index = indexes.build_index(table_data['name'], ids)
+    if {key: sorted(value) for key, value in index.items()} != \
+            {key: sorted(value) for key, value in expected_index.items()}:
+        errors.append('индекс по name не совпадает с данными')
+    return errors
+
+
+def run(processes, operations, write_policy='write_through', durability='sync'):
+    """
+    Запускает processes процессов с нагрузкой и проверяет результат.
+    Политика записи и уровень надёжности задаются процессам нагрузки.
+
+    Возвращает:
+        int: код завершения — 0, если ошибок нет.
+    """
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base_dir = Path(tmp)
+        configure(base_dir)
+        with open(os.devnull, 'w') as devnull, \
+                contextlib.redirect_stdout(devnull):
+            metadata = buffer_pool.get_metadata()
+            core.create_table(metadata, TABLE_NAME, {'name': 'str', 'value': 'int'})
+            core.create_index(metadata, TABLE_NAME, 'name')
+
+        context = multiprocessing.get_context('spawn')
+        started = time.perf_counter()
+        workers = [
+            context.Process(target=worker,
+                            args=(worker_id, base_dir, operations,
+                                  write_policy, durability))
+            for worker_id in range(processes)
+        ]
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join()
+        elapsed = time.perf_counter() - started
+
+        errors = [f'процесс {process.pid} завершился с кодом {process.exitcode}'
+                  for process in workers if process.exitcode != 0]
+        errors += check_data(processes, operations)
+
+    print(f'Процессов: {processes}, операций на процесс: {operations}, '
+          f'запись: {write_policy}, надёжность: {durability}, '
+          f'время: {elapsed:.2f} с.')
+    for error in errors:
+        print(f'Ошибка: {error}')
+    print('Ошибок не найдено.' if not errors else f'Ошибок: {len(errors)}.')
+    return 1 if errors else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Проверка одновременной работы '
+                                                 'нескольких процессов с базой.')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 4)
+    parser.add_argument('--operations', type=int, default=200,
+                        help='число строк, которые добавляет каждый процесс')
+    parser.add_argument('--write-policy', choices=('write_through', 'deferred'),
+                        default='write_through')
+    parser.add_argument('--durability', choices=('sync', 'batched', 'none'),
+                        default='sync')
+    args = parser.parse_args()
+    sys.exit(run(args.processes, args.operations, args.write_policy,
+                 args.durability))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+"""
+Статистика таблиц и карты зон сегментов.
+
+Статистика таблицы хранится в её записи метаданных под ключом stats
+и обновляется при каждом изменении, без просмотра данных:
+    {"rows": число строк,
+     "columns": {столбец: {"min": ..., "max": ..., "sketch": "..."}}}
+min и max — границы значений столбца: после update и delete они могут
+быть шире фактических и уточняются при вычистке удалённых строк.
+sketch — наименьшие хеши различных значений (оценка KMV), по которым
+приблизительно считается число различных значений; хеши хранятся
+по возрастанию одной строкой по HASH_DIGITS шестнадцатеричных цифр,
+чтобы метаданные оставались компактными и быстро записывались.
+
+Карта зон — границы значений каждого столбца в каждом сегменте из
+constants.SEGMENT_ROWS строк: [{столбец: [min, max]}, ...]. По ней
+просмотр таблицы пропускает сегменты, в которых условие WHERE
+заведомо не выполняется.
+"""
+import heapq
+import zlib
+
+from src.primitive_db import constants
+
+# число шестнадцатеричных цифр одного хеша в строке sketch
+HASH_DIGITS = 8
+
+
+def value_hashes(values):
+    """
+    Возвращает множество 32-битных хешей различных значений.
+
+    Хеш не зависит от процесса (в отличие от hash для строк), поэтому
+    наборы хешей, сохранённые в метаданных, можно пополнять в любом процессе.
+    """
+
+    return set(map(zlib.crc32, map(str.encode, map(str, set(values)))))
+
+
+def merge_sketch(sketch, values):
+    """
+    Добавляет значения в набор constants.STATS_SKETCH_SIZE наименьших хешей.
+
+    Аргументы:
+        sketch (str): набор хешей (см. описание модуля).
+        values (iterable): добавляемые значения.
+
+    Возвращает:
+        str: новый набор.
+    """
+
+    hashes = value_hashes(values)
+    if len(sketch) >= constants.STATS_SKETCH_SIZE * HASH_DIGITS:
+        # набор полон: в него могут попасть только хеши меньше наибольшего
+        largest = int(sketch[-HASH_DIGITS:], 16)
+        hashes = {h for h in hashes if h < largest}
+        if not hashes:
+            return sketch
+    hashes.update(int(sketch[i:i + HASH_DIGITS], 16)
+                  for i in range(0, len(sketch), HASH_DIGITS))
+    return ''.join(f'{h:0{HASH_DIGITS}x}'
+                   for h in heapq.nsmallest(constants.STATS_SKETCH_SIZE, hashes))
+
+
+def distinct_count(column_stats):
+    """
+    Оценивает число различных значений столбца по набору хешей: пока
+    набор не заполнен, число точное.
+    """
+
+    sketch = column_stats['sketch']
+    count = len(sketch) // HASH_DIGITS
+    if count < constants.STATS_SKETCH_SIZE:
+        return count
+    return round((count - 1) * 2 ** 32 / (int(sketch[-HASH_DIGITS:], 16) + 1))
+
+
+def new_stats(columns):
+    """
+    Возвращает статистику пустой таблицы со столбцами columns.
+    """
+
+    return {'rows': 0,
+            'columns': {col: {'min': None, 'max': None, 'sketch': ''}
+                        for col in columns}}
+
+
+def widen(column_stats, values):
+    """
+    Расширяет границы и набор хешей столбца значениями values.
+    """
+
+    if not values:
+        return
+    low, high = min(values), max(values)
+    if column_stats['min'] is None or low < column_stats['min']:
+        column_stats['min'] = low
+    if column_stats['max'] is None or high > column_stats['max']:
+        column_stats['max'] = high
+    column_stats['sketch'] = merge_sketch(column_stats['sketch'], values)
+
+
+def compute(columns, table_data):
+    """
+    Вычисляет статистику таблицы по её данным целиком.
+
+    Аргументы:
+        columns (iterable[str]): столбцы таблицы.
+        table_data (dict): данные таблицы без удалённых строк.
+
+    Возвращает:
+        dict: статистика таблицы.
+    """
+
+    stats = new_stats(columns)
+    stats['rows'] = len(table_data.get('id', []))
+    for col, column_stats in stats['columns'].items():
+        widen(column_stats, table_data.get(col, []))
+    return stats
+
+
+def add_rows(stats, rows):
+    """
+    Учитывает в статистике добавленные строки.
+
+    Аргументы:
+        stats (dict): статистика таблицы.
+        rows (list[dict]): полные строки вида {column_name: value}.
+    """
+
+    stats['rows'] += len(rows)
+    for col, column_stats in stats['columns'].items():
+        widen(column_stats, [row[col] for row in rows])
+
+
+def update_rows(stats, set_clause):
+    """
+    Учитывает в статистике новые значения, записанные командой update.
+    """
+
+    for col, value in set_clause.items():
+        widen(stats['columns'][col], [value])
+
+
+def refresh_bounds(stats, table_data):
+    """
+    Уточняет число строк и границы столбцов по данным таблицы
+    (набор хешей не пересчитывается: он оценивает число различных
+    значений сверху).
+
+    Аргументы:
+        stats (dict): статистика таблицы.
+        table_data (dict): данные таблицы без удалённых строк.
+    """
+
+    stats['rows'] = len(table_data['id'])
+    for col, column_stats in stats['columns'].items():
+        values = table_data[col]
+        column_stats['min'] = min(values, default=None)
+        column_stats['max'] = max(values, default=None)
+
+
+def segment_zone(table_data, columns, start, stop):
+    """
+    Возвращает зону строк [start, stop): {столбец: [min, max]}.
+    """
+
+    zone = {}
+    for col in columns:
+        values = table_data[col][start:stop]
+        zone[col] = [min(values), max(values)]
+    return zone
+
+
+def build_zones(table_data):
+    """
+    Строит карту зон таблицы по сегментам из constants.SEGMENT_ROWS строк.
+    """
+
+    columns = [col for col in table_data if col != 'table_name']
+    size = constants.SEGMENT_ROWS
+    rows = len(table_data['id'])
+    return [segment_zone(table_data, columns, start, min(start + size, rows))
+            for start in range(0, rows, size)]
+
+
+def extend_zones(zones, table_data, start):
+    """
+    Учитывает в карте зон строки, добавленные в конец таблицы с позиции start.
+    """
+
+    columns = [col for col in table_data if col != 'table_name']
+    size = constants.SEGMENT_ROWS
+    rows = len(table_data['id'])
+    for number in range(start // size, (rows - 1) // size + 1):
+        zone = segment_zone(table_data, columns, max(start, number * size),
+                            min(rows, (number + 1) * size))
+        if number < len(zones):
+            for col, (low, high) in zone.items():
+                bounds = zones[number][col]
+                bounds[:] = [min(bounds[0], low), max(bounds[1], high)]
+        else:
+            zones.append(zone)
+
+
+def widen_zones(zones, positions, set_clause):
+    """
+    Расширяет зоны сегментов, в которых строки получили новые значения.
+    """
+
+    size = constants.SEGMENT_ROWS
+    for number in {i // size for i in positions}:
+        for col, value in set_clause.items():
+            bounds = zones[number][col]
+            bounds[:] = [min(bounds[0], value), max(bounds[1], value)]
+
+
+def may_match(plan, zone):
+    """
+    Проверяет, могут ли в сегменте с зоной zone найтись строки,
+    удовлетворяющие плану условия WHERE.
+    """
+
+    kind = plan[0]
+    if kind == 'and':
+        return all(may_match(part, zone) for part in plan[1])
+    if kind == 'or':
+        return any(may_match(part, zone) for part in plan[1])
+
+    low, high = zone[plan[1]]
+    if kind == 'in':
+        return any(low <= value <= high for value in plan[2])
+    if kind == 'between':
+        return plan[2] <= high and plan[3] >= low
+
+    op, value = plan[2], plan[3]
+    if op == '=':
+        return low <= value <= high
+    if op == '!=':
+        return not low == high == value
+    if op == '<':
+        return low < value
+    if op == '<=':
+        return low <= value
+    if op == '>':
+        return high > value
+    return high >= value
+
+
+def matching_segments(plan, zones, row_count):
+    """
+    Отбирает по карте зон сегменты, в которых условие может выполниться.
+
+    Возвращает:
+        tuple: (диапазоны позиций подходящих сегментов, число пропущенных
+        сегментов).
+    """
+
+    size = constants.SEGMENT_ROWS
+    segments = []
+    skipped = 0
+    for number, zone in enumerate(zones):
+        if may_match(plan, zone):
+            start = number * size
+            segments.append(range(start, min(start + size, row_count)))
+        else:
+            skipped += 1
+    return segments, skipped
@@ -1,11 +1,21 @@
+import csv
 import json
 import os
+from pathlib import Path
 
-from src.primitive_db import constants, decorators
+from src.primitive_db import (
+    constants,
+    decorators,
+    indexes,
+    locks,
+    metrics,
+    storage,
+    table_stats,
+)
 
 
 @decorators.handle_db_errors
-def load_metadata(filepath=constants.METADATA_JSON):
+def load_metadata(filepath=None):
     """
     Загружает метаданные всех таблиц из файла db_meta.json.
     
@@ -16,12 +26,15 @@ def load_metadata(filepath=constants.METADATA_JSON):
         list — список словарей с описанием таблиц.
     """
      
+    filepath = filepath or constants.METADATA_JSON
     if not os.path.exists(filepath):
         with open(filepath, 'w', encoding='utf-8') as f:
             f.write("[]")
         return []
 
-    if os.path.getsize(filepath) > 0:
+    size = os.path.getsize(filepath)
+    if size > 0:
+        metrics.add_gauge('io.bytes_read', size)
         try:
             with open(filepath, 'r', encoding='utf-8') as f:
                 return json.load(f)
@@ -32,7 +45,7 @@ def load_metadata(filepath=constants.METADATA_JSON):
 
 
 @decorators.handle_db_errors
-def save_metadata(data, filepath=constants.METADATA_JSON):
+def save_metadata(data, filepath=None):
     """
     Сохраняет актуальные метаданные таблиц в db_meta.json.
     
@@ -40,14 +53,129 @@ def save_metadata(data, filepath=constants.METADATA_JSON):
         data — структура метаданных (список словарей).
     """
 
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
+    storage.replace(*stage_metadata(data, filepath))
+
+
+def stage_metadata(data, filepath=None):
+    """
+    Записывает метаданные во временный файл рядом с db_meta.json.
+    
+    Возвращает:
+        tuple — пара (временный файл, основной файл) для os.replace.
+    """
+
+    filepath = filepath or constants.METADATA_JSON
+    return stage_file(filepath, json.dumps(data, ensure_ascii=False, indent=4))
+
+
+def stage_file(filepath, content):
+    """
+    Записывает содержимое во временный файл <имя>.tmp рядом с основным.
+    
+    Основной файл не меняется, пока временный не переименуют в него
+    (os.replace), поэтому замена файла атомарна. Если уровень надёжности
+    constants.DURABILITY не none, временный файл сбрасывается на диск.
+    
+    Аргументы:
+        filepath — путь к основному файлу.
+        content — текст файла.
+        
+    Возвращает:
+        tuple — пара (временный файл, основной файл).
+    """
+
+    filepath = Path(filepath)
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = filepath.with_name(filepath.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+        metrics.add_gauge('io.bytes_written', f.tell())
+        storage.sync_file(f)
+    return tmp_path, filepath
+
+
+def get_commit_journal_path():
+    """
+    Возвращает путь к журналу фиксации транзакции (рядом с db_meta.json).
+    """
+
+    return Path(constants.METADATA_JSON).with_suffix('.commit')
+
+
+@decorators.handle_db_errors
+def commit_files(renames, removals=()):
+    """
+    Атомарно заменяет группу файлов.
+    
+    Новые версии файлов уже записаны во временные файлы. Сначала на диск
+    сбрасываются временные файлы и журнал фиксации со списком замен; после
+    этого переименования выполняются по одному. Если работа прервётся
+    посередине, recover_commit при следующем запуске доведёт замену
+    до конца, поэтому на диске оказываются либо все новые версии, либо
+    ни одной.
+    
+    Аргументы:
+        renames — пары (временный файл, основной файл).
+        removals — файлы, которые нужно удалить вместе с заменой.
+    """
+
+    for tmp_path, _ in renames:
+        with open(tmp_path, 'rb') as f:
+            os.fsync(f.fileno())
+
+    journal = {
+        'renames': [[str(tmp_path), str(path)] for tmp_path, path in renames],
+        'removals': [str(path) for path in removals],
+    }
+    journal_path = get_commit_journal_path()
+    tmp_path, _ = stage_file(journal_path, json.dumps(journal, ensure_ascii=False))
+    with open(tmp_path, 'rb') as f:
+        os.fsync(f.fileno())
+    storage.replace(tmp_path, journal_path)
+
+    apply_commit_journal(journal)
+    for directory in {Path(path).parent for _, path in renames}:
+        storage.sync_dir(directory)
+    journal_path.unlink()
+
+
+def apply_commit_journal(journal):
+    """
+    Выполняет замены и удаления из журнала фиксации. Повторный вызов
+    безопасен: уже выполненные шаги пропускаются.
+    """
+
+    for tmp_path, path in journal['renames']:
+        if os.path.exists(tmp_path):
+            os.replace(tmp_path, path)
+    for path in journal['removals']:
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+@decorators.handle_db_errors
+def recover_commit():
+    """
+    Доводит до конца фиксацию транзакции, прерванную сбоем.
+    
+    Если журнал фиксации есть, значит все новые версии файлов уже
+    на диске, и остаётся только выполнить переименования.
+    """
+
+    journal_path = get_commit_journal_path()
+    if not journal_path.exists():
+        return
+
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        apply_commit_journal(json.load(f))
+    journal_path.unlink()
 
 
 @decorators.handle_db_errors
 def get_table_path(table_name):
     """
-    Возвращает путь к JSON-файлу таблицы.
+    Возвращает путь к файлу снимка таблицы: JSON-файлу или manifest.json
+    поколоночного хранилища. Файл меняется при каждой записи снимка.
     
     Аргументы:
         table_name — имя таблицы.
@@ -56,45 +184,446 @@ def get_table_path(table_name):
         pathlib.Path — путь к файлу с данными таблицы.
     """
 
-    return constants.TABLE_DATA_DIR / f'{table_name}.json'
+    return get_table_storage(table_name).signature_path(table_name)
+
+
+def get_table_meta(metadata, table_name):
+    """
+    Возвращает запись таблицы из метаданных.
+    
+    Аргументы:
+        metadata — список словарей с описанием таблиц.
+        table_name — имя таблицы.
+        
+    Возвращает:
+        dict | None — запись таблицы или None, если таблицы нет.
+    """
+
+    for table in metadata:
+        if table['table_name'] == table_name:
+            return table
+    return None
+
+
+def get_table_storage(table_name):
+    """
+    Возвращает хранилище, в формате которого записана таблица
+    (json, columnar или segmented).
+    
+    Аргументы:
+        table_name — имя таблицы.
+    """
+
+    return storage.get_storage(table_name)
 
 
 @decorators.handle_db_errors
-def load_table_data(table_name):
+def load_table_data(table_name, columns=None):
     """
-    Загружает содержимое JSON-файла таблицы.
+    Загружает снимок таблицы из её хранилища и применяет к нему
+    журнал изменений, накопленный с момента последнего сжатия.
     
-    Если файл отсутствует — возвращает пустой словарь.
+    Если таблицы нет — возвращает пустой словарь.
     
     Аргументы:
         table_name — имя таблицы.
+        columns — столбцы, которые нужно прочитать (среди них должен
+            быть id); None — все. Хранилище может вернуть и другие столбцы.
         
     Возвращает:
         dict — данные таблицы формата {column: list_of_values}.
     """
 
-    filepath = get_table_path(table_name)
-    if not filepath.exists():
+    table_storage = get_table_storage(table_name)
+    if not table_storage.exists(table_name):
         return {}
 
-    with open(filepath, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    table_data = table_storage.load(table_name, columns)
+    replay_table_log(table_data, read_table_log(table_name))
+    return table_data
 
 
 @decorators.handle_db_errors
-def save_table_data(table_name, data):
+def save_table_data(table_name, data, column_types=None, table_storage=None,
+                    segments=None):
     """
-    Сохраняет данные таблицы в её JSON-файл.
+    Сохраняет снимок таблицы в её хранилище.
     
-    Если директории ещё нет — создаёт её.
+    Если директории ещё нет — создаёт её. Запись идёт во временные файлы,
+    которые затем атомарно заменяют основные, поэтому при сбое снимок
+    таблицы не остаётся недописанным.
     
     Аргументы:
         table_name — имя таблицы.
         data — словарь с данными таблицы.
+        column_types — типы столбцов {column: type}; нужны при первой
+            записи таблицы в поколоночном формате.
+        table_storage — хранилище; по умолчанию текущее хранилище таблицы.
+        segments — номера сегментов, изменённых с прошлой записи снимка
+            (None — все); сегментное хранилище переписывает только их.
+    """
+    
+    table_storage = table_storage or get_table_storage(table_name)
+    table_storage.save(table_name, data, column_types, segments)
+
+
+def get_log_path(table_name):
+    """
+    Возвращает путь к журналу изменений (WAL) таблицы.
+    
+    Аргументы:
+        table_name — имя таблицы.
+        
+    Возвращает:
+        pathlib.Path — путь к файлу журнала.
+    """
+
+    return constants.TABLE_DATA_DIR / f'{table_name}.log'
+
+
+@decorators.handle_db_errors
+def append_table_log(table_name, records):
+    """
+    Дописывает записи об изменениях в конец журнала таблицы.
+    
+    Каждая запись — одна строка JSON вида {"op": ..., ...}, где op —
+    insert, update или delete. Файл таблицы при этом не переписывается.
+    Если уровень надёжности constants.DURABILITY не none, журнал
+    сбрасывается на диск (fsync) до возврата из функции.
+    
+    Аргументы:
+        table_name — имя таблицы.
+        records — словарь с описанием изменения или список таких словарей;
+            список записывается в файл одной операцией.
+    """
+
+    if isinstance(records, dict):
+        records = [records]
+
+    log_path = get_log_path(table_name)
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(log_path, 'a', encoding='utf-8') as f:
+        start = f.tell()
+        f.write(format_log_records(records))
+        metrics.add_gauge('io.bytes_written', f.tell() - start)
+        storage.sync_file(f)
+
+
+def format_log_records(records):
+    """
+    Переводит записи журнала в строки JSON, по одной на запись.
+    """
+
+    return ''.join(
+        json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+        for record in records
+    )
+
+
+def read_table_log(table_name):
+    """
+    Последовательно читает записи журнала таблицы.
+    
+    Незавершённая последняя строка (например, после сбоя во время записи)
+    пропускается.
+    
+    Аргументы:
+        table_name — имя таблицы.
+        
+    Возвращает:
+        generator — записи журнала в порядке их добавления.
+    """
+
+    log_path = get_log_path(table_name)
+    if not log_path.exists():
+        return
+
+    if metrics.ENABLED:
+        metrics.add_gauge('io.bytes_read', log_path.stat().st_size)
+    with open(log_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.endswith('\n'):
+                return
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                return
+
+
+def replay_table_log(table_data, records):
     """
+    Применяет записи журнала к загруженным данным таблицы.
     
-    filepath = get_table_path(table_name)
-    filepath.parent.mkdir(parents=True, exist_ok=True)  
+    Записи идемпотентны: вставка строки с уже существующим id пропускается,
+    поэтому повторное применение журнала (например, после сбоя во время
+    сжатия) не создаёт дубликатов. Удалённые строки сначала только
+    помечаются и убираются из столбцов одним проходом после применения
+    всего журнала.
+    
+    Аргументы:
+        table_data — словарь с данными таблицы {column: list_of_values};
+            в нём может быть только часть столбцов (но обязательно id).
+        records — итерируемый объект с записями журнала.
+    """
+
+    positions = indexes.build_id_index(table_data['id'])
+    deleted = set()
+
+    for record in records:
+        match record['op']:
+            case 'insert':
+                row = record['row']
+                if row['id'] in positions:
+                    continue
+                positions[row['id']] = len(table_data['id'])
+                for col_name, value in row.items():
+                    # столбцы, которые не загружались, пропускаются
+                    column = table_data.get(col_name)
+                    if column is not None:
+                        column.append(value)
+
+            case 'update':
+                rows = [positions[ID] for ID in record['ids'] if ID in positions]
+                for col_name, value in record['set'].items():
+                    column = table_data.get(col_name)
+                    if column is None:
+                        continue
+                    for i in rows:
+                        column[i] = value
+
+            case 'delete':
+                for ID in record['ids']:
+                    if ID in positions:
+                        deleted.add(positions.pop(ID))
+
+    if deleted:
+        keep = [i for i in range(len(table_data['id'])) if i not in deleted]
+        for col_name in table_data:
+            if col_name != 'table_name':
+                column = table_data[col_name]
+                table_data[col_name] = [column[i] for i in keep]
+
+
+@decorators.handle_db_errors
+def compact_table(table_name):
+    """
+    Сворачивает журнал изменений в основной файл таблицы.
     
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
+    Загружает снимок таблицы вместе с журналом, сохраняет результат
+    в JSON-файл и удаляет журнал.
+    
+    Аргументы:
+        table_name — имя таблицы.
+    """
+
+    log_path = get_log_path(table_name)
+    if not log_path.exists():
+        return
+
+    table_data = load_table_data(table_name)
+    if table_data:
+        save_table_data(table_name, table_data)
+    log_path.unlink()
+
+
+def log_needs_compaction(table_name):
+    """
+    Проверяет, пора ли свернуть журнал таблицы: его размер должен превышать
+    порог constants.WAL_COMPACT_THRESHOLD и размер снимка таблицы.
+    
+    Порог растёт вместе с таблицей, поэтому при длительной загрузке
+    данных таблица переписывается лишь логарифмическое число раз.
+    
+    Аргументы:
+        table_name — имя таблицы.
+        
+    Возвращает:
+        bool — True, если журнал нужно свернуть.
+    """
+
+    log_path = get_log_path(table_name)
+    if not log_path.exists():
+        return False
+
+    table_size = get_table_storage(table_name).size(table_name)
+    threshold = max(constants.WAL_COMPACT_THRESHOLD, table_size)
+    return log_path.stat().st_size > threshold
+
+
+def get_index_path(table_name, column):
+    """
+    Возвращает путь к файлу вторичного индекса таблицы.
+    
+    Аргументы:
+        table_name — имя таблицы.
+        column — индексируемый столбец.
+        
+    Возвращает:
+        pathlib.Path — путь к файлу индекса.
+    """
+
+    return constants.TABLE_DATA_DIR / f'{table_name}.{column}.idx.json'
+
+
+@decorators.handle_db_errors
+def load_index(table_name, column):
+    """
+    Загружает вторичный индекс таблицы с диска.
+    
+    Аргументы:
+        table_name — имя таблицы.
+        column — индексируемый столбец.
+        
+    Возвращает:
+        dict — индекс вида {значение: [id строк]}.
+    """
+
+    with open(get_index_path(table_name, column), 'r', encoding='utf-8') as f:
+        pairs = json.load(f)
+        metrics.add_gauge('io.bytes_read', f.tell())
+    return {value: ids for value, ids in pairs}
+
+
+@decorators.handle_db_errors
+def save_index(table_name, column, index):
+    """
+    Сохраняет вторичный индекс таблицы.
+    
+    Индекс хранится списком пар [значение, [id строк]], чтобы сохранить
+    типы значений (ключи JSON-объекта всегда строки).
+    
+    Аргументы:
+        table_name — имя таблицы.
+        column — индексируемый столбец.
+        index — индекс вида {значение: [id строк]}.
+    """
+
+    storage.replace(*stage_index(table_name, column, index))
+
+
+def stage_index(table_name, column, index):
+    """
+    Записывает вторичный индекс во временный файл (см. save_index).
+    
+    Возвращает:
+        tuple — пара (временный файл, основной файл) для os.replace.
+    """
+
+    content = json.dumps(list(index.items()), ensure_ascii=False,
+                         separators=(',', ':'))
+    return stage_file(get_index_path(table_name, column), content)
+
+
+@decorators.handle_db_errors
+def read_import_file(filepath):
+    """
+    Построчно читает файл для импорта в таблицу.
+    
+    Аргументы:
+        filepath — путь к файлу .csv (первая строка — имена столбцов)
+            или .jsonl (по одному JSON-объекту на строку).
+        
+    Возвращает:
+        generator — строки файла в виде словарей {column: value}.
+    """
+
+    suffix = os.path.splitext(filepath)[1].lower()
+    if suffix not in ('.csv', '.jsonl'):
+        raise ValueError('поддерживаются только файлы .csv и .jsonl')
+    if not os.path.exists(filepath):
+        raise FileNotFoundError(filepath)
+
+    def rows():
+        with open(filepath, 'r', encoding='utf-8', newline='') as f:
+            if suffix == '.csv':
+                yield from csv.DictReader(f)
+            else:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+
+    return rows()
+
+
+def recover_tables(metadata):
+    """
+    Восстанавливает таблицы после запуска: применяет оставшиеся журналы
+    изменений к файлам таблиц, согласует счётчики id с данными,
+    вычисляет статистику таблиц, у которых её ещё нет,
+    и перестраивает устаревшие вторичные индексы.
+
+    Таблица блокируется и читается, только если после неё остался журнал,
+    у неё нет статистики или счётчика id либо файл какого-то индекса
+    отсутствует или старше снимка (см. stale_indexes); иначе запуск
+    её не трогает.
+
+    Аргументы:
+        metadata — список словарей с описанием таблиц.
+
+    Возвращает:
+        bool — True, если метаданные изменились и их нужно сохранить.
+    """
+
+    changed = False
+    for table in metadata:
+        table_name = table['table_name']
+        if not needs_recovery(table):
+            continue
+        with locks.table_lock(table_name, exclusive=True):
+            replayed = get_log_path(table_name).exists()
+            compact_table(table_name)
+            stale = stale_indexes(table, replayed)
+            # статистику без просмотра всех столбцов не посчитать, а для
+            # счётчика id и индексов хватает их столбцов
+            columns = None if 'stats' not in table else ['id', *stale]
+            table_data = load_table_data(table_name, columns)
+            if not table_data:
+                continue
+            indexes.sync_next_id(table, table_data['id'])
+            if 'stats' not in table:
+                table['stats'] = table_stats.compute(table['columns'], table_data)
+            for column in stale:
+                index = indexes.build_index(table_data[column], table_data['id'])
+                save_index(table_name, column, index)
+        changed = True
+    return changed
+
+
+def needs_recovery(table):
+    """
+    Проверяет без блокировки, нужно ли восстанавливать таблицу при запуске
+    (см. recover_tables).
+    """
+
+    replayed = get_log_path(table['table_name']).exists()
+    return replayed or 'stats' not in table or 'next_id' not in table or \
+        bool(stale_indexes(table, replayed))
+
+
+def stale_indexes(table, replayed):
+    """
+    Возвращает индексы таблицы, которые нужно перестроить: все, если к снимку
+    применялся журнал, иначе те, чей файл отсутствует или записан раньше
+    снимка таблицы (файлы индексов пишутся вместе со снимком).
+
+    Аргументы:
+        table — запись таблицы из метаданных.
+        replayed — True, если журнал таблицы был свёрнут в снимок.
+    """
+
+    columns = table.get('indexes', [])
+    if replayed:
+        return list(columns)
+    table_name = table['table_name']
+    snapshot_path = get_table_storage(table_name).signature_path(table_name)
+    try:
+        snapshot_time = snapshot_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        snapshot_time = 0
+    stale = []
+    for column in columns:
+        index_path = get_index_path(table_name, column)
+        if not index_path.exists() or index_path.stat().st_mtime_ns < snapshot_time:
+            stale.append(column)
+    return stale